@@ -0,0 +1,2 @@
+# StrobProbe Catalytic Homogenous DNA SERS Sensor Design Algorithm
+# Supporting modules for StrobProbe_2023.py - Please find the Variable Descriptions in the READ.ME file
@@ -0,0 +1,281 @@
+# Batch Design Mode - runs the full StrobProbe design (PH1, Toe Hold 1, Fuel/Toe Hold 2 & Probe Hairpin)
+# for every target of a multi-target input file over a process pool
+#
+#   python3 -m strobprobe.batch Targets.csv --params Sensor_Parameters.csv --out Batch_Output --workers 4
+#
+# Targets.csv holds one target per row with a header row: Target_Name,Target[,<any Sensor_Parameters.csv field>]
+# A FASTA file (.fa/.fasta/.fna) can be given instead - the record id is used as the Target_Name
+# Every field that is not given per target is taken from the --params file
+# ProbeDesign_Dimers.csv holds the strand interactions across the whole panel (strobprobe/dimers.py)
+# Every target folder gets ProbeDesign_{Target_Name}_Metrics.json (strobprobe/profiling.py) - the summary has the wall
+# time & folds of each design, --profile also writes a cProfile dump per target
+# Finished targets & the passed stages of each design are journaled (strobprobe/journal.py) - running the same batch
+# into the same --out folder again skips the finished targets & resumes the others at their last passed stage
+# A target whose parameters changed is designed again, reusing every journaled stage whose inputs stayed the same
+# A target that stops on an error other than a design checkpoint (Status Error - a full disk, a locked fold cache, a lost
+# worker) is not finished - the next run designs it again
+# The design record of every target (strobprobe/records.py) goes to ProbeDesign_Records.jsonl as soon as the target is
+# done & all of them to ProbeDesign_Records.parquet at the end (when pyarrow is installed)
+
+import argparse
+import contextlib
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from Bio import SeqIO
+
+from strobprobe.design import (DEFAULT_FOLD_CACHE_FILE, DESIGN_ERROR, DESIGN_SETTINGS, DESIGN_SENSOR, PARAMETERS_FROM_TABLE,
+                               WRITE_REPORT)
+from strobprobe.dimers import MATRIX_ROWS, STRAND_MATRIX
+from strobprobe.journal import JOURNAL_KEY, RUN_JOURNAL
+from strobprobe.profiling import PROFILE_CALL, WRITE_METRICS
+from strobprobe.records import RECORD_FROM_JSON, RECORD_WRITER, WRITE_RECORDS
+
+FASTA_EXTENSIONS = ('.fa', '.fasta', '.fna', '.fas')
+
+# Values collected from a finished design (DESIGN_RESULT stage & field) for the combined summary table
+SUMMARY_FIELDS = [
+    ('TH1', None, 'th1'),
+    ('TH2', None, 'th2'),
+    ('PH_final', None, 'ph_final'),
+    ('FUEL_final', None, 'fuel_final'),
+    ('PROBE_final', None, 'probe_final'),
+    ('Gcorr_TPH1', 'place_holder', 'gcorr_tph1'),
+    ('TM_TPH1', 'place_holder', 'tm_tph1'),
+    ('Gcorr_PH2P', 'probe', 'gcorr_ph2p'),
+    ('Gcorr_FPH3', 'fuel', 'gcorr_fph3'),
+    ('DDG_FPH_TPH', 'fuel', 'ddg_fph_tph'),
+    ('Ghpcorr_F', 'fuel', 'ghpcorr_f'),
+    ('Ghpcorr_P', 'probe_hairpin', 'ghpcorr_p'),
+    ('Fuel_Hairpin_Open_Temp', 'fuel', 'temp_open_f'),
+    ('Probe_Hairpin_Open_Temp', 'probe_hairpin', 'temp_open_p'),
+    ('Dimer_Worst_Pair', 'dimers', 'worst_pair'),
+    ('Dimer_Worst_Gcorr', 'dimers', 'worst_gcorr'),
+    ('Off_Target_Hits', 'off_target', 'off_target_hits'),
+    ('Off_Target_Gcorr', 'off_target', 'min_gcorr'),
+]
+# Columns of ProbeDesign_Summary.csv - a batch without targets still gets the header
+SUMMARY_COLUMNS = (['Target_Name', 'Target', 'Status', 'Error'] + [column for column, stage, field in SUMMARY_FIELDS] +
+                   ['Wall_Time', 'Folds', 'Output'])
+
+
+# Read the targets from a .csv (one target per row) or a FASTA file
+def READ_TARGETS(TARGET_FILE):
+    if TARGET_FILE.lower().endswith(FASTA_EXTENSIONS):
+        targets = [{'Target_Name': record.id, 'Target': str(record.seq)} for record in SeqIO.parse(TARGET_FILE, 'fasta')]
+    else:
+        table = pd.read_csv(TARGET_FILE, dtype=str)
+        if 'Target_Name' not in table.columns or 'Target' not in table.columns:
+            raise ValueError('{0} needs a header row including Target_Name and Target'.format(TARGET_FILE))
+        targets = [{key: value for key, value in row.items() if not pd.isna(value)} for row in table.to_dict('records')]
+    for target in targets:
+        # All sequences must be given in lowercase letters
+        target['Target'] = target['Target'].strip().lower()
+    names = [target['Target_Name'] for target in targets]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError('Target_Name has to be unique - repeated: {0}'.format(', '.join(duplicates)))
+    return targets
+
+
+# Summary table columns of a finished design (DESIGN_RESULT) - stages that did not run (off-target screen) are left out
+def SUMMARY_RECORD(DESIGN):
+    record = {}
+    for column, stage, field in SUMMARY_FIELDS:
+        result = DESIGN if stage is None else getattr(DESIGN, stage)
+        if result is None:
+            continue
+        value = getattr(result, field)
+        record[column] = value if isinstance(value, float) else str(value)
+    return record
+
+
+# Build the Sensor_Parameters table of one target from the template parameter file
+def TARGET_PARAMETERS(TEMPLATE, TARGET):
+    parameters = TEMPLATE.copy()
+    for row in range(len(parameters)):
+        field = parameters.iloc[row, 0]
+        if field in TARGET:
+            parameters.iloc[row, 1] = TARGET[field]
+    return parameters
+
+
+# Design settings of one target - the targets already run in parallel, the fuel hairpin checks of each target run in its own worker
+# Seed of the Toe Hold 2 search - the design default is used without --seed
+def TARGET_SETTINGS(SEED=None, OFF_TARGET_INDEX=None):
+    settings = DESIGN_SETTINGS(fold_cache_file=DEFAULT_FOLD_CACHE_FILE, fuel_workers=1, off_target_index=OFF_TARGET_INDEX)
+    if SEED is not None:
+        settings = settings._replace(th2_seed=SEED)
+    return settings
+
+
+# Toe Hold 2 seed of one target - derived from --seed & the Target_Name, so reordering the targets file keeps every design
+def TARGET_SEED(SEED, TARGET_NAME):
+    if SEED is None:
+        return None
+    return int(hashlib.sha1('{0}|{1}'.format(SEED, TARGET_NAME).encode('utf-8')).hexdigest()[:8], 16)
+
+
+# Design a single target into its own folder (ProbeDesign_{Target_Name}.txt & the log of the design)
+# A failed design checkpoint is recorded as a failure of this target only (Status Failed) & any other error as Status Error
+# The passed stages go to ProbeDesign_{Target_Name}_Journal.jsonl - with RESUME the ones already there with the same
+# inputs are not run again (also after the parameters of the target changed)
+# Returns the summary row & the DESIGN_RECORD of the design (None if it could not be run)
+def RUN_TARGET(JOB):
+    target, parameters, work_dir, seed, off_target_index, profile, resume = JOB
+    os.makedirs(work_dir, exist_ok=True)
+    parameters.to_csv(os.path.join(work_dir, 'Sensor_Parameters.csv'), header=False, index=False)
+    settings = TARGET_SETTINGS(seed, off_target_index)
+    journal = RUN_JOURNAL(os.path.join(work_dir, 'ProbeDesign_{0}_Journal.jsonl'.format(target['Target_Name'])))
+    if not resume and os.path.exists(journal.path):
+        os.remove(journal.path)
+
+    record = {'Target_Name': target['Target_Name'], 'Target': target['Target'], 'Status': 'Designed', 'Error': ''}
+    with open(os.path.join(work_dir, 'StrobProbe_{0}.log'.format(target['Target_Name'])), 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            sensor_parameters = PARAMETERS_FROM_TABLE(parameters)
+            key = JOURNAL_KEY(sensor_parameters, settings)
+            stages = journal.STAGES()
+            journal.APPEND({'record': 'target', 'key': key, 'th2_seed': settings.th2_seed})
+            on_stage = journal.STAGE_WRITER(stages)
+            if profile:
+                design = PROFILE_CALL(os.path.join(work_dir, 'ProbeDesign_{0}.prof'.format(target['Target_Name'])), DESIGN_SENSOR,
+                                      sensor_parameters, settings, LOG=print, ON_STAGE=on_stage, RESUME=stages)
+            else:
+                design = DESIGN_SENSOR(sensor_parameters, settings, LOG=print, ON_STAGE=on_stage, RESUME=stages)
+        except DESIGN_ERROR as error:
+            WRITE_REPORT(error.report, target['Target_Name'], work_dir)
+            WRITE_METRICS(error, target['Target_Name'], work_dir)
+            record['Status'] = 'Failed'
+            record['Error'] = str(error).strip().splitlines()[0].strip()
+            record.update(METRICS_RECORD(error.metrics))
+            return record, error.record
+        except Exception as error:
+            return ERROR_RECORD(target, error), None
+
+    record.update(SUMMARY_RECORD(design))
+    record.update(METRICS_RECORD(design.metrics))
+    record['Output'] = WRITE_REPORT(design, target['Target_Name'], work_dir)
+    WRITE_METRICS(design, target['Target_Name'], work_dir)
+    return record, design.record
+
+
+# Summary row of a target whose design stopped on ERROR (not a design checkpoint) - designed again by a resumed run
+def ERROR_RECORD(TARGET, ERROR):
+    return {'Target_Name': TARGET['Target_Name'], 'Target': TARGET['Target'], 'Status': 'Error',
+            'Error': '{0}: {1}'.format(type(ERROR).__name__, ERROR)}
+
+
+# Summary columns from the metrics of a design - how long it took & how many folds it needed
+def METRICS_RECORD(METRICS):
+    return {'Wall_Time': METRICS['totals']['wall_time'], 'Folds': METRICS['totals']['folds'] + METRICS['totals']['engine_folds']}
+
+
+# Fan every target out across a process pool & write the combined summary table
+# RESUME: targets finished in the ProbeDesign_Journal.jsonl of an earlier run into OUTPUT_DIR (same parameters & seed)
+# are not designed again & the others resume at their last passed stage - RESUME=False starts over
+def RUN_BATCH(TARGET_FILE, PARAMETER_FILE='Sensor_Parameters.csv', OUTPUT_DIR='Batch_Output', WORKERS=None, SEED=None, OFF_TARGET_INDEX=None,
+              PROFILE=False, RESUME=True):
+    targets = READ_TARGETS(TARGET_FILE)
+    template = pd.read_csv(PARAMETER_FILE, header=None)
+    output_dir = os.path.abspath(OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    journal = RUN_JOURNAL(os.path.join(output_dir, 'ProbeDesign_Journal.jsonl'))
+    if not RESUME and os.path.exists(journal.path):
+        os.remove(journal.path)
+    finished = journal.FINISHED()
+
+    jobs = []
+    keys = {}
+    records = {}
+    designs = {}
+    for target in targets:
+        seed = TARGET_SEED(SEED, target['Target_Name'])
+        work_dir = os.path.join(output_dir, target['Target_Name'])
+        parameters = TARGET_PARAMETERS(template, target)
+        try:
+            key = JOURNAL_KEY(PARAMETERS_FROM_TABLE(parameters), TARGET_SETTINGS(seed, OFF_TARGET_INDEX))
+        except ValueError:     # parameters that can not be read fail in RUN_TARGET
+            key = None
+        keys[target['Target_Name']] = key
+        if key is not None and target['Target_Name'] in finished and finished[target['Target_Name']][0] == key:
+            records[target['Target_Name']] = finished[target['Target_Name']][1]
+            if finished[target['Target_Name']][2] is not None:
+                designs[target['Target_Name']] = RECORD_FROM_JSON(finished[target['Target_Name']][2])
+            continue
+        jobs.append((target, parameters, work_dir, seed, OFF_TARGET_INDEX, PROFILE, RESUME))
+    if records:
+        print('{0} targets already finished in {1}'.format(len(records), journal.path))
+
+    with ProcessPoolExecutor(max_workers=WORKERS) as pool, RECORD_WRITER(os.path.join(output_dir, 'ProbeDesign_Records.jsonl'), 'w') as writer:
+        for design in designs.values():
+            writer.WRITE(design)
+        futures = {pool.submit(RUN_TARGET, job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                record, design = future.result()
+            except Exception as error:     # the worker itself was lost
+                record, design = ERROR_RECORD(target, error), None
+            records[target['Target_Name']] = record
+            if design is not None:
+                designs[target['Target_Name']] = design
+                writer.WRITE(design)
+            if record['Status'] == 'Error':
+                journal.APPEND({'record': 'error', 'target_name': target['Target_Name'], 'key': keys[target['Target_Name']],
+                                'error': record['Error']})
+            else:
+                journal.APPEND({'record': 'finished', 'target_name': target['Target_Name'], 'key': keys[target['Target_Name']],
+                                'summary': record, 'design': None if design is None else design._asdict()})
+            print('{0}: {1} {2}'.format(record['Target_Name'], record['Status'], record['Error']).rstrip())
+
+    rows = [records[target['Target_Name']] for target in targets]
+    summary = pd.DataFrame(rows, columns=None if rows else SUMMARY_COLUMNS)
+    summary.to_csv(os.path.join(output_dir, 'ProbeDesign_Summary.csv'), index=False)
+    PANEL_DIMERS(summary, template, os.path.join(output_dir, 'ProbeDesign_Dimers.csv'))
+    try:
+        WRITE_RECORDS([designs[target['Target_Name']] for target in targets if target['Target_Name'] in designs],
+                      os.path.join(output_dir, 'ProbeDesign_Records.parquet'))
+    except ImportError:
+        print('pyarrow is not installed - the design records are only in ProbeDesign_Records.jsonl')
+    return summary
+
+
+# Strand interactions across the whole panel - every final strand of every designed target against all the others,
+# in one batched pass (strobprobe/dimers.py). The panel is run together, so every pair is scored at the temperature &
+# salt of the --params file - also for targets designed at their own Temperature / Salt_Correction, whose interactions
+# at their design conditions are in the STRAND INTERACTIONS section of their own ProbeDesign_{Target_Name}.txt
+def PANEL_DIMERS(SUMMARY, TEMPLATE, OUTPUT_FILE):
+    parameters = PARAMETERS_FROM_TABLE(TEMPLATE)
+    strands = {}
+    for design in SUMMARY.to_dict('records'):
+        if design['Status'] == 'Designed':
+            for strand, column in (('T', 'Target'), ('PH_final', 'PH_final'), ('FUEL_final', 'FUEL_final'), ('PROBE_final', 'PROBE_final')):
+                strands['{0}|{1}'.format(design['Target_Name'], strand)] = design[column]
+    matrix = STRAND_MATRIX(strands, parameters.temperature, parameters.salt_correction)
+    table = pd.DataFrame(MATRIX_ROWS(matrix, '|'), columns=['Design_A', 'Strand_A', 'Design_B', 'Strand_B', 'Gcorr', 'Tm', 'Length', 'Intended'])
+    table.to_csv(OUTPUT_FILE, index=False)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StrobProbe batch design over many targets')
+    parser.add_argument('targets', help='.csv with one target per row (Target_Name,Target,...) or a FASTA file')
+    parser.add_argument('--params', default='Sensor_Parameters.csv', help='Sensor_Parameters.csv used for every field not given per target')
+    parser.add_argument('--out', default='Batch_Output', help='Folder for the per-target designs & ProbeDesign_Summary.csv')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the Toe Hold 2 search (each target derives its own from it & its Target_Name)')
+    parser.add_argument('--off-target', default=None, help='Off-target index folder (python3 -m strobprobe.offtarget build) to screen every design against')
+    parser.add_argument('--profile', action='store_true', help='Also write a cProfile dump (ProbeDesign_{Target_Name}.prof) for every target')
+    parser.add_argument('--fresh', action='store_true', help='Ignore the journal of an earlier run into --out & design every target again')
+    args = parser.parse_args(argv)
+
+    summary = RUN_BATCH(args.targets, args.params, args.out, args.workers, args.seed, args.off_target, args.profile, not args.fresh)
+    designed = (summary['Status'] == 'Designed').sum()
+    print('\n{0} of {1} targets designed - summary saved to {2}'.format(designed, len(summary), os.path.join(os.path.abspath(args.out), 'ProbeDesign_Summary.csv')))
+
+
+if __name__ == '__main__':
+    main()
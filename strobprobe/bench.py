@@ -0,0 +1,346 @@
+# Benchmark Suite - micro benchmarks of the design kernels & end-to-end designs of a fixed, seeded corpus of targets,
+# stored as JSON so a run can be compared with a saved baseline
+#
+#   python3 -m strobprobe.bench --params Sensor_Parameters.csv --out ProbeBench.json
+#   python3 -m strobprobe.bench --params Sensor_Parameters.csv --out ProbeBench_New.json --baseline ProbeBench.json
+#
+# Micro benchmarks (best of --repeat timings of an autoranged number of calls):
+#   nn_thermo, nn_thermo_batch, thermo_index, thermo_index_scan : Nearest-Neighbor thermodynamics (strobprobe/thermo.py)
+#   gibbs_calc, melt_temp, corrected_gibbs_array                : the corrections
+#   th2_search                                                   : Toe Hold 2 search of the TEST design
+#   fold_dg, fold_cache_hit                                      : one backend fold (uncached) & one fold cache hit
+#   open_temp_engine, open_temp_bracket                          : fuel hairpin opening temperature (cold HAIRPIN_ENGINE / melting.py)
+#   fuel_hairpin_check                                           : fuel check & neck loop of the TEST Toe Hold 2 with cold caches
+# The design dependent ones use the strands of the --params design (skipped if it does not design)
+#
+# End to end: every corpus target is designed with cold caches (a new in-memory fold cache & hairpin engine per target,
+# the on-disk cache is not used) & one fuel worker - designs/s & folds/s (backend + hairpin engine folds) of the designed
+# targets & the outcome of every target. The corpus is the --params Target plus --per-length seeded random targets of
+# each --lengths length, so the same --corpus-seed gives the same corpus. A random target of length L gets the Gibbs
+# window of the --params file scaled by L / len(Target) & is drawn again until its T-PH1 DG is inside it, so every
+# target reaches the searches instead of failing at the place holder. Peak memory: the largest tracemalloc peak of the
+# corpus designs (an extra untimed pass, the peak of each target is in its record) & the peak RSS of the process - the
+# tracing slows the folds down several times, so this pass takes longer than the timed one
+# The fuel hairpin folds grow steeply with the length - targets above 50 nt take minutes each, so they are left out of
+# the default --lengths
+#
+# Comparison with --baseline: a rate below the baseline (memory / fold count above it) by more than --threshold is a
+# regression & the exit status is 1 - so is a drop in the number of designed targets. Targets whose outcome or final
+# strands changed are listed
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import seqfold
+
+from strobprobe.design import DESIGN_ERROR, DESIGN_SETTINGS, DESIGN_SENSOR, READ_PARAMETERS, VERSION
+from strobprobe.foldcache import FOLD_CACHE
+from strobprobe.folding import GET_BACKEND
+from strobprobe.fuel import FUEL_HAIRPIN_CHECK
+from strobprobe.hairpin import HAIRPIN_ENGINE
+from strobprobe.melting import HAIRPIN_OPEN_TEMP
+from strobprobe.strand import STRAND
+from strobprobe.thermo import (CORRECTED_GIBBS_ARRAY, GIBBS_CALC, GIBBS_FIXER, MELT_TEMP, STRAND_THERMO, STRAND_THERMO_BATCH,
+                               THERMO_INDEX)
+from strobprobe.toehold import TH2_SEARCH
+
+try:
+    import resource
+except ImportError:     # not available on Windows - the peak RSS is left out
+    resource = None
+
+BENCH_VERSION = 2
+CORPUS_LENGTHS = (20, 25, 30, 35, 40, 45, 50)
+# Random targets drawn for one corpus target at most - the T-PH1 DG of about 1 in 500 random 100 nt targets is inside the window
+CORPUS_DRAWS = 100000
+REGRESSION_THRESHOLD = 0.10
+# Compared values - (section, value, True if higher is better)
+COMPARED_VALUES = [('end_to_end', 'designed', True), ('end_to_end', 'designs_per_s', True), ('end_to_end', 'folds_per_s', True),
+                   ('end_to_end', 'folds', False), ('end_to_end', 'peak_traced_mb', False), ('end_to_end', 'peak_rss_mb', False)]
+# Counts where any drop is a regression, whatever the threshold
+EXACT_VALUES = ['designed']
+# Target of the corpus & the Gibbs window of its place holder check (kcal/mol)
+CORPUS_TARGET = namedtuple('CORPUS_TARGET', ['name', 'target', 'gibbs_pht_max', 'gibbs_pht_min'])
+
+
+# Corrected T-PH1 DG of a target (the place holder check of the design)
+def TARGET_GIBBS(TARGET, TEMPERATURE, SALT_CORR):
+    h, s, _ = THERMO_INDEX(TARGET).THERMO(0, len(TARGET))
+    return GIBBS_CALC(TEMPERATURE, h, s) - GIBBS_FIXER(len(TARGET), SALT_CORR)
+
+
+# Corpus - the --params target first, then PER_LENGTH seeded random targets of every length that pass the place holder
+# check of their length (the --params Gibbs window scaled by length / len(Target))
+def BENCH_CORPUS(PARAMETERS, LENGTHS=CORPUS_LENGTHS, PER_LENGTH=2, SEED=7):
+    generator = random.Random(SEED)
+    corpus = [CORPUS_TARGET(PARAMETERS.target_name, PARAMETERS.target, PARAMETERS.gibbs_pht_max, PARAMETERS.gibbs_pht_min)]
+    for length in LENGTHS:
+        scale = length/len(PARAMETERS.target)
+        gibbs_max, gibbs_min = PARAMETERS.gibbs_pht_max*scale, PARAMETERS.gibbs_pht_min*scale
+        for number in range(PER_LENGTH):
+            for _ in range(CORPUS_DRAWS):
+                target = ''.join(generator.choice('acgt') for _ in range(length))
+                if gibbs_max <= TARGET_GIBBS(target, PARAMETERS.temperature, PARAMETERS.salt_correction) <= gibbs_min:
+                    break
+            else:
+                raise ValueError('No {0} nt target inside the Gibbs window in {1} draws'.format(length, CORPUS_DRAWS))
+            corpus.append(CORPUS_TARGET('SYN{0}_{1}'.format(length, number+1), target, gibbs_max, gibbs_min))
+    return corpus
+
+
+# Parameters of one corpus target
+def CORPUS_PARAMETERS(PARAMETERS, TARGET):
+    return PARAMETERS._replace(target_name=TARGET.name, target=TARGET.target, gibbs_pht_max=TARGET.gibbs_pht_max,
+                               gibbs_pht_min=TARGET.gibbs_pht_min)
+
+
+# Digest of the corpus & of the parameters every target is designed with - runs are only comparable when it matches
+def CORPUS_DIGEST(CORPUS, PARAMETERS):
+    text = json.dumps([list(PARAMETERS._replace(target_name='', target='', gibbs_pht_max=0, gibbs_pht_min=0)), [list(target) for target in CORPUS]])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+# Digest of the final strands of a design (None for a failed design)
+def DESIGN_DIGEST(DESIGN):
+    if DESIGN is None:
+        return None
+    text = '|'.join(str(strand) for strand in (DESIGN.th1, DESIGN.th2, DESIGN.ph_final, DESIGN.fuel_final, DESIGN.probe_final))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def PEAK_RSS_MB():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/1024**2 if sys.platform == 'darwin' else peak/1024     # bytes on macOS, KB on Linux
+
+
+# Best time of one call of FUNCTION - ITEMS: units of work per call (duplexes, folds ...) for the items/s rate
+def TIME_CALL(FUNCTION, REPEAT=5, ITEMS=1):
+    timer = timeit.Timer(FUNCTION)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=REPEAT, number=number))/number
+    return OrderedDict(seconds=seconds, per_second=1/seconds if seconds > 0 else None, items=ITEMS,
+                       items_per_second=ITEMS/seconds if seconds > 0 else None, number=number, repeat=REPEAT)
+
+
+# Micro benchmarks - DESIGN: DESIGN_RESULT of the --params target for the design dependent ones (None skips them)
+def MICRO_BENCHMARKS(PARAMETERS, SETTINGS, DESIGN=None, REPEAT=5, SEED=7, LOG=None):
+    generator = random.Random(SEED)
+    temperature, salt_corr = PARAMETERS.temperature, PARAMETERS.salt_correction
+    target = STRAND(PARAMETERS.target)
+    ph1 = target.reverse_complement()
+    strands = [''.join(generator.choice('acgt') for _ in range(generator.randint(20, 30))) for _ in range(256)]
+    partners = [str(STRAND(strand).reverse_complement()) for strand in strands]
+    index = THERMO_INDEX(target)
+    starts, stops = np.triu_indices(len(target)+1, k=5)
+    h, s, _ = index.THERMO(0, len(target))
+    h_array, s_array, _ = STRAND_THERMO_BATCH(strands, partners)
+    lengths = np.array([len(strand) for strand in strands])
+
+    benchmarks = OrderedDict()
+    benchmarks['nn_thermo'] = lambda: STRAND_THERMO(ph1, target, 'h', 's', 'g')
+    benchmarks['nn_thermo_batch'] = (lambda: STRAND_THERMO_BATCH(strands, partners), len(strands))
+    benchmarks['thermo_index'] = lambda: THERMO_INDEX(target)
+    benchmarks['thermo_index_scan'] = (lambda: index.THERMO(starts, stops), len(starts))
+    benchmarks['gibbs_calc'] = lambda: GIBBS_CALC(temperature, h, s)
+    benchmarks['melt_temp'] = lambda: MELT_TEMP(h, s, salt_corr)
+    benchmarks['corrected_gibbs_array'] = (lambda: CORRECTED_GIBBS_ARRAY(temperature, h_array, s_array, lengths, salt_corr), len(strands))
+    if DESIGN is not None:
+        backend = GET_BACKEND(SETTINGS.fold_backend)
+        fuel_final = STRAND(DESIGN.fuel_final)
+        f1 = target[:-len(DESIGN.th1)].lower()
+        warm = FOLD_CACHE(None, BACKEND=SETTINGS.fold_backend)
+        warm.DG(fuel_final, temperature, salt_corr)
+        t_max, tol = SETTINGS.hairpin_open_temp_max, SETTINGS.hairpin_open_temp_tol
+        benchmarks['th2_search'] = lambda: TH2_SEARCH(STRAND(DESIGN.probe.ph2), len(DESIGN.th1), len(target)-2, temperature, salt_corr,
+                                                      DESIGN.place_holder.gcorr_tph1, PARAMETERS.ddg_fph_tph_min, PARAMETERS.ddg_fph_tph_max,
+                                                      len(target), SEED=SETTINGS.th2_seed, COUNT=SETTINGS.fuel_candidates,
+                                                      MAX_CANDIDATES=SETTINGS.th2_max_candidates)
+        benchmarks['fold_dg'] = lambda: backend.DG(fuel_final, temperature)
+        benchmarks['fold_cache_hit'] = lambda: warm.DG(fuel_final, temperature, salt_corr)
+        benchmarks['open_temp_engine'] = lambda: HAIRPIN_ENGINE(BACKEND=SETTINGS.fold_backend).OPEN_TEMP(fuel_final, salt_corr, temperature, t_max, tol)
+        benchmarks['open_temp_bracket'] = lambda: HAIRPIN_OPEN_TEMP(fuel_final, salt_corr, temperature, t_max, TOL=tol, BACKEND=backend)
+        benchmarks['fuel_hairpin_check'] = lambda: FUEL_HAIRPIN_CHECK(DESIGN.th2, f1, STRAND(PARAMETERS.fuel_loop), PARAMETERS.p_hairpin_min,
+                                                                      temperature, salt_corr, t_max, tol, FOLD_CACHE(None, BACKEND=SETTINGS.fold_backend),
+                                                                      HAIRPIN_ENGINE(BACKEND=SETTINGS.fold_backend), SCREEN_MARGIN=SETTINGS.screen_margin)
+
+    results = OrderedDict()
+    for name, benchmark in benchmarks.items():
+        function, items = benchmark if isinstance(benchmark, tuple) else (benchmark, 1)
+        results[name] = TIME_CALL(function, REPEAT, items)
+        if LOG is not None:
+            LOG('{0:24s} {1:14.3e} s/call {2:14.1f} calls/s'.format(name, results[name]['seconds'], results[name]['per_second']))
+    return results
+
+
+# Design one target with cold caches - the record of the target & the DESIGN_RESULT (None for a failed design)
+def BENCH_DESIGN(PARAMETERS, SETTINGS):
+    folds = FOLD_CACHE(None, SETTINGS.fold_cache_size, BACKEND=SETTINGS.fold_backend)
+    engine = HAIRPIN_ENGINE(BACKEND=SETTINGS.fold_backend)
+    try:
+        design = DESIGN_SENSOR(PARAMETERS, SETTINGS, FOLDS=folds, ENGINE=engine)
+        metrics = design.metrics
+    except DESIGN_ERROR as error:
+        design = None
+        metrics = error.metrics
+    totals = metrics['totals']
+    record = OrderedDict(target_name=PARAMETERS.target_name, target_length=len(PARAMETERS.target), status=metrics['status'],
+                         failed_stage=metrics['failed_stage'], wall_time=totals['wall_time'], folds=totals['folds']+totals['engine_folds'],
+                         fold_requests=totals['fold_requests'], nn_duplexes=totals['nn_duplexes'], design=DESIGN_DIGEST(design))
+    return record, design
+
+
+# End-to-end run over the corpus - the rates are over the designed targets only, so a change that makes targets fail
+# sooner does not look like a speed up (it shows in designed & in the outcomes of the targets)
+def END_TO_END(PARAMETERS, SETTINGS, CORPUS, LOG=None):
+    records = []
+    for target in CORPUS:
+        record, _ = BENCH_DESIGN(CORPUS_PARAMETERS(PARAMETERS, target), SETTINGS)
+        records.append(record)
+        if LOG is not None:
+            LOG('{0:12s} {1:4d} nt  {2:8s} {3:8.2f} s {4:6d} folds'.format(target.name, len(target.target), record['status'], record['wall_time'],
+                                                                        record['folds']))
+    designed = [record for record in records if record['status'] == 'designed']
+    wall_time = sum(record['wall_time'] for record in records)
+    designed_time = sum(record['wall_time'] for record in designed)
+    designed_folds = sum(record['folds'] for record in designed)
+    return OrderedDict(targets=len(records), designed=len(designed), failed=len(records) - len(designed), wall_time=wall_time,
+                       designed_wall_time=designed_time, designs_per_s=len(designed)/designed_time if designed_time > 0 else None,
+                       folds=sum(record['folds'] for record in records), designed_folds=designed_folds,
+                       folds_per_s=designed_folds/designed_time if designed_time > 0 else None,
+                       fold_requests=sum(record['fold_requests'] for record in records),
+                       nn_duplexes=sum(record['nn_duplexes'] for record in records), per_target=records)
+
+
+# Peak memory (MB) traced by tracemalloc over a cold design of every corpus target - the largest peak & {name: peak}
+def TRACED_PEAK_MB(PARAMETERS, SETTINGS, CORPUS):
+    peaks = OrderedDict()
+    tracemalloc.start()
+    try:
+        for target in CORPUS:
+            tracemalloc.reset_peak()
+            BENCH_DESIGN(CORPUS_PARAMETERS(PARAMETERS, target), SETTINGS)
+            peaks[target.name] = tracemalloc.get_traced_memory()[1]/1024**2
+    finally:
+        tracemalloc.stop()
+    return max(peaks.values()) if peaks else None, peaks
+
+
+def RUN_BENCHMARKS(PARAMETERS, SETTINGS=None, LENGTHS=CORPUS_LENGTHS, PER_LENGTH=2, CORPUS_SEED=7, REPEAT=5, MICRO=True, LOG=None):
+    settings = SETTINGS if SETTINGS is not None else DESIGN_SETTINGS(fuel_workers=1)
+    corpus = BENCH_CORPUS(PARAMETERS, LENGTHS, PER_LENGTH, CORPUS_SEED)
+    # The --params design warms up the imports & gives the strands of the design dependent micro benchmarks
+    _, design = BENCH_DESIGN(PARAMETERS, settings)
+    result = OrderedDict(version=BENCH_VERSION, created=datetime.datetime.now().isoformat(timespec='seconds'),
+                         environment=OrderedDict(strobprobe=VERSION, python=platform.python_version(), numpy=np.__version__,
+                                                 seqfold=seqfold.__version__, platform=platform.platform(), cpus=os.cpu_count()),
+                         settings=OrderedDict(fold_backend=GET_BACKEND(settings.fold_backend).name, th2_seed=settings.th2_seed,
+                                              screen_margin=settings.screen_margin, repeat=REPEAT, corpus_seed=CORPUS_SEED,
+                                              lengths=list(LENGTHS), per_length=PER_LENGTH),
+                         corpus=OrderedDict(targets=len(corpus), digest=CORPUS_DIGEST(corpus, PARAMETERS)))
+    if MICRO:
+        if LOG is not None:
+            LOG('--- Micro benchmarks ---')
+        result['micro'] = MICRO_BENCHMARKS(PARAMETERS, settings, design, REPEAT, CORPUS_SEED, LOG)
+    if LOG is not None:
+        LOG('--- End to end ({0} targets) ---'.format(len(corpus)))
+    result['end_to_end'] = END_TO_END(PARAMETERS, settings, corpus, LOG)
+    result['end_to_end']['peak_traced_mb'], peaks = TRACED_PEAK_MB(PARAMETERS, settings, corpus)
+    for record in result['end_to_end']['per_target']:
+        record['peak_traced_mb'] = peaks[record['target_name']]
+    result['end_to_end']['peak_rss_mb'] = PEAK_RSS_MB()
+    return result
+
+
+# Compare a run with a baseline run - rows of (name, baseline, current, change, regression) & the targets whose
+# outcome or final strands changed. change: current/baseline - 1 (None when either value is missing) - fewer designed
+# targets than the baseline is a regression at any THRESHOLD
+def COMPARE_BENCHMARKS(CURRENT, BASELINE, THRESHOLD=REGRESSION_THRESHOLD):
+    compared = list(COMPARED_VALUES)
+    for name in CURRENT.get('micro', {}):
+        if name in BASELINE.get('micro', {}):
+            compared.append(('micro', name, True))
+    rows = []
+    for section, name, higher_is_better in compared:
+        if section == 'micro':
+            current, baseline, label = CURRENT['micro'][name]['per_second'], BASELINE['micro'][name]['per_second'], name
+        else:
+            current, baseline, label = CURRENT[section].get(name), BASELINE.get(section, {}).get(name), name
+        if current is None or baseline is None or baseline == 0:
+            rows.append((label, baseline, current, None, False))
+            continue
+        change = current/baseline - 1
+        threshold = 0 if section != 'micro' and name in EXACT_VALUES else THRESHOLD
+        regression = change < -threshold if higher_is_better else change > threshold
+        rows.append((label, baseline, current, change, regression))
+    baseline_targets = {record['target_name']: record for record in BASELINE.get('end_to_end', {}).get('per_target', [])}
+    changed = []
+    for record in CURRENT['end_to_end']['per_target']:
+        before = baseline_targets.get(record['target_name'])
+        if before is not None and (before['status'], before['design']) != (record['status'], record['design']):
+            changed.append((record['target_name'], before['status'], record['status']))
+    return rows, changed
+
+
+def RATE(VALUE, DIGITS):
+    return 'n/a' if VALUE is None else round(VALUE, DIGITS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StrobProbe benchmark suite - kernel micro benchmarks & end-to-end designs of a seeded corpus')
+    parser.add_argument('--params', default='Sensor_Parameters.csv', help='Sensor_Parameters.csv of the design point (its Target is in the corpus)')
+    parser.add_argument('--out', default='ProbeBench.json', help='JSON file for the results')
+    parser.add_argument('--baseline', default=None, help='Results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='Relative change flagged as a regression')
+    parser.add_argument('--lengths', type=int, nargs='+', default=list(CORPUS_LENGTHS), help='Lengths of the synthetic targets (targets above 50 nt take minutes each)')
+    parser.add_argument('--per-length', type=int, default=2, help='Synthetic targets of each length')
+    parser.add_argument('--corpus-seed', type=int, default=7, help='Seed of the synthetic targets')
+    parser.add_argument('--repeat', type=int, default=5, help='Timings of each micro benchmark (the best one is kept)')
+    parser.add_argument('--backend', default=None, help='Folding backend (default: STROBPROBE_FOLD_BACKEND or seqfold)')
+    parser.add_argument('--no-micro', action='store_true', help='Only run the end-to-end designs')
+    args = parser.parse_args(argv)
+
+    parameters = READ_PARAMETERS(args.params)
+    settings = DESIGN_SETTINGS(fuel_workers=1, fold_backend=args.backend)
+    result = RUN_BENCHMARKS(parameters, settings, args.lengths, args.per_length, args.corpus_seed, args.repeat, not args.no_micro, LOG=print)
+    end_to_end = result['end_to_end']
+    print('{0} targets ({1} designed) in {2:.2f} s - {3} designs/s, {4} folds/s over the designed targets, peak {5:.1f} MB traced'.format(
+        end_to_end['targets'], end_to_end['designed'], end_to_end['wall_time'], RATE(end_to_end['designs_per_s'], 3),
+        RATE(end_to_end['folds_per_s'], 1), end_to_end['peak_traced_mb']))
+    with open(args.out, 'w') as output:
+        json.dump(result, output, indent=1)
+    print('Results written to {0}'.format(os.path.abspath(args.out)))
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('corpus', {}).get('digest') != result['corpus']['digest'] or baseline.get('settings', {}).get('fold_backend') != result['settings']['fold_backend']:
+        print('WARNING: the baseline was run on another corpus, parameter set or folding backend')
+    rows, changed = COMPARE_BENCHMARKS(result, baseline, args.threshold)
+    print('--- Comparison with {0} ---'.format(args.baseline))
+    for label, before, after, change, regression in rows:
+        if change is None:
+            print('{0:24s} {1!s:>14} {2!s:>14}'.format(label, before, after))
+        else:
+            print('{0:24s} {1:14.4g} {2:14.4g} {3:+8.1%}{4}'.format(label, before, after, change, '  REGRESSION' if regression else ''))
+    for name, before, after in changed:
+        print('Design of {0} changed ({1} -> {2})'.format(name, before, after))
+    regressions = sum(row[4] for row in rows)
+    print('{0} regressions beyond {1:.0%}'.format(regressions, args.threshold))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
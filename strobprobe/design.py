@@ -0,0 +1,524 @@
+# StrobProbe design engine - the full sensor design (Place Holder, Probe 1 / Toe Hold 1, Fuel / Toe Hold 2 &
+# Probe Hairpin) as a library call:
+#
+#   from strobprobe.design import DESIGN_SENSOR, READ_PARAMETERS
+#   result = DESIGN_SENSOR(READ_PARAMETERS('Sensor_Parameters.csv'))
+#
+# Every stage is its own function taking the parameters, the results of the stages before it & a DESIGN_CONTEXT
+# (fold cache, hairpin engine, settings & log). Nothing is kept in module globals apart from the per-process
+# caches, nothing is printed unless a LOG function is given & a failed checkpoint raises DESIGN_ERROR
+# The stage results make up the DESIGN_RECORD of the design (strobprobe/records.py) - the ProbeDesign_{Target_Name}.txt
+# report is rendered from it & written by WRITE_REPORT
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from strobprobe.dimers import DIMERS, STRAND_MATRIX, WORST_UNINTENDED
+from strobprobe.foldcache import GET_FOLD_CACHE
+from strobprobe.folding import GET_BACKEND
+from strobprobe.fuel import FUEL_HAIRPIN_HIGH, FUEL_HAIRPIN_LOW, FUEL_SEARCH
+from strobprobe.hairpin import HAIRPIN_ENGINE
+from strobprobe.offtarget import GET_INDEX
+from strobprobe.profiling import DESIGN_PROFILE
+from strobprobe.records import DESIGN_RECORD_FROM, RENDER_REPORT
+from strobprobe.screen import HAIRPIN_ESTIMATE, HAIRPIN_SCREEN
+from strobprobe.strand import STRAND
+from strobprobe.thermo import GIBBS_CALC, GIBBS_FIXER, MELT_TEMP, THERMO_INDEX
+from strobprobe.toehold import TH2_SEARCH
+
+VERSION = 10
+# Digest of the strobprobe sources - part of every STAGE_KEY & journal key, so a stage result saved by other code (a
+# changed search, energy model or folding backend) is never reused
+def SOURCE_HASH():
+    folder = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for name in sorted(name for name in os.listdir(folder) if name.endswith('.py')):
+        with open(os.path.join(folder, name), 'rb') as source:
+            digest.update(name.encode('utf-8') + b'\0' + source.read())
+    return digest.hexdigest()
+
+
+SOURCE_DIGEST = SOURCE_HASH()
+# On-disk seqfold cache used by the command line & batch mode (the library default keeps folds in memory only)
+DEFAULT_FOLD_CACHE_FILE = os.environ.get('STROBPROBE_FOLD_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'strobprobe', 'fold_cache.sqlite'))
+
+# Sensor_Parameters.csv - one field per row, in this order (the field names of the file are not used)
+SENSOR_PARAMETERS = namedtuple('SENSOR_PARAMETERS', [
+    'target_name', 'target', 'salt_correction', 'temperature', 'gibbs_pht_max', 'gibbs_pht_min', 'toehold_min',
+    'ddg_pht_pph', 'p_hairpin_min', 'probe_spacer', 'fuel_loop', 'f_hairpin_min', 'ddg_fph_tph_max', 'ddg_fph_tph_min'])
+PARAMETER_TYPES = [str, str, float, float, float, float, int, int, int, str, str, int, int, int]
+# DG window of the probe hairpin (kcal/mol) - the fuel window is in strobprobe/fuel.py
+PROBE_HAIRPIN_LOW = -7
+PROBE_HAIRPIN_HIGH = -5
+
+# Run settings - see the README for the meaning of each value
+DESIGN_SETTINGS = namedtuple('DESIGN_SETTINGS', [
+    'fold_cache_file', 'fold_cache_size', 'hairpin_open_temp_max', 'hairpin_open_temp_tol', 'th2_seed',
+    'th2_max_candidates', 'fuel_candidates', 'fuel_workers', 'screen_margin', 'screen_audit', 'off_target_index', 'off_target_top',
+    'dimer_min_length', 'fold_backend'],
+    defaults=[None, 200000, 100, 0.1, 0, 200000, 8, 1, None, False, None, 10, 4, None])
+
+# Inputs of each stage of DESIGN_SENSOR - the SENSOR_PARAMETERS & DESIGN_SETTINGS fields it reads, the design constants it
+# uses & the stages whose results it builds on. STAGE_KEY digests them (with SOURCE_DIGEST), so a stage result can be
+# reused whenever its key comes back (e.g. only the probe end of a design changed) - the fuel neck search starts at
+# p_hairpin_min too
+STAGE_INPUTS = namedtuple('STAGE_INPUTS', ['parameters', 'settings', 'constants', 'stages'])
+DESIGN_STAGES = OrderedDict([
+    ('place_holder', STAGE_INPUTS(['target', 'salt_correction', 'temperature', 'gibbs_pht_max', 'gibbs_pht_min'], [], [], [])),
+    ('probe', STAGE_INPUTS(['salt_correction', 'temperature', 'toehold_min', 'ddg_pht_pph'], [], [], ['place_holder'])),
+    ('fuel', STAGE_INPUTS(['salt_correction', 'temperature', 'p_hairpin_min', 'fuel_loop', 'ddg_fph_tph_max', 'ddg_fph_tph_min'],
+                          ['hairpin_open_temp_max', 'hairpin_open_temp_tol', 'th2_seed', 'th2_max_candidates', 'fuel_candidates',
+                           'screen_margin', 'fold_backend'],
+                          [FUEL_HAIRPIN_LOW, FUEL_HAIRPIN_HIGH], ['place_holder', 'probe'])),
+    ('probe_hairpin', STAGE_INPUTS(['salt_correction', 'temperature', 'p_hairpin_min', 'probe_spacer'],
+                                   ['hairpin_open_temp_max', 'hairpin_open_temp_tol', 'screen_margin', 'fold_backend'],
+                                   [PROBE_HAIRPIN_LOW, PROBE_HAIRPIN_HIGH], ['fuel'])),
+    ('dimers', STAGE_INPUTS(['target', 'salt_correction', 'temperature'], ['dimer_min_length'], [], ['fuel', 'probe_hairpin'])),
+    ('off_target', STAGE_INPUTS(['target', 'salt_correction', 'temperature'], ['off_target_index'], [], ['fuel', 'probe_hairpin'])),
+])
+
+# Stage results - sequences are kept as strings, h (kcal/mol), s (kcal/Kmol), g / gcorr (kcal/mol), tm (C)
+# fuel_rejected: fuel neck lengths that passed the Gibbs check but did not unfold below hairpin_open_temp_max
+PLACE_HOLDER = namedtuple('PLACE_HOLDER', ['target', 'ph1', 'h_tph1', 's_tph1', 'g_tph1', 'gcorr_tph1', 'tm_tph1'])
+PROBE_1 = namedtuple('PROBE_1', ['th1', 'ph2', 'p1', 'h_ph2p', 's_ph2p', 'g_ph2p', 'gcorr_ph2p', 'tm_ph2p'])
+FUEL = namedtuple('FUEL', ['th2', 'f2', 'ph3', 'ph_final', 'fuel_final', 'fuel_loop', 'neck', 'k', 'ghpcorr_ftest', 'ghpcorr_f',
+                           'temp_open_f', 'h_fph3', 's_fph3', 'g_fph3', 'gcorr_fph3', 'tm_fph3', 'ddg_fph_tph',
+                           'th2_candidates', 'fuel_evaluated', 'fuel_rejected'], defaults=[0])
+PROBE_HAIRPIN = namedtuple('PROBE_HAIRPIN', ['p2', 'neck', 'k', 'probe_final', 'ghpcorr_ptest', 'ghpcorr_p', 'temp_open_p'])
+# hits: every scored hit of the final strands (strongest first, see strobprobe/offtarget.py) - off_target_hits & min_gcorr
+# leave out the on-target ones (min_gcorr is None without off-target hits) - bases: size of the background
+OFF_TARGET = namedtuple('OFF_TARGET', ['background', 'k', 'hits', 'off_target_hits', 'min_gcorr', 'bases'], defaults=[None])
+# Complete design - the stage results, the report text & the fold / pre-screen statistics of the run
+# record: DESIGN_RECORD of the design (strobprobe/records.py) - the report is rendered from it
+# dimers: strand interaction matrix (strobprobe/dimers.py) - None with DESIGN_SETTINGS.dimer_min_length = None
+# off_target is None unless DESIGN_SETTINGS.off_target_index is set - metrics: per-stage metrics (strobprobe/profiling.py)
+DESIGN_RESULT = namedtuple('DESIGN_RESULT', ['target_name', 'target', 'th1', 'th2', 'ph_final', 'fuel_final', 'probe_final',
+                                             'place_holder', 'probe', 'fuel', 'probe_hairpin', 'report', 'stats', 'dimers',
+                                             'off_target', 'metrics', 'record'],
+                           defaults=[None, None, None, None])
+
+
+# A design checkpoint that failed - the message is the one the script used to exit with
+# stage: name of the failing stage - result: what the stage got to before the checkpoint (missing values are None)
+# record, report & metrics: DESIGN_RECORD, report text up to & including the error & per-stage metrics up to the
+# failing stage (set by DESIGN_SENSOR)
+class DESIGN_ERROR(Exception):
+    def __init__(self, MESSAGE, STAGE, REPORT=None, RESULT=None):
+        super().__init__(MESSAGE)
+        self.stage = STAGE
+        self.report = REPORT
+        self.result = RESULT
+        self.record = None
+        self.metrics = None
+
+
+# Stage result KIND with only some of its fields known - the rest are None
+def PARTIAL(KIND, **VALUES):
+    return KIND(**{field: VALUES.get(field) for field in KIND._fields})
+
+
+# Parameters from the Sensor_Parameters table (pandas, no header - field name in column 0 & value in column 1)
+def PARAMETERS_FROM_TABLE(TABLE):
+    values = [TABLE.iloc[row, 1] for row in range(len(SENSOR_PARAMETERS._fields))]
+    return SENSOR_PARAMETERS(*[kind(value) for kind, value in zip(PARAMETER_TYPES, values)])
+
+
+def READ_PARAMETERS(FILE='Sensor_Parameters.csv'):
+    return PARAMETERS_FROM_TABLE(pd.read_csv(FILE, header=None))
+
+
+# Accept SENSOR_PARAMETERS, a dict of its fields, a parameter table or the path of a Sensor_Parameters.csv
+def AS_PARAMETERS(PARAMETERS):
+    if isinstance(PARAMETERS, SENSOR_PARAMETERS):
+        return PARAMETERS
+    if isinstance(PARAMETERS, dict):
+        return SENSOR_PARAMETERS(*[kind(PARAMETERS[field]) for kind, field in zip(PARAMETER_TYPES, SENSOR_PARAMETERS._fields)])
+    if isinstance(PARAMETERS, pd.DataFrame):
+        return PARAMETERS_FROM_TABLE(PARAMETERS)
+    return READ_PARAMETERS(PARAMETERS)
+
+
+# One hairpin engine per process, folding backend & fold cache file - repeated designs in the same process reuse its
+# folded structures & with an on-disk FOLDS cache they are saved there for the next run too
+SHARED_ENGINES = {}
+
+
+def GET_ENGINE(BACKEND=None, FOLDS=None):
+    key = (os.getpid(), GET_BACKEND(BACKEND).name, None if FOLDS is None else FOLDS.file)
+    if key not in SHARED_ENGINES:
+        SHARED_ENGINES[key] = HAIRPIN_ENGINE(BACKEND=BACKEND, STORE=FOLDS)
+    return SHARED_ENGINES[key]
+
+
+# Digest of the inputs of stage NAME (DESIGN_STAGES) - KEYS: {stage: key} of the stages it builds on
+def STAGE_KEY(NAME, PARAMETERS, SETTINGS, KEYS):
+    inputs = DESIGN_STAGES[NAME]
+    settings = [GET_BACKEND(SETTINGS.fold_backend).name if field == 'fold_backend' else getattr(SETTINGS, field) for field in inputs.settings]
+    text = json.dumps([VERSION, SOURCE_DIGEST, NAME, [getattr(PARAMETERS, field) for field in inputs.parameters], settings, inputs.constants,
+                       [KEYS[stage] for stage in inputs.stages]])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+# Everything a design stage needs besides the parameters & the earlier stage results
+class DESIGN_CONTEXT:
+    def __init__(self, SETTINGS=None, FOLDS=None, ENGINE=None, LOG=None, ON_STAGE=None, RESUME=None):
+        self.settings = SETTINGS if SETTINGS is not None else DESIGN_SETTINGS()
+        self.folds = FOLDS if FOLDS is not None else GET_FOLD_CACHE(self.settings.fold_cache_file, self.settings.fold_cache_size,
+                                                                    BACKEND=self.settings.fold_backend)
+        self.engine = ENGINE if ENGINE is not None else GET_ENGINE(self.settings.fold_backend, self.folds)
+        self.log = LOG
+        self.on_stage = ON_STAGE
+        self.resume = RESUME if RESUME is not None else {}
+        self.results = {}
+        self.keys = {}
+        self.profile = DESIGN_PROFILE(self.folds, self.engine)
+        # Agreement of the neck length pre-screen with seqfold - fuel window [-6, -2] & probe window [-7, -5] kcal/mol
+        margin, audit = self.settings.screen_margin, self.settings.screen_audit
+        self.fuel_screen = HAIRPIN_SCREEN(FUEL_HAIRPIN_LOW, FUEL_HAIRPIN_HIGH, margin, audit) if margin is not None else None
+        self.probe_screen = HAIRPIN_SCREEN(PROBE_HAIRPIN_LOW, PROBE_HAIRPIN_HIGH, margin, audit) if margin is not None else None
+
+    def LOG(self, *MESSAGE):
+        if self.log is not None:
+            self.log(*MESSAGE)
+
+    # Run FUNCTION(PARAMETERS, *ARGUMENTS) as stage NAME of DESIGN_SENSOR & of the metrics - a stage whose STAGE_KEY is in
+    # RESUME is not run again, its result is taken from there (strobprobe/journal.py). The result, metrics & key of the
+    # stage go to ON_STAGE
+    def STAGE(self, NAME, FUNCTION, PARAMETERS, *ARGUMENTS):
+        key = self.keys[NAME] = STAGE_KEY(NAME, PARAMETERS, self.settings, self.keys)
+        try:
+            with self.profile.STAGE(NAME) as record:
+                if key in self.resume:
+                    result = self.resume[key]
+                    self.LOG('\n--- {0} reused - its inputs did not change ---'.format(NAME))
+                    record['resumed'] = True
+                else:
+                    result = FUNCTION(PARAMETERS, *ARGUMENTS)
+        finally:
+            self.folds.FLUSH()     # the folds of the stage go to the on-disk cache in one write
+        self.results[NAME] = result
+        if self.on_stage is not None:
+            self.on_stage(NAME, result, self.profile.stages[NAME], key)
+        return result
+
+    def FAIL(self, MESSAGE, STAGE, RESULT=None):
+        raise DESIGN_ERROR(MESSAGE, STAGE, RESULT=RESULT)
+
+    def STATS(self):
+        return {'folds': self.folds.STATS(),
+                'fuel_screen': self.fuel_screen.STATS() if self.fuel_screen is not None else None,
+                'probe_screen': self.probe_screen.STATS() if self.probe_screen is not None else None}
+
+
+# Target of the design (the report header is rendered from the record)
+def DESIGN_HEADER(PARAMETERS, CONTEXT):
+
+    CONTEXT.LOG('----- Target Identified -----')
+    CONTEXT.LOG('T= {}'.format(PARAMETERS.target))
+    CONTEXT.LOG('Length of Target = {}'.format(len(PARAMETERS.target)))
+
+
+#####################################   PLACE HOLDER   #####################################
+# Target - Place Holder 1 (complement of the Target, includes Toe Hold 1) thermodynamics & the Gibbs window check
+def PLACE_HOLDER_STAGE(PARAMETERS, CONTEXT=None):
+    context = CONTEXT if CONTEXT is not None else DESIGN_CONTEXT()
+    salt_corr, temperature = PARAMETERS.salt_correction, PARAMETERS.temperature
+    context.LOG('\n--- Analyzing Target with Place Holder 1 (including Toe Hold 1) ---')
+    target = STRAND(PARAMETERS.target)
+    ph1 = target.reverse_complement()   # PH1 = Complement of Target (includes TH1)
+    context.LOG('PH= {}'.format(ph1))
+    phosphates = len(target)
+    # Determining Target - Place Holder 1 Thermodynamics from the cumulative Nearest-Neighbor index of the Target
+    h, s, g = THERMO_INDEX(target).THERMO(0, phosphates)
+    context.LOG('Target-PlaceHolder1 DG: {} (kcal/mol)'.format(round(g, 4)))
+
+    # Gibbs Free Energy corrected for the Temperature, Length, & Salt
+    gcorr = GIBBS_CALC(temperature, h, s) - GIBBS_FIXER(phosphates, salt_corr)
+    tm = MELT_TEMP(h, s, salt_corr)-273.15
+
+    # CHECK POINT - Corrected Gibbs has to be between GIBBS_PHT_MIN & GIBBS_PHT_MAX
+    result = PLACE_HOLDER(str(target), str(ph1), h, s, g, gcorr, tm)
+    context.LOG('\n--- CHECK POINT ---')
+    if gcorr < PARAMETERS.gibbs_pht_max:
+        context.FAIL('ERROR: The resulting Gibbs is too large/negative - you can try using a shorter target sequence \n Gibbs PH-P Limit = {0} \n Corrected Gibbs T-PH = {1}'.format(PARAMETERS.gibbs_pht_max, gcorr), 'place_holder', result)
+    if gcorr > PARAMETERS.gibbs_pht_min:
+        context.FAIL('ERROR: The resulting Gibbs is too small/positive - you can try using a longer target sequence \n Gibbs PH-P min Limit = {0} \n Corrected Gibbs T-PH = {1}'.format(PARAMETERS.gibbs_pht_min, gcorr), 'place_holder', result)
+    context.LOG('{0} kcal/mol > Corrected Gibbs Free Energy > {1} kcal/mol \n Calculated Target-Placeholder Hybridization = {2} kcal/mol'.format(PARAMETERS.gibbs_pht_min, PARAMETERS.gibbs_pht_max, round(gcorr, 1)))
+    return result
+
+
+#####################################   PROBE 1   #####################################
+# Toe Hold 1 - the smallest truncation of PH1 whose Place Holder 2 - Probe 1 hybrid is DDG_PHT_PPH weaker than T-PH1
+def PROBE_STAGE(PARAMETERS, PLACE_HOLDER_RESULT, CONTEXT=None):
+    context = CONTEXT if CONTEXT is not None else DESIGN_CONTEXT()
+    salt_corr, temperature = PARAMETERS.salt_correction, PARAMETERS.temperature
+    ph1 = STRAND(PLACE_HOLDER_RESULT.ph1)
+    phosphates_t = len(PLACE_HOLDER_RESULT.target)
+    context.LOG('\n--------------- Finding Toe Hold 1 ---------------')
+    # Every Toe Hold 1 length is scored at once - PH2 = PH1[TH1:] hybridizes with the first len(TARGET)-TH1 bases of the Target
+    th1_lengths = np.arange(PARAMETERS.toehold_min, len(ph1))
+    phosphates_ph2 = phosphates_t - th1_lengths
+    h_all, s_all, g_all = THERMO_INDEX(PLACE_HOLDER_RESULT.target).THERMO(np.zeros_like(phosphates_ph2), phosphates_ph2)
+    gcorr_all = GIBBS_CALC(temperature, h_all, s_all) - GIBBS_FIXER(phosphates_ph2, salt_corr)
+    # CHECK POINT Probe - Placeholder: Gcorr_PH2P - Gcorr_TPH1 > DDG_PHT_PPH - the smallest Toe Hold 1 that passes is used
+    passed = np.flatnonzero(gcorr_all - PLACE_HOLDER_RESULT.gcorr_tph1 > PARAMETERS.ddg_pht_pph)
+    if len(passed) == 0:
+        context.FAIL('ERROR: A Probe for the indicated Target cannot be found', 'probe')
+    th1_length = int(th1_lengths[passed[0]])
+    context.profile.COUNT('probe', th1_lengths_scored=len(th1_lengths), th1_lengths_passed=len(passed), th1_length=th1_length)
+    context.LOG('\n----- No. of elements removed:', th1_length, '-----')
+    ph2 = ph1[th1_length:len(ph1)]     # Placeholder without Toe Holder 1 Sequence
+    th1 = ph1[0:th1_length]     # Toe Hold 1 Sequence
+    context.LOG("Toe Hold 1 CHECK: ", th1)
+    p1 = ph2.reverse_complement()
+    h, s, g = float(h_all[passed[0]]), float(s_all[passed[0]]), float(g_all[passed[0]])
+    gcorr = float(gcorr_all[passed[0]])
+    context.LOG('Calculated Probe 1 - Place Holder 2 = {0} kcal/mol'.format(round(PLACE_HOLDER_RESULT.gcorr_tph1 + PARAMETERS.ddg_pht_pph, 3)))
+    context.LOG('\n----- Identified Toe Hold 1 -----')
+
+    context.LOG('\n--- Analyzing Place Holder 2 with Probe 1 (NOT including Toe Hold 1) ---\n')
+    tm = MELT_TEMP(h, s, salt_corr)-273.15
+    return PROBE_1(str(th1), str(ph2), str(p1), h, s, g, gcorr, tm)
+
+
+#####################################   FUEL GENERATOR   #####################################
+# Outcome of the fuel hairpin of one Toe Hold 2 candidate for the metrics - does_not_open: a neck length passed the
+# Gibbs check but the hairpin does not unfold below the opening temperature limit
+def FUEL_OUTCOME(HAIRPIN):
+    if HAIRPIN.passed:
+        outcome = 'passed'
+    elif HAIRPIN.rejected:
+        outcome = 'does_not_open'
+    else:
+        outcome = 'no_neck_in_window'
+    return {'th2': HAIRPIN.th2, 'outcome': outcome, 'necks_tried': len(HAIRPIN.steps), 'ghpcorr_ftest': HAIRPIN.ghpcorr_ftest}
+
+
+# Toe Hold 2 (seeded NN search) & the fuel hairpin - the first Toe Hold 2 candidate whose fuel hairpin passes is kept
+def FUEL_STAGE(PARAMETERS, PLACE_HOLDER_RESULT, PROBE_RESULT, CONTEXT=None):
+    context = CONTEXT if CONTEXT is not None else DESIGN_CONTEXT()
+    settings = context.settings
+    salt_corr, temperature = PARAMETERS.salt_correction, PARAMETERS.temperature
+    # Initial Fuel strand is the Target minus TH1 - Toe Hold 2 has to be larger than Toe Hold 1
+    f1 = STRAND(PLACE_HOLDER_RESULT.target)[:-len(PROBE_RESULT.th1)].lower()
+    ph2 = STRAND(PROBE_RESULT.ph2)
+    th1 = STRAND(PROBE_RESULT.th1)
+    ddg_max, ddg_min = PARAMETERS.ddg_fph_tph_max, PARAMETERS.ddg_fph_tph_min
+
+    # Toe Hold 2 search - candidates are pruned on the Nearest-Neighbor DDG alone (strobprobe/toehold.py)
+    context.LOG('\n--- Searching for a Toe Hold 2 (seed {0}) ---'.format(settings.th2_seed))
+    found = TH2_SEARCH(ph2, len(th1), len(PLACE_HOLDER_RESULT.target)-2, temperature, salt_corr, PLACE_HOLDER_RESULT.gcorr_tph1,
+                       ddg_min, ddg_max, len(PLACE_HOLDER_RESULT.target), SEED=settings.th2_seed, COUNT=settings.fuel_candidates,
+                       MAX_CANDIDATES=settings.th2_max_candidates)
+    context.LOG('{0} Toe Hold 2 candidates scored'.format(found.candidates))
+    context.profile.COUNT('fuel', th2_candidates=found.candidates, th2_valid=len(found.toe_holds), th2_search_complete=found.complete,
+                          th2_outcomes=found.outcomes)
+    if len(found.toe_holds) == 0:
+        context.FAIL('ERROR: Could Not identify a Toe Hold 2 for Fuel Strand ({0} candidates scored)'.format(found.candidates), 'fuel',
+                     PARTIAL(FUEL, th2_candidates=found.candidates))
+
+    # FUEL STRUCTURE & HAIRPIN CHECK for the Toe Hold 2 candidates (strobprobe/fuel.py)
+    fuel_loop = STRAND('{0}'.format(PARAMETERS.fuel_loop))
+    context.LOG('Fuel Hairpin Check ({0} Toe Hold 2 candidates, {1} workers)'.format(len(found.toe_holds), settings.fuel_workers))
+    fuel = FUEL_SEARCH([toe_hold.th2 for toe_hold in found.toe_holds], f1, fuel_loop, PARAMETERS.p_hairpin_min, temperature, salt_corr,
+                       settings.hairpin_open_temp_max, settings.hairpin_open_temp_tol, FOLDS=context.folds, ENGINE=context.engine,
+                       WORKERS=settings.fuel_workers, FOLD_CACHE_FILE=settings.fold_cache_file, FOLD_CACHE_SIZE=settings.fold_cache_size,
+                       SCREEN_MARGIN=settings.screen_margin, SCREEN_AUDIT=settings.screen_audit, FOLD_BACKEND=settings.fold_backend)
+    if context.fuel_screen is not None:
+        for record in fuel.screen:
+            context.fuel_screen.RECORD(*record)
+    toe_hold = found.toe_holds[fuel.index]
+    context.LOG('{0} fuel hairpins checked'.format(fuel.evaluated))
+    context.profile.COUNT('fuel', fuel_candidates=len(found.toe_holds), fuel_evaluated=fuel.evaluated,
+                          fuel_outcomes=[FUEL_OUTCOME(hairpin) for hairpin in fuel.hairpins])
+    for hairpin in fuel.hairpins:
+        for k_step, ghpcorr_step, open_step, seconds in hairpin.steps:
+            context.profile.ITERATION('fuel', th2=hairpin.th2, k=k_step, ghpcorr=ghpcorr_step, open_temp=open_step, seconds=seconds)
+
+    th2 = toe_hold.th2
+    context.LOG("Toe Hold 2 CHECK ({0} elements): ".format(len(th2)), th2)
+    f2 = th2 + f1
+    ph3 = ph2 + STRAND(th2).reverse_complement()   # TH1 is not included in the Place Holder-Fuel hybridization
+
+    # FUEL STRUCTURE CHECK: Looking for potential secondary structures in build strand
+    if fuel.hairpin.ghpcorr_ftest <= -4:
+        context.LOG('\n~~~ WARNING: Unwanted Secondary Structure in Fuel ~~~ \n')
+    else:
+        context.LOG('\n~~~ No Unwanted Secondary Structure in Fuel Detected ~~~\n')
+
+    # FUEL HAIRPIN CHECK: Neck of the Fuel from the neck length loop
+    for k_rejected, ghpcorr_rejected in fuel.hairpin.rejected:
+        context.LOG('Fuel Hairpin Loop length {0} passes the Gibbs check ({1} kcal/mol) but will not unfold below {2} C'.format(k_rejected, ghpcorr_rejected, settings.hairpin_open_temp_max))
+    neck = fuel.hairpin.neck    # 3' Segment of Fuel Identified for Neck
+    fuel_final = fuel.hairpin.fuel     # Fuel including complement of neck
+    temp_open_f = None
+    if fuel.hairpin.passed:
+        context.LOG('Fuel Hairpin Loop length: {0}'.format(fuel.hairpin.k))
+        context.LOG('Fuel Hairpin Neck length: {0}'.format(neck))
+        context.LOG('Hairpin passes Gibbs check = ', fuel.hairpin.ghpcorr_f, '(kcal/mol)')
+        temp_open_f = fuel.hairpin.open_temp
+        context.LOG('The fuel hairpin will open at {0} C in {1} M monovalent salt ({2} folds).\n'.format(round(temp_open_f, 2), salt_corr, fuel.hairpin.folds))
+
+    # FUEL-PLACEHOLDER HYBRIDIZATION CHECK: Fuel 2 - Place Holder 3 Thermodynamics of the Toe Hold 2 from the search
+    tm = MELT_TEMP(toe_hold.h, toe_hold.s, salt_corr)-273.15
+    context.LOG('--- Check Point ---')
+    context.LOG(fuel_final)
+    context.LOG('DD Gibbs FPH - TPH = {0} kcal/mol'.format(round(toe_hold.ddg, 1)))
+    context.LOG('\n----- Fuel Identified -----')
+    context.LOG('{0} kcal/mol < {1} kcal/mol < {2} kcal/mol'.format(ddg_min, round(toe_hold.ddg, 3), ddg_max))
+    ph_final = th1 + ph3   # Add TH1 back onto PH sequence that also includes the TH2
+
+    context.LOG('\n----- Identified Toe Hold 2 -----')
+    context.LOG("Final FUEL Strand Identified:")
+    context.LOG(fuel_final)
+    context.LOG("Final PLACE HOLDER Strand Identified:")
+    context.LOG(ph_final)
+    return FUEL(th2, str(f2), str(ph3), str(ph_final), str(fuel_final), str(fuel_loop), str(neck), fuel.hairpin.k,
+                fuel.hairpin.ghpcorr_ftest, fuel.hairpin.ghpcorr_f, temp_open_f, toe_hold.h, toe_hold.s, toe_hold.g,
+                toe_hold.gcorr, tm, toe_hold.ddg, found.candidates, fuel.evaluated, len(fuel.hairpin.rejected))
+
+
+#####################################   PROBE GENERATOR   #####################################
+# Probe hairpin: Spacer - TH2* - PH* - Hairpin Loop - Neck Complement
+def PROBE_HAIRPIN_STAGE(PARAMETERS, FUEL_RESULT, CONTEXT=None):
+    context = CONTEXT if CONTEXT is not None else DESIGN_CONTEXT()
+    settings = context.settings
+    salt_corr, temperature = PARAMETERS.salt_correction, PARAMETERS.temperature
+    # Add TH2 complement onto beginning of P1 - Complement of PH3
+    p2 = STRAND(FUEL_RESULT.ph3).reverse_complement()   # PH3 = PH2 + TH2 complement (No TH1)
+
+    # CHECK POINT - Generating the Neck to add to the 5' end to form the Probe Hairpin
+    k = PARAMETERS.p_hairpin_min     # Minimum No. of elements in the Hairpin
+    check = True
+    context.LOG('\nProbe Hairpin Check:')
+
+    ghpcorr_ptest = context.folds.DG(p2, temperature, salt_corr)     # Gibbs Free Energy of the Probe without hairpin
+    if ghpcorr_ptest <= -3:
+        context.LOG('\n~~~ WARNING: Unwanted Secondary Structure in Fuel ~~~ \n')
+    else:
+        context.LOG('\n~~~ No Unwanted Secondary Structure in Fuel Detected ~~\n')
+
+    screen = context.probe_screen
+    while check:
+        started = time.perf_counter()
+        opened = None
+        neck = p2[len(p2)-k:len(p2)]    # Extra portion of probe to make the hairpin loop
+        neck_comp = neck.reverse_complement()     # Add the portion to end of probe for the neck of the hairpin
+        probe_check = neck_comp + p2     # Complete Probe Strand to check (NECK COMP + P1 including NECK)
+        context.LOG('Checking Hairpin: {}'.format(probe_check))
+        # NN pre-screen - the designed stem & loop (loop = P2 without the neck) already more stable than the Gibbs check
+        estimate = HAIRPIN_ESTIMATE(neck, len(p2)-k, temperature, salt_corr, OUTER=-1)
+        skip = screen is not None and screen.SKIP(estimate)
+        if skip and not screen.audit:
+            screen.RECORD(estimate, None, True)
+            context.LOG('\nEstimated Hairpin DG: {0} (kcal/mol) - too stable, not folded'.format(round(estimate, 2)))
+        else:
+            # Use Seq Fold to determine if the hairpin will fold at TEMPERATURE
+            ghpcorr_p = context.folds.DG(probe_check, temperature, salt_corr)     # Gibbs Free Energy of the Folded Probe
+            if screen is not None:
+                screen.RECORD(estimate, ghpcorr_p, skip)
+            context.LOG('\nChecking Corrected Hairpin DG: {} (kcal/mol)'.format(ghpcorr_p))
+        if not skip and PROBE_HAIRPIN_LOW <= ghpcorr_p <= PROBE_HAIRPIN_HIGH:
+            context.LOG('\nProbe Hairpin Loop length: {0}'.format(k))
+            context.LOG('Probe Hairpin Neck: {0}'.format(neck))
+            context.LOG('Hairpin passes Gibbs check: ', ghpcorr_p, '(kcal/mol)')
+            probe_test = '{0}'.format(PARAMETERS.probe_spacer) + probe_check
+            # Check if the hairpin folds & unfolds - the temperature where DG from Seq Fold is 0
+            opened = context.engine.OPEN_TEMP(probe_test, salt_corr, temperature, settings.hairpin_open_temp_max, TOL=settings.hairpin_open_temp_tol)
+            if opened.temp is not None:
+                temp_open_p = opened.temp
+                context.LOG('The probe hairpin will open at', round(temp_open_p, 2), 'C in', salt_corr, 'M monovalent salt ({0} folds).'.format(opened.folds))
+                check = False
+            else:
+                context.LOG('This hairpin will not unfold - try a larger haripin loop')
+        context.profile.ITERATION('probe_hairpin', k=k, ghpcorr=None if skip else ghpcorr_p, open_temp=None if opened is None else opened.temp,
+                                  seconds=time.perf_counter()-started)
+        if k == ((len(probe_check)/2)-2):
+            context.FAIL('ERROR: The Hairpin does not work - you need a different Target', 'probe_hairpin',
+                         PARTIAL(PROBE_HAIRPIN, p2=str(p2), ghpcorr_ptest=ghpcorr_ptest))
+        k = k + 1
+    context.LOG('\n --- Hairpin Generated ---')
+    probe_final = probe_test
+    context.LOG("Final PROBE Strand Identified:")
+    context.LOG(probe_final)
+    return PROBE_HAIRPIN(str(p2), str(neck), k, str(probe_final), ghpcorr_ptest, ghpcorr_p, temp_open_p)
+
+
+#####################################   STRAND INTERACTIONS   #####################################
+# Best local duplex of every pair of final strands (self dimers included) - one batched pass over the 10 pairs
+def DIMER_STAGE(PARAMETERS, FUEL_RESULT, HAIRPIN_RESULT, CONTEXT=None):
+    context = CONTEXT if CONTEXT is not None else DESIGN_CONTEXT()
+    min_length = context.settings.dimer_min_length
+    strands = {'T': PARAMETERS.target, 'PH_final': FUEL_RESULT.ph_final, 'FUEL_final': FUEL_RESULT.fuel_final,
+               'PROBE_final': HAIRPIN_RESULT.probe_final}
+    matrix = STRAND_MATRIX(strands, PARAMETERS.temperature, PARAMETERS.salt_correction, min_length)
+    worst_pair, worst_gcorr = WORST_UNINTENDED(matrix)
+    if worst_pair is not None:
+        context.LOG('\n--- Strongest unintended strand pair: {0} = {1} kcal/mol ---'.format(worst_pair, round(worst_gcorr, 3)))
+    return DIMERS(matrix, worst_pair, worst_gcorr)
+
+
+#####################################   OFF-TARGET SCREEN   #####################################
+# Seed hits of the final strands & their reverse complements in the background index, scored as NN duplexes
+def OFF_TARGET_STAGE(PARAMETERS, FUEL_RESULT, HAIRPIN_RESULT, CONTEXT=None):
+    context = CONTEXT if CONTEXT is not None else DESIGN_CONTEXT()
+    settings = context.settings
+    index = GET_INDEX(settings.off_target_index)
+    strands = {'PH_final': FUEL_RESULT.ph_final, 'FUEL_final': FUEL_RESULT.fuel_final, 'PROBE_final': HAIRPIN_RESULT.probe_final}
+    hits = index.SCREEN(strands, PARAMETERS.temperature, PARAMETERS.salt_correction, [PARAMETERS.target])
+    off_target = [hit for hit in hits if not hit.on_target]
+    context.LOG('\n--- Off-target screen: {0} hits outside of the Target ---'.format(len(off_target)))
+    for hit in off_target[:settings.off_target_top]:
+        line = '{0} {1} {2}:{3} - {4} bases {5} - Temp & Salt corrected Gibbs Free Energy {6} kcal/mol - Melting Temperature {7} C'.format(
+            hit.strand, hit.orientation, hit.record, hit.start+1, hit.length, hit.match, round(hit.gcorr, 3), round(hit.tm, 2))
+        context.LOG(line)
+    return OFF_TARGET(index.source, index.k, hits, len(off_target), off_target[0].gcorr if off_target else None, len(index))
+
+
+# Full sensor design - PARAMETERS: SENSOR_PARAMETERS (or a dict / parameter table / Sensor_Parameters.csv path)
+# FOLDS & ENGINE can be passed in to share warm caches - LOG (e.g. print) receives the progress messages
+# ON_STAGE(NAME, RESULT, METRICS, KEY) is called as each stage passes - RESUME: {STAGE_KEY: result} of stages that
+# already passed with the same inputs (they are not run again) - Raises DESIGN_ERROR when a checkpoint fails
+def DESIGN_SENSOR(PARAMETERS, SETTINGS=None, FOLDS=None, ENGINE=None, LOG=None, ON_STAGE=None, RESUME=None):
+    parameters = AS_PARAMETERS(PARAMETERS)
+    context = DESIGN_CONTEXT(SETTINGS, FOLDS, ENGINE, LOG, ON_STAGE, RESUME)
+    profile = context.profile
+    DESIGN_HEADER(parameters, context)
+    try:
+        place_holder = context.STAGE('place_holder', PLACE_HOLDER_STAGE, parameters, context)
+        probe = context.STAGE('probe', PROBE_STAGE, parameters, place_holder, context)
+        fuel = context.STAGE('fuel', FUEL_STAGE, parameters, place_holder, probe, context)
+        probe_hairpin = context.STAGE('probe_hairpin', PROBE_HAIRPIN_STAGE, parameters, fuel, context)
+        dimers = off_target = None
+        if context.settings.dimer_min_length is not None:
+            dimers = context.STAGE('dimers', DIMER_STAGE, parameters, fuel, probe_hairpin, context)
+        if context.settings.off_target_index:
+            off_target = context.STAGE('off_target', OFF_TARGET_STAGE, parameters, fuel, probe_hairpin, context)
+    except DESIGN_ERROR as error:
+        error.metrics = profile.METRICS(parameters.target_name, parameters.target)
+        stages = dict(context.results)
+        if error.result is not None:
+            stages[error.stage] = error.result
+        error.record = DESIGN_RECORD_FROM(parameters, stages, context.settings, VERSION, error.stage,
+                                          str(error).strip().splitlines()[0].strip(), error.metrics)
+        error.report = RENDER_REPORT(error.record)
+        raise
+    metrics = profile.METRICS(parameters.target_name, parameters.target)
+    record = DESIGN_RECORD_FROM(parameters, context.results, context.settings, VERSION, METRICS=metrics)
+    return DESIGN_RESULT(parameters.target_name, parameters.target, probe.th1, fuel.th2, fuel.ph_final, fuel.fuel_final,
+                         probe_hairpin.probe_final, place_holder, probe, fuel, probe_hairpin, RENDER_REPORT(record), context.STATS(),
+                         dimers, off_target, metrics, record)
+
+
+# Write the ProbeDesign_{Target_Name}.txt report (a DESIGN_RESULT or the report of a DESIGN_ERROR) into FOLDER
+def WRITE_REPORT(REPORT, TARGET_NAME, FOLDER='.'):
+    path = os.path.join(FOLDER, 'ProbeDesign_{0}.txt'.format(TARGET_NAME))
+    with open(path, 'w') as report:
+        report.write(REPORT.report if hasattr(REPORT, 'report') else REPORT)
+    return path
@@ -0,0 +1,154 @@
+# Strand interaction (dimer) matrix - best local duplex of every pair of sensor strands
+# The intended hybrids (T-PH1, PH2-P1, F2-PH3) are checked by the design itself - this also scores the unintended ones
+# (Fuel-Probe, Probe-Target, Fuel-Fuel ...) that compete with them
+#
+# A local duplex of strands A & B is a stretch of A that is complementary to a stretch of B (antiparallel, no
+# mismatches - thermo.py has no mismatch parameters), scored like every other hybrid of the design:
+# INIT + terminal AT penalties + NN stacks, corrected with GIBBS_CALC & GIBBS_FIXER(length)
+# GIBBS_FIXER is linear in the length, so the best duplex ending at each base pair is found with one dynamic
+# programming pass along the diagonals of A against the reverse complement of B - vectorized over all strand pairs
+# of a block & over the bases of B, so a whole panel of designs is scored in one batched pass
+
+from collections import namedtuple
+
+import numpy as np
+
+from strobprobe.thermo import (ENCODE_BATCH, INIT_H, INIT_S, MELT_TEMP_ARRAY, NN_H, NN_S, TERMINAL_AT, TERMINAL_AT_H,
+                               TERMINAL_AT_S, UNKNOWN)
+
+COMPLEMENT_CODE = np.array([3, 2, 1, 0, UNKNOWN], dtype=np.int8)
+# Best duplex of each pair - gcorr (kcal/mol), tm (C), length (base pairs, 0 if the strands do not pair)
+# start_a / start_b: first base of the duplex on A & on B (0-based, B read 5' to 3')
+DIMER_PAIRS = namedtuple('DIMER_PAIRS', ['gcorr', 'tm', 'length', 'start_a', 'start_b'])
+# Matrix of a set of named strands - gcorr, tm & length are symmetric (n, n) arrays (NaN / 0 where nothing pairs)
+DIMER_MATRIX = namedtuple('DIMER_MATRIX', ['names', 'gcorr', 'tm', 'length'])
+# Design stage result - worst_pair: strongest pair that is not one of the intended hybrids (None if nothing pairs)
+DIMERS = namedtuple('DIMERS', ['matrix', 'worst_pair', 'worst_gcorr'])
+# Hybrids the sensor is designed to form
+INTENDED_PAIRS = {('T', 'PH_final'), ('PH_final', 'FUEL_final'), ('PH_final', 'PROBE_final')}
+
+
+# Best local duplex of STRANDS_A[p] with STRANDS_B[p] for every p - MIN_LENGTH: shortest duplex counted (base pairs)
+# Pairs are scored in blocks of BLOCK pairs
+def PAIR_DIMERS(STRANDS_A, STRANDS_B, TEMPERATURE, SALT_CORR, MIN_LENGTH=4, BLOCK=2048):
+    if len(STRANDS_A) != len(STRANDS_B):
+        raise ValueError('STRANDS_A & STRANDS_B need the same number of strands')
+    parts = [BLOCK_DIMERS(STRANDS_A[first:first+BLOCK], STRANDS_B[first:first+BLOCK], TEMPERATURE, SALT_CORR, MIN_LENGTH)
+             for first in range(0, len(STRANDS_A), BLOCK)]
+    if not parts:
+        return DIMER_PAIRS(*[np.zeros(0)]*2, *[np.zeros(0, dtype=np.int64)]*3)
+    return DIMER_PAIRS(*[np.concatenate(values) for values in zip(*parts)])
+
+
+def BLOCK_DIMERS(STRANDS_A, STRANDS_B, TEMPERATURE, SALT_CORR, MIN_LENGTH):
+    kelvin = TEMPERATURE+273.15
+    per_base = 0.114/2*np.log(SALT_CORR)     # GIBBS_FIXER of one base
+    codes_a, lengths_a = ENCODE_BATCH([str(strand).lower() for strand in STRANDS_A])
+    codes_b, lengths_b = ENCODE_BATCH([str(strand).lower() for strand in STRANDS_B])
+    # Reverse complement of B, right aligned so that position j of the row is base lengths_b-1-j of B
+    width = codes_b.shape[1]
+    reverse = np.full_like(codes_b, UNKNOWN)
+    for row, length in enumerate(lengths_b):
+        reverse[row, :length] = COMPLEMENT_CODE[codes_b[row, :length][::-1]]
+    pairs = len(lengths_a)
+    rows = np.arange(pairs)
+    terminal_h = TERMINAL_AT_H*TERMINAL_AT
+    terminal_s = TERMINAL_AT_S*TERMINAL_AT
+
+    # Open duplex ending at base i of A & position j of reverse B: h, s (cal), length
+    h = np.zeros((pairs, width))
+    s = np.zeros((pairs, width))
+    run = np.zeros((pairs, width), dtype=np.int64)
+    best = np.full(pairs, np.inf)
+    best_h, best_s = np.zeros(pairs), np.zeros(pairs)
+    best_length, best_i, best_j = np.zeros(pairs, dtype=np.int64), np.zeros(pairs, dtype=np.int64), np.zeros(pairs, dtype=np.int64)
+    previous = np.full(pairs, UNKNOWN, dtype=np.int8)
+    for i in range(codes_a.shape[1]):
+        base = codes_a[:, i]
+        match = (base[:, None] == reverse) & (base != UNKNOWN)[:, None]
+        # New duplex starting here or extension of the one ending at (i-1, j-1) by one NN stack
+        new_h = INIT_H + terminal_h[base]
+        new_s = INIT_S + terminal_s[base]
+        stack = 5*previous.astype(np.int64) + base
+        extend_h = np.full((pairs, width), np.inf)
+        extend_s = np.zeros((pairs, width))
+        extend_h[:, 1:] = np.where(run[:, :-1] > 0, h[:, :-1] + NN_H[stack][:, None], np.inf)
+        extend_s[:, 1:] = s[:, :-1] + NN_S[stack][:, None]
+        extended = np.zeros((pairs, width), dtype=np.int64)
+        extended[:, 1:] = run[:, :-1] + 1
+        extend_g = extend_h - kelvin*extend_s/1000 - per_base*extended
+        new_g = (new_h - kelvin*new_s/1000)[:, None] - per_base
+        take = extend_g < new_g
+        h = np.where(match, np.where(take, extend_h, new_h[:, None]), 0)
+        s = np.where(match, np.where(take, extend_s, new_s[:, None]), 0)
+        run = np.where(match, np.where(take, extended, 1), 0)
+        # Close the duplex at base i - terminal penalty of the last pair & the length correction
+        close_h = h + terminal_h[base][:, None]
+        close_s = s + terminal_s[base][:, None]
+        gcorr = np.where(match & (run >= MIN_LENGTH), close_h - kelvin*close_s/1000 - per_base*run, np.inf)
+        j = np.argmin(gcorr, axis=1)
+        better = gcorr[rows, j] < best
+        best = np.where(better, gcorr[rows, j], best)
+        best_h = np.where(better, close_h[rows, j], best_h)
+        best_s = np.where(better, close_s[rows, j], best_s)
+        best_length = np.where(better, run[rows, j], best_length)
+        best_i = np.where(better, i, best_i)
+        best_j = np.where(better, j, best_j)
+        previous = base
+
+    found = np.isfinite(best)
+    tm = np.where(found, MELT_TEMP_ARRAY(best_h, best_s/1000, SALT_CORR)-273.15, np.nan)
+    start_a = np.where(found, best_i - best_length + 1, 0)
+    # Last pair of the duplex is reverse B position best_j = base lengths_b-1-best_j of B, the first base on B
+    start_b = np.where(found, lengths_b - 1 - best_j, 0)
+    return np.where(found, best, np.nan), tm, np.where(found, best_length, 0), start_a, start_b
+
+
+# Dimer matrix of the named strands {name: sequence} - the upper triangle (self dimers included) in one batched pass
+def STRAND_MATRIX(STRANDS, TEMPERATURE, SALT_CORR, MIN_LENGTH=4):
+    names = list(STRANDS)
+    sequences = [str(STRANDS[name]) for name in names]
+    first, second = np.triu_indices(len(names))
+    pairs = PAIR_DIMERS([sequences[index] for index in first], [sequences[index] for index in second], TEMPERATURE, SALT_CORR, MIN_LENGTH)
+    gcorr = np.full((len(names), len(names)), np.nan)
+    tm = np.full((len(names), len(names)), np.nan)
+    length = np.zeros((len(names), len(names)), dtype=np.int64)
+    for matrix, values in ((gcorr, pairs.gcorr), (tm, pairs.tm), (length, pairs.length)):
+        matrix[first, second] = values
+        matrix[second, first] = values
+    return DIMER_MATRIX(names, gcorr, tm, length)
+
+
+# Strongest pair of a design matrix that is not one of INTENDED_PAIRS - (pair name, gcorr) or (None, None)
+def WORST_UNINTENDED(MATRIX):
+    worst, worst_gcorr = None, None
+    for first in range(len(MATRIX.names)):
+        for second in range(first, len(MATRIX.names)):
+            pair = (MATRIX.names[first], MATRIX.names[second])
+            gcorr = MATRIX.gcorr[first, second]
+            if pair in INTENDED_PAIRS or pair[::-1] in INTENDED_PAIRS or np.isnan(gcorr):
+                continue
+            if worst_gcorr is None or gcorr < worst_gcorr:
+                worst, worst_gcorr = '{0} - {1}'.format(*pair), float(gcorr)
+    return worst, worst_gcorr
+
+
+# Long table (one row per pair of the upper triangle) of a dimer matrix - a panel matrix names its strands
+# '{design}{NAME_SPLIT}{strand}' (the strand names of DIMER_STAGE), split into Design & Strand columns
+def MATRIX_ROWS(MATRIX, NAME_SPLIT=None):
+    rows = []
+    for first in range(len(MATRIX.names)):
+        for second in range(first, len(MATRIX.names)):
+            row = {}
+            names = []
+            for side, name in (('A', MATRIX.names[first]), ('B', MATRIX.names[second])):
+                design, strand = name.rsplit(NAME_SPLIT, 1) if NAME_SPLIT is not None else (None, name)
+                if NAME_SPLIT is not None:
+                    row['Design_{0}'.format(side)] = design
+                row['Strand_{0}'.format(side)] = strand
+                names.append((design, strand))
+            pair = (names[0][1], names[1][1])
+            row.update({'Gcorr': MATRIX.gcorr[first, second], 'Tm': MATRIX.tm[first, second], 'Length': int(MATRIX.length[first, second]),
+                        'Intended': names[0][0] == names[1][0] and (pair in INTENDED_PAIRS or pair[::-1] in INTENDED_PAIRS)})
+            rows.append(row)
+    return rows
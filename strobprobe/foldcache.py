@@ -0,0 +1,238 @@
+# Memoization of seqfold dg() - every hairpin / secondary structure check of the design folds a sequence at a
+# temperature & corrects the result for the monovalent salt. The fold itself is done by a folding backend
+# (strobprobe/folding.py - seqfold by default) & the results are kept in two tiers:
+#   - an in-process LRU (shared by every design run in the same Python process)
+#   - an on-disk SQLite table that survives between runs (optional - FILE=None keeps the cache in memory only)
+# Both tiers are size bounded & evict the least recently used entries - each backend has its own on-disk table
+# New folds & last-used times are kept in memory & written to disk in one short transaction (FLUSH) - after a batch of
+# folds, at the end of every design stage, every FLUSH_EVERY writes & when the process exits - so the write lock of the
+# shared file is never held while folding. The on-disk row count is checked when the cache is opened & at every FLUSH
+# The folded structures of the hairpin engine (strobprobe/hairpin.py) are kept in a second on-disk table of the same
+# file (OPEN_STRUCTURES) with the same bound, so a rerun does not fold its opening temperatures again either
+
+import atexit
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from seqfold import __version__ as SEQFOLD_VERSION
+
+from strobprobe.folding import GET_BACKEND
+
+
+# New folds kept in memory before they are written to disk
+FLUSH_EVERY = 256
+
+
+# Salt correction added to the seqfold Gibbs Free Energy (kcal/mol)
+def HAIRPIN_SALT_CORR(SALT_CORR):
+    return .0000015*(1000-(SALT_CORR*1000))**2
+
+
+class FOLD_CACHE:
+    def __init__(self, FILE=None, MAX_ENTRIES=200000, MEMORY_ENTRIES=20000, BACKEND=None):
+        self.backend = GET_BACKEND(BACKEND)
+        # seqfold keeps the table of earlier releases
+        self.table = 'folds' if self.backend.name == 'seqfold' else 'folds_{0}'.format(self.backend.name)
+        self.file = FILE
+        self.max_entries = MAX_ENTRIES
+        self.memory_entries = MEMORY_ENTRIES
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.pending = OrderedDict()
+        self.touched = {}
+        self.rows = 0
+        self.structures = None     # table of the hairpin engine structures (OPEN_STRUCTURES)
+        self.pending_structures = OrderedDict()
+        self.structure_rows = 0
+        self.structure_hits = 0
+        self.db = None
+        if FILE:
+            folder = os.path.dirname(os.path.abspath(FILE))
+            os.makedirs(folder, exist_ok=True)
+            self.db = sqlite3.connect(FILE, timeout=60)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS {0} (sequence TEXT, temp REAL, salt REAL, dg REAL, used REAL, '
+                            'PRIMARY KEY (sequence, temp, salt))'.format(self.table))
+            self.db.execute('CREATE INDEX IF NOT EXISTS {0}_used ON {0} (used)'.format(self.table))
+            # Values from another seqfold version are not reused
+            version_key = 'seqfold' if self.table == 'folds' else 'seqfold_{0}'.format(self.table)
+            version = self.db.execute('SELECT value FROM meta WHERE key = ?', (version_key,)).fetchone()
+            if version is None or version[0] != SEQFOLD_VERSION:
+                self.db.execute('DELETE FROM {0}'.format(self.table))
+                self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (version_key, SEQFOLD_VERSION))
+            self.db.commit()
+            self.EVICT()
+
+    @staticmethod
+    def KEY(SEQUENCE, TEMP, SALT_CORR):
+        return (str(SEQUENCE).lower(), float(TEMP), float(SALT_CORR))
+
+    # Cached value of a key (None if it was never folded) - every hit with a file renews the on-disk used time at the
+    # next FLUSH, so the folds served from memory are not the first ones evicted from disk
+    def LOOKUP(self, key):
+        if key in self.memory:
+            self.hits += 1
+            self.memory.move_to_end(key)
+            if self.db is not None:
+                self.touched[key] = time.time()
+            return self.memory[key]
+        if key in self.pending:
+            self.hits += 1
+            self.touched[key] = time.time()
+            self.REMEMBER(key, self.pending[key][0])
+            return self.pending[key][0]
+        if self.db is not None:
+            row = self.db.execute('SELECT dg FROM {0} WHERE sequence = ? AND temp = ? AND salt = ?'.format(self.table), key).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                self.touched[key] = time.time()
+                self.REMEMBER(key, row[0])
+                return row[0]
+        return None
+
+    def REMEMBER(self, key, value):
+        self.memory[key] = value
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def STORE(self, key, value):
+        self.misses += 1
+        if self.db is not None:
+            self.pending[key] = (value, time.time())
+            if len(self.pending) >= FLUSH_EVERY:
+                self.FLUSH()
+        self.REMEMBER(key, value)
+
+    # Write the new folds & last-used times to disk in one transaction & keep the tables within MAX_ENTRIES
+    def FLUSH(self):
+        if self.db is None or not (self.pending or self.touched or self.pending_structures):
+            return
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO {0} VALUES (?, ?, ?, ?, ?)'.format(self.table),
+                                [key + value for key, value in self.pending.items()])
+            self.db.executemany('UPDATE {0} SET used = ? WHERE sequence = ? AND temp = ? AND salt = ?'.format(self.table),
+                                [(used,) + key for key, used in self.touched.items()])
+            if self.pending_structures:
+                self.db.executemany('INSERT OR REPLACE INTO {0} VALUES (?, ?, ?, ?)'.format(self.structures),
+                                    [key + value for key, value in self.pending_structures.items()])
+        self.rows += len(self.pending)
+        self.structure_rows += len(self.pending_structures)
+        self.pending.clear()
+        self.touched.clear()
+        self.pending_structures.clear()
+        if self.rows > self.max_entries or self.structure_rows > self.max_entries:
+            self.EVICT()
+
+    # On-disk table of the hairpin engine structures - VERSION is the format of the saved values, a table written by
+    # another seqfold or engine version is emptied. Returns False for a cache without a file
+    def OPEN_STRUCTURES(self, VERSION):
+        if self.db is None:
+            return False
+        if self.structures is None:
+            self.structures = '{0}_structures'.format(self.table)
+            self.db.execute('CREATE TABLE IF NOT EXISTS {0} (sequence TEXT, temp REAL, value TEXT, used REAL, '
+                            'PRIMARY KEY (sequence, temp))'.format(self.structures))
+            self.db.execute('CREATE INDEX IF NOT EXISTS {0}_used ON {0} (used)'.format(self.structures))
+            version = '{0}/{1}'.format(SEQFOLD_VERSION, VERSION)
+            stored = self.db.execute('SELECT value FROM meta WHERE key = ?', (self.structures,)).fetchone()
+            if stored is None or stored[0] != version:
+                self.db.execute('DELETE FROM {0}'.format(self.structures))
+                self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (self.structures, version))
+            self.db.commit()
+            self.EVICT()
+        return True
+
+    # Saved structure value of SEQUENCE folded at TEMP (None if it was never saved)
+    def LOOKUP_STRUCTURE(self, SEQUENCE, TEMP):
+        key = (str(SEQUENCE), float(TEMP))
+        if key in self.pending_structures:
+            return json.loads(self.pending_structures[key][0])
+        row = self.db.execute('SELECT value FROM {0} WHERE sequence = ? AND temp = ?'.format(self.structures), key).fetchone()
+        if row is None:
+            return None
+        self.structure_hits += 1
+        return json.loads(row[0])
+
+    def STORE_STRUCTURE(self, SEQUENCE, TEMP, VALUE):
+        self.pending_structures[(str(SEQUENCE), float(TEMP))] = (json.dumps(VALUE), time.time())
+        if len(self.pending_structures) >= FLUSH_EVERY:
+            self.FLUSH()
+
+    # Temp & Salt corrected Gibbs Free Energy (kcal/mol) of the folded SEQUENCE at TEMP (C)
+    def DG(self, SEQUENCE, TEMP, SALT_CORR):
+        key = self.KEY(SEQUENCE, TEMP, SALT_CORR)
+        value = self.LOOKUP(key)
+        if value is None:
+            value = self.backend.DG(key[0], key[1]) + HAIRPIN_SALT_CORR(key[2])
+            self.STORE(key, value)
+        return value
+
+    # DG of every sequence of SEQUENCES - the ones not cached yet are folded in one backend batch
+    def DG_BATCH(self, SEQUENCES, TEMP, SALT_CORR):
+        keys = [self.KEY(sequence, TEMP, SALT_CORR) for sequence in SEQUENCES]
+        values = [self.LOOKUP(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, value in zip(keys, values) if value is None))
+        if missing:
+            folded = dict(zip(missing, self.backend.DG_BATCH([key[0] for key in missing], float(TEMP))))
+            for key in missing:
+                self.STORE(key, folded[key] + HAIRPIN_SALT_CORR(key[2]))
+            values = [value if value is not None else folded[key] + HAIRPIN_SALT_CORR(key[2]) for key, value in zip(keys, values)]
+        self.FLUSH()
+        return values
+
+    # Keep the on-disk tables within MAX_ENTRIES - least recently used (folds) / saved (structures) rows go first
+    def EVICT(self):
+        if self.db is None:
+            return
+        self.rows = self.EVICT_TABLE(self.table)
+        if self.structures is not None:
+            self.structure_rows = self.EVICT_TABLE(self.structures)
+
+    def EVICT_TABLE(self, TABLE):
+        count = self.db.execute('SELECT COUNT(*) FROM {0}'.format(TABLE)).fetchone()[0]
+        if count > self.max_entries:
+            with self.db:
+                self.db.execute('DELETE FROM {0} WHERE rowid IN (SELECT rowid FROM {0} ORDER BY used LIMIT ?)'.format(TABLE),
+                                (count-self.max_entries,))
+            count = self.max_entries
+        return count
+
+    def STATS(self):
+        return {'memory_hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'hit_rate': (self.hits+self.disk_hits)/max(1, self.hits+self.disk_hits+self.misses), 'structure_hits': self.structure_hits}
+
+    def CLOSE(self):
+        if self.db is not None:
+            self.FLUSH()
+            self.EVICT()
+            self.db.close()
+            self.db = None
+
+
+# One cache per file & backend in each process - repeated design runs in the same process (batch workers) stay warm
+# Keyed by process id too: a forked worker opens its own SQLite connection instead of sharing the parent's
+OPEN_CACHES = {}
+
+
+# Write the pending folds of every cache this process opened when it exits
+@atexit.register
+def CLOSE_CACHES():
+    for key, cache in list(OPEN_CACHES.items()):
+        if key[0] == os.getpid():
+            cache.CLOSE()
+
+
+def GET_FOLD_CACHE(FILE=None, MAX_ENTRIES=200000, MEMORY_ENTRIES=20000, BACKEND=None):
+    key = (os.getpid(), os.path.abspath(FILE) if FILE else None, GET_BACKEND(BACKEND).name)
+    if key not in OPEN_CACHES:
+        OPEN_CACHES[key] = FOLD_CACHE(key[1], MAX_ENTRIES, MEMORY_ENTRIES, key[2])
+    cache = OPEN_CACHES[key]
+    cache.max_entries = MAX_ENTRIES
+    cache.memory_entries = MEMORY_ENTRIES
+    return cache
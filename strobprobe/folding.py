@@ -0,0 +1,126 @@
+# Folding backends - every seqfold dg() of the design (fuel secondary structure check, neck length loops & hairpin
+# opening temperature scans) goes through one of these, chosen at run time:
+#   seqfold : seqfold.dg, one sequence at a time (the default)
+#   numpy   : strobprobe/npfold.py - the same recursion filled one anti-diagonal at a time with NumPy, equal-length
+#             sequences folded together in one batch
+#
+# A backend gives DG(SEQUENCE, TEMP) & DG_BATCH(SEQUENCES, TEMP) - the unrounded seqfold.dg value (kcal/mol) at TEMP (C),
+# without the salt correction (strobprobe/foldcache.py adds it). batched: DG_BATCH is faster than one DG per sequence
+# Selected with DESIGN_SETTINGS.fold_backend or the STROBPROBE_FOLD_BACKEND environment variable
+#
+#   python3 -m strobprobe.folding --backend numpy     checks a backend against seqfold.dg on the reference set
+#
+# FOLD_TOLERANCE: largest |DG - seqfold.dg| (kcal/mol) a backend may show on the reference set - seqfold rounds
+# every loop to 0.1, so a backend scoring the same structure can only differ by a rounding step of a loop
+
+import argparse
+import os
+import random
+import time
+from collections import namedtuple
+
+from seqfold import dg
+
+from strobprobe import npfold
+
+DEFAULT_FOLD_BACKEND = os.environ.get('STROBPROBE_FOLD_BACKEND', 'seqfold')
+FOLD_TOLERANCE = 0.1
+REFERENCE_TEMPERATURES = (20.0, 37.0, 55.0)
+# Reference set check of a backend - differences: (sequence, temperature, seqfold.dg, backend DG) beyond the tolerance
+REFERENCE_CHECK = namedtuple('REFERENCE_CHECK', ['backend', 'folds', 'max_difference', 'differences', 'seqfold_time', 'backend_time'])
+
+
+# folds: sequences folded by the backend in this process (the per-stage metrics of strobprobe/profiling.py read it)
+class SEQFOLD_BACKEND:
+    name = 'seqfold'
+    batched = False
+
+    def __init__(self):
+        self.folds = 0
+
+    def DG(self, SEQUENCE, TEMP):
+        self.folds += 1
+        return dg(str(SEQUENCE), temp=TEMP)
+
+    def DG_BATCH(self, SEQUENCES, TEMP):
+        return [self.DG(sequence, TEMP) for sequence in SEQUENCES]
+
+
+class NUMPY_BACKEND:
+    name = 'numpy'
+    batched = True
+
+    def __init__(self):
+        self.folds = 0
+
+    def DG(self, SEQUENCE, TEMP):
+        self.folds += 1
+        return npfold.DG(SEQUENCE, TEMP)
+
+    def DG_BATCH(self, SEQUENCES, TEMP):
+        self.folds += len(SEQUENCES)
+        return npfold.DG_BATCH(SEQUENCES, TEMP)
+
+
+FOLD_BACKENDS = {'seqfold': SEQFOLD_BACKEND, 'numpy': NUMPY_BACKEND}
+OPEN_BACKENDS = {}
+
+
+# Backend by name (None: DEFAULT_FOLD_BACKEND) - one instance per name
+def GET_BACKEND(NAME=None):
+    name = NAME if NAME is not None else DEFAULT_FOLD_BACKEND
+    if name not in FOLD_BACKENDS:
+        raise ValueError('Unknown fold backend {0} - one of {1}'.format(name, ', '.join(FOLD_BACKENDS)))
+    if name not in OPEN_BACKENDS:
+        OPEN_BACKENDS[name] = FOLD_BACKENDS[name]()
+    return OPEN_BACKENDS[name]
+
+
+# Reference set - the hairpin of the TEST design, a few fixed structures & seeded random strands of COUNT lengths
+# between 20 & 70 nt (groups of equal length, as the fuel / probe candidates of a design are)
+def REFERENCE_SEQUENCES(COUNT=12, PER_LENGTH=4, SEED=3):
+    generator = random.Random(SEED)
+    sequences = ['cgactcaccaaggtggtgtagggattatagagtcg', 'gcgcgaaaacgcgcttttttggccggaaaaccggcc', 'aaaaaaaaaaaaaaaaaaaa',
+                 'ggggccccaaaaggggcccc']
+    for length in sorted(generator.sample(range(20, 71), COUNT)):
+        sequences += [''.join(generator.choice('acgt') for _ in range(length)) for _ in range(PER_LENGTH)]
+    return sequences
+
+
+def CHECK_BACKEND(BACKEND, SEQUENCES=None, TEMPERATURES=REFERENCE_TEMPERATURES, TOL=FOLD_TOLERANCE):
+    backend = GET_BACKEND(BACKEND) if BACKEND is None or isinstance(BACKEND, str) else BACKEND
+    sequences = SEQUENCES if SEQUENCES is not None else REFERENCE_SEQUENCES()
+    differences = []
+    max_difference = 0.0
+    seqfold_time = backend_time = 0.0
+    for temp in TEMPERATURES:
+        start = time.perf_counter()
+        expected = [dg(str(sequence), temp=temp) for sequence in sequences]
+        seqfold_time += time.perf_counter() - start
+        start = time.perf_counter()
+        values = backend.DG_BATCH(sequences, temp)
+        backend_time += time.perf_counter() - start
+        for sequence, reference, value in zip(sequences, expected, values):
+            difference = 0.0 if reference == value else abs(value - reference)
+            max_difference = max(max_difference, difference)
+            if difference > TOL:
+                differences.append((sequence, temp, reference, value))
+    return REFERENCE_CHECK(backend.name, len(sequences)*len(TEMPERATURES), max_difference, differences, seqfold_time, backend_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check a StrobProbe folding backend against seqfold.dg on the reference set')
+    parser.add_argument('--backend', default='numpy', help='Backend to check ({0})'.format(', '.join(FOLD_BACKENDS)))
+    parser.add_argument('--count', type=int, default=12, help='Random strand lengths in the reference set')
+    parser.add_argument('--seed', type=int, default=3, help='Seed of the random strands')
+    args = parser.parse_args(argv)
+
+    check = CHECK_BACKEND(args.backend, REFERENCE_SEQUENCES(args.count, SEED=args.seed))
+    for sequence, temp, reference, value in check.differences:
+        print('{0} at {1} C: seqfold {2} - {3} {4}'.format(sequence, temp, reference, check.backend, value))
+    print('{0}: {1} folds, max |DG - seqfold.dg| = {2:.2f} kcal/mol ({3} beyond {4}) - seqfold {5:.2f} s, {0} {6:.2f} s'.format(
+        check.backend, check.folds, check.max_difference, len(check.differences), FOLD_TOLERANCE, check.seqfold_time, check.backend_time))
+
+
+if __name__ == '__main__':
+    main()
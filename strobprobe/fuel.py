@@ -0,0 +1,221 @@
+# Fuel hairpin stage - the seqfold part of the fuel generator for a list of Toe Hold 2 candidates
+# Each candidate goes through the fuel secondary structure check, the neck length loop (k upward until the
+# hairpin DG is inside [-6, -2] kcal/mol) & the hairpin opening temperature - all independent of the other
+# candidates, so they can be spread over a pool of worker processes
+# The first candidate (in search order) whose hairpin passes is kept & the outstanding work is cancelled,
+# so the design is the same whatever the number of workers
+# The pool is started once per process & reused by every FUEL_SEARCH - at most WORKERS candidates are in flight & the
+# running checks stop at their next neck length once the result is settled (the STOP flag of the search in the shared
+# stop flags of the pool), so no leftover check competes with the later stages for the CPU. Each search running on the
+# pool at the same time (threads of one process) has its own flag, so stopping one search never stops another
+# Neck lengths whose NN hairpin estimate is far below the DG window are not folded (strobprobe/screen.py)
+
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from strobprobe.foldcache import GET_FOLD_CACHE
+from strobprobe.folding import GET_BACKEND
+from strobprobe.hairpin import HAIRPIN_ENGINE
+from strobprobe.screen import HAIRPIN_ESTIMATE, HAIRPIN_SCREEN
+from strobprobe.strand import STRAND
+
+# Fuel hairpin of one Toe Hold 2 candidate
+# ghpcorr_ftest: seqfold DG of F2 (no hairpin) - k / neck / fuel / ghpcorr_f: last neck length tried & its fuel strand
+# open_temp: opening temperature of the accepted hairpin (None if no neck length passed) - folds: folds used for it
+# rejected: (k, DG) of the necks inside the DG window that did not unfold below T_MAX
+# screen: (estimate, DG or None, skipped) of every neck length for HAIRPIN_SCREEN
+# steps: (k, DG or None if not folded, opening temperature or None, seconds) of every neck length tried
+FUEL_HAIRPIN = namedtuple('FUEL_HAIRPIN', ['th2', 'ghpcorr_ftest', 'k', 'neck', 'fuel', 'ghpcorr_f', 'open_temp', 'folds', 'rejected', 'passed', 'screen',
+                                           'steps'], defaults=[()])
+# index: position of the kept candidate in the candidate list - evaluated: candidates with a finished fuel hairpin
+# screen: neck length records of all the evaluated candidates - hairpins: FUEL_HAIRPIN of every evaluated candidate
+FUEL_RESULT = namedtuple('FUEL_RESULT', ['index', 'hairpin', 'evaluated', 'screen', 'hairpins'], defaults=[()])
+# DG window of the fuel hairpin (kcal/mol)
+FUEL_HAIRPIN_LOW = -6
+FUEL_HAIRPIN_HIGH = -2
+
+# Hairpin engine of each worker process - kept warm between candidates, ((backend, fold cache file), HAIRPIN_ENGINE)
+WORKER_ENGINE = None
+# STOP flags of the pool the worker process belongs to - one per search running on the pool
+WORKER_STOPS = None
+# Searches that can run on one pool at the same time - a further search waits for a free STOP flag
+FUEL_STOP_SLOTS = 64
+# Worker pool, its shared STOP flags & the queue of the free ones
+FUEL_POOL = namedtuple('FUEL_POOL', ['executor', 'stops', 'slots'])
+# Fuel pool of each process & number of workers - {(pid, workers): FUEL_POOL}
+FUEL_POOLS = {}
+
+
+# Fuel structure check & neck length loop for one Toe Hold 2 - F2 = TH2 + F1
+# SCREEN_MARGIN=None folds every neck length - SCREEN_AUDIT folds the screened ones too (see HAIRPIN_SCREEN)
+# STOP: event checked before every neck length - once it is set the check gives up & returns None
+def FUEL_HAIRPIN_CHECK(TH2, F1, FUEL_LOOP, K_MIN, TEMPERATURE, SALT_CORR, T_MAX, TOL, FOLDS, ENGINE,
+                       SCREEN_MARGIN=None, SCREEN_AUDIT=False, STOP=None):
+    F2 = STRAND(TH2) + STRAND(F1)
+    F3 = F2 + STRAND(FUEL_LOOP)
+    ghpcorr_ftest = FOLDS.DG(F2, TEMPERATURE, SALT_CORR)
+    screen = HAIRPIN_SCREEN(FUEL_HAIRPIN_LOW, FUEL_HAIRPIN_HIGH, SCREEN_MARGIN, SCREEN_AUDIT) if SCREEN_MARGIN is not None else None
+    rejected = []
+    steps = []
+    ghpcorr_f = None
+    k = K_MIN
+    while True:
+        if STOP is not None and STOP.is_set():
+            return None
+        started = time.perf_counter()
+        neck = F2[len(F2)-k:len(F2)]     # 3' Segment of Fuel Identified for Neck
+        fuel = F3 + neck.reverse_complement()
+        skipped = False
+        if screen is not None:
+            estimate = HAIRPIN_ESTIMATE(neck, len(FUEL_LOOP), TEMPERATURE, SALT_CORR, OUTER=0)
+            skipped = screen.SKIP(estimate)
+        if not skipped or screen.audit:
+            ghpcorr_f = FOLDS.DG(fuel, TEMPERATURE, SALT_CORR)
+        if screen is not None:
+            screen.RECORD(estimate, None if skipped and not screen.audit else ghpcorr_f, skipped)
+        if not skipped and FUEL_HAIRPIN_LOW <= ghpcorr_f <= FUEL_HAIRPIN_HIGH:
+            opened = ENGINE.OPEN_TEMP(fuel, SALT_CORR, TEMPERATURE, T_MAX, TOL=TOL)
+            steps.append((k, ghpcorr_f, opened.temp, time.perf_counter()-started))
+            if opened.temp is not None:
+                return FUEL_HAIRPIN(TH2, ghpcorr_ftest, k, neck, fuel, ghpcorr_f, opened.temp, opened.folds, rejected, True,
+                                    screen.records if screen is not None else [], steps)
+            rejected.append((k, ghpcorr_f))
+        else:
+            steps.append((k, None if skipped else ghpcorr_f, None, time.perf_counter()-started))
+        k = k + 1
+        if k == ((len(fuel)/2)-2):
+            if ghpcorr_f is None or skipped:
+                ghpcorr_f = FOLDS.DG(fuel, TEMPERATURE, SALT_CORR)     # DG of the last neck tried for the report
+            return FUEL_HAIRPIN(TH2, ghpcorr_ftest, k, neck, fuel, ghpcorr_f, None, 0, rejected, False,
+                                screen.records if screen is not None else [], steps)
+
+
+# STOP of one search - the checks of the search give up once its flag in the shared STOP flags is set
+class SEARCH_STOP:
+    def __init__(self, STOPS, SLOT):
+        self.stops = STOPS
+        self.slot = SLOT
+
+    def is_set(self):
+        return self.stops[self.slot] != 0
+
+    def set(self):
+        self.stops[self.slot] = 1
+
+    def clear(self):
+        self.stops[self.slot] = 0
+
+
+# Worker process start up - Ctrl+C is left to the main process, which shuts the pool down
+def FUEL_WORKER_INIT(STOPS):
+    global WORKER_STOPS
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    WORKER_STOPS = STOPS
+
+
+# Fuel pool of this process with WORKERS workers & its STOP flags - started on first use
+def GET_FUEL_POOL(WORKERS):
+    key = (os.getpid(), WORKERS)
+    if key not in FUEL_POOLS:
+        stops = multiprocessing.RawArray('b', FUEL_STOP_SLOTS)
+        slots = queue.Queue()
+        for slot in range(FUEL_STOP_SLOTS):
+            slots.put(slot)
+        FUEL_POOLS[key] = FUEL_POOL(ProcessPoolExecutor(max_workers=WORKERS, initializer=FUEL_WORKER_INIT, initargs=(stops,)),
+                                    stops, slots)
+    return FUEL_POOLS[key]
+
+
+# Worker side of FUEL_HAIRPIN_CHECK - folds go through the on-disk fold cache shared with the main process
+# Returns None for a check stopped by the STOP flag of its search (SLOT)
+def FUEL_HAIRPIN_JOB(JOB):
+    global WORKER_ENGINE
+    fold_cache_file, fold_cache_size, fold_backend, arguments, screen, slot = JOB
+    folds = GET_FOLD_CACHE(fold_cache_file, fold_cache_size, BACKEND=fold_backend)
+    if WORKER_ENGINE is None or WORKER_ENGINE[0] != (folds.backend.name, folds.file):
+        WORKER_ENGINE = ((folds.backend.name, folds.file), HAIRPIN_ENGINE(BACKEND=fold_backend, STORE=folds))
+    try:
+        return FUEL_HAIRPIN_CHECK(*arguments, FOLDS=folds, ENGINE=WORKER_ENGINE[1], STOP=SEARCH_STOP(WORKER_STOPS, slot), **screen)
+    finally:
+        folds.FLUSH()
+
+
+# Fuel hairpins of the Toe Hold 2 candidates TH2S (in order) - stops at the first candidate that passes
+# WORKERS > 1 evaluates the candidates over the process pool (at most WORKERS at a time, in order) & stops the running
+# checks once the result is settled - the pool is idle again when FUEL_SEARCH returns
+# If no candidate passes the first one is returned (its last neck length tried), as the single candidate design did
+# FOLD_BACKEND: folding backend of the workers (strobprobe/folding.py) - a batched backend folds the F2 strands of all
+# the candidates (equal length) together up front
+def FUEL_SEARCH(TH2S, F1, FUEL_LOOP, K_MIN, TEMPERATURE, SALT_CORR, T_MAX, TOL, FOLDS=None, ENGINE=None,
+                WORKERS=1, FOLD_CACHE_FILE=None, FOLD_CACHE_SIZE=200000, SCREEN_MARGIN=None, SCREEN_AUDIT=False, FOLD_BACKEND=None):
+    arguments = [(str(th2), str(F1), str(FUEL_LOOP), K_MIN, TEMPERATURE, SALT_CORR, T_MAX, TOL) for th2 in TH2S]
+    screen = {'SCREEN_MARGIN': SCREEN_MARGIN, 'SCREEN_AUDIT': SCREEN_AUDIT}
+    if len(arguments) == 0:
+        return FUEL_RESULT(None, None, 0, [])
+    results = {}
+
+    def RESULT(index):
+        records = [record for result in results.values() for record in result.screen]
+        return FUEL_RESULT(index, results[index], len(results), records, [results[done] for done in sorted(results)])
+
+    if WORKERS is None or WORKERS <= 1 or len(arguments) == 1:
+        folds = FOLDS if FOLDS is not None else GET_FOLD_CACHE(FOLD_CACHE_FILE, FOLD_CACHE_SIZE, BACKEND=FOLD_BACKEND)
+        engine = ENGINE if ENGINE is not None else HAIRPIN_ENGINE(BACKEND=FOLD_BACKEND, STORE=folds)
+        if folds.backend.batched:
+            folds.DG_BATCH([argument[0] + argument[1] for argument in arguments], TEMPERATURE, SALT_CORR)
+        for index, argument in enumerate(arguments):
+            results[index] = FUEL_HAIRPIN_CHECK(*argument, FOLDS=folds, ENGINE=engine, **screen)
+            if results[index].passed:
+                return RESULT(index)
+        return RESULT(0)
+
+    pool = GET_FUEL_POOL(WORKERS)
+    backend = FOLDS.backend.name if FOLDS is not None else GET_BACKEND(FOLD_BACKEND).name
+    futures = {}
+    settled = 0     # every candidate before this one finished & failed
+
+    # Wait for the next check to finish - True once the result is settled
+    def COLLECT():
+        nonlocal settled
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = futures.pop(future)
+            if future.result() is not None:     # a check stopped early has no result
+                results[index] = future.result()
+        while settled in results and not results[settled].passed:
+            settled += 1
+        return settled in results or settled == len(arguments)
+
+    slot = pool.slots.get()
+    stop = SEARCH_STOP(pool.stops, slot)
+    try:
+        stop.clear()
+        for index, argument in enumerate(arguments):
+            if len(futures) == WORKERS and COLLECT():
+                break
+            futures[pool.executor.submit(FUEL_HAIRPIN_JOB, (FOLD_CACHE_FILE, FOLD_CACHE_SIZE, backend, argument, screen, slot))] = index
+        else:
+            while futures and not COLLECT():
+                pass
+    except BrokenProcessPool:
+        FUEL_POOLS.pop((os.getpid(), WORKERS), None)
+        raise
+    finally:
+        stop.set()
+        wait(futures)
+        stop.clear()
+        pool.slots.put(slot)
+    # checks that finished before they saw the STOP event are kept in the records
+    for future, index in futures.items():
+        if future.exception() is None and future.result() is not None:
+            results[index] = future.result()
+
+    if settled in results:
+        return RESULT(settled)
+    return RESULT(0)
@@ -0,0 +1,317 @@
+# Fold-once, evaluate-many-temperatures hairpin energy engine
+#
+# seqfold builds every loop energy as DH - T*DS (plus temperature independent penalties), so the free energy of
+# ONE fixed secondary structure is a straight line in T. The engine folds a sequence, breaks the minimum free
+# energy (MFE) structure into its loops (stacks, bulges, interior loops, hairpin loop) & re-scores each loop with
+# the seqfold energy functions at a second temperature - no second fold - to get the enthalpy & entropy terms
+# DG(T) of that structure is then one NumPy expression for a whole vector of temperatures
+#
+# The MFE at any temperature is the lowest of those lines. When the same structure is optimal at two temperatures
+# it is optimal everywhere in between, so a new fold is only needed where the lines of two different structures
+# cross - that is the only place the optimal structure could have changed
+# Structures with a multi-branch loop are re-scored from a second fold instead (their loop energy needs the DP)
+# With another folding backend (strobprobe/folding.py) there are no seqfold caches to split into loops - the engine
+# then folds at each temperature it is asked for through the backend
+# STORE: fold cache with an on-disk file (strobprobe/foldcache.py) - every fold of the engine (its structure line, exact
+# MFE & seqfold.dg value) is saved there, so a rerun takes the structures from disk instead of folding again
+
+import math
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from strobprobe.foldcache import HAIRPIN_SALT_CORR
+from strobprobe.folding import GET_BACKEND
+from strobprobe.melting import OPEN_TEMP, HAIRPIN_OPEN_TEMP
+
+try:
+    from seqfold.dna import DNA_ENERGIES
+    from seqfold.rna import RNA_ENERGIES
+    from seqfold.fold import _cache, _stack, _hairpin, _bulge, _internal_loop
+    SEQFOLD_INTERNALS = True
+except ImportError:     # compiled seqfold releases do not expose the loop energy functions
+    SEQFOLD_INTERNALS = False
+
+KELVIN = 273.15
+# Format of the samples saved in the fold cache - change it when FOLD or the saved values change
+ENGINE_VERSION = 1
+
+# One folded structure: key identifies the structure, h (kcal/mol) & s (kcal/Kmol) give DG(T) = h - (T+273.15)*s
+# loops_h & loops_s hold the line of every loop so DG can be rounded per loop exactly like seqfold.dg (None if unknown)
+STRUCTURE = namedtuple('STRUCTURE', ['key', 'h', 's', 'loops_h', 'loops_s'])
+# Fold result at one temperature - g is the exact (unrounded) MFE & dg the seqfold.dg value (None on split points)
+SAMPLE = namedtuple('SAMPLE', ['temp', 'structure', 'g', 'dg'], defaults=[None])
+
+
+# Loops of the MFE structure - same walk as seqfold's traceback, keeping the inner pair & exact energy of every loop
+def MFE_LOOPS(i, j, v_cache, w_cache):
+    s = w_cache[i][j]
+    if "HAIRPIN" not in s.desc:
+        while w_cache[i + 1][j] == s:
+            i += 1
+        while w_cache[i][j - 1] == s:
+            j -= 1
+
+    loops = []
+    while True:
+        s = v_cache[i][j]
+        if not s.ij:
+            loops.append((s.desc, i, j, None, s.e))
+            return loops
+        if len(s.ij) == 1:
+            i1, j1 = s.ij[0]
+            loops.append((s.desc, i, j, (i1, j1), s.e - v_cache[i1][j1].e))
+            i, j = i1, j1
+            continue
+        # multi-branch loop - its own energy is the V energy minus the W energy of the branches
+        branches = []
+        e_sum = 0.0
+        for i1, j1 in s.ij:
+            inner = MFE_LOOPS(i1, j1, v_cache, w_cache)
+            if inner:
+                i2, j2 = inner[0][1], inner[0][2]
+                e_sum += w_cache[i2][j2].e
+                branches += inner
+        loops.append((s.desc, i, j, tuple(s.ij), s.e - e_sum))
+        return loops + branches
+
+
+# seqfold.dg of a folded structure - every loop rounded to 0.1 & the sum to 0.01. seqfold rounds the closing pair
+# energy of a multi-branch loop before the branches are taken off, so that loop is rounded twice
+def SEQFOLD_DG(LOOPS, v_cache):
+    total = 0.0
+    for desc, i, j, inner, energy in LOOPS:
+        if desc.startswith('BIFURCATION'):
+            closing = v_cache[i][j].e
+            total += round(round(closing, 1) - (closing - energy), 1)
+        else:
+            total += round(energy, 1)
+    return round(total, 2)
+
+
+# Energy of a single (non multi-branch) loop at TEMP_K with the seqfold energy functions
+def LOOP_ENERGY(seq, LOOP, TEMP_K, emap):
+    desc, i, j, inner, energy = LOOP
+    if inner is None:
+        if not desc.startswith('HAIRPIN'):     # isolated pair penalty - temperature independent
+            return energy
+        return _hairpin(seq, i, j, TEMP_K, emap)
+    i1, j1 = inner
+    if i1 == i + 1 and j1 == j - 1:
+        return _stack(seq, i, i1, j, j1, TEMP_K, emap)
+    if i1 > i + 1 and j1 < j - 1:
+        return _internal_loop(seq, i, i1, j, j1, TEMP_K, emap)
+    return _bulge(seq, i, i1, j, j1, TEMP_K, emap)
+
+
+# SAMPLE as saved in the fold cache & back
+def SAMPLE_AS_JSON(SAMPLE_):
+    structure = SAMPLE_.structure
+    return {'key': structure.key, 'h': structure.h, 's': structure.s, 'g': SAMPLE_.g, 'dg': SAMPLE_.dg,
+            'loops_h': None if structure.loops_h is None else structure.loops_h.tolist(),
+            'loops_s': None if structure.loops_s is None else structure.loops_s.tolist()}
+
+
+def SAMPLE_FROM_JSON(TEMP, VALUE):
+    key = VALUE['key']
+    key = tuple(key) if key[0] == 'NO STRUCTURE' else tuple(tuple(loop) for loop in key)
+    loops_h = None if VALUE['loops_h'] is None else np.array(VALUE['loops_h'])
+    loops_s = None if VALUE['loops_s'] is None else np.array(VALUE['loops_s'])
+    return SAMPLE(TEMP, STRUCTURE(key, VALUE['h'], VALUE['s'], loops_h, loops_s), VALUE['g'], VALUE['dg'])
+
+
+class HAIRPIN_ENGINE:
+    def __init__(self, MAX_SEQUENCES=2048, DELTA_T=10.0, BACKEND=None, STORE=None):
+        self.backend = GET_BACKEND(BACKEND)
+        # The fold-once lines need seqfold's own caches
+        self.lines = SEQFOLD_INTERNALS and self.backend.name == 'seqfold'
+        self.max_sequences = MAX_SEQUENCES
+        self.delta_t = DELTA_T     # second temperature used to split a loop into enthalpy & entropy
+        self.sequences = OrderedDict()     # sequence -> {'samples': {T: SAMPLE}, 'segments': [(T_low, T_high, STRUCTURE)]}
+        self.folds = 0
+        self.store = STORE if STORE is not None and self.lines and STORE.OPEN_STRUCTURES(ENGINE_VERSION) else None
+
+    def STATE(self, SEQUENCE):
+        seq = str(SEQUENCE).upper()
+        if seq not in self.sequences:
+            self.sequences[seq] = {'samples': {}, 'segments': []}
+            if len(self.sequences) > self.max_sequences:
+                self.sequences.popitem(last=False)
+        self.sequences.move_to_end(seq)
+        return seq, self.sequences[seq]
+
+    # Fold SEQUENCE at TEMP (C) & return the SAMPLE with the line of its MFE structure
+    def FOLD(self, SEQUENCE, TEMP):
+        seq, state = self.STATE(SEQUENCE)
+        temp = float(TEMP)
+        if temp in state['samples']:
+            return state['samples'][temp]
+        if self.store is not None:
+            saved = self.store.LOOKUP_STRUCTURE(seq, temp)
+            if saved is not None:
+                state['samples'][temp] = SAMPLE_FROM_JSON(temp, saved)
+                return state['samples'][temp]
+            state['samples'][temp] = sample = self.FOLD_SAMPLE(seq, temp)
+            self.store.STORE_STRUCTURE(seq, temp, SAMPLE_AS_JSON(sample))
+            return sample
+        state['samples'][temp] = sample = self.FOLD_SAMPLE(seq, temp)
+        return sample
+
+    # One seqfold fold of seq at temp (C) broken into the loops of its MFE structure
+    def FOLD_SAMPLE(self, seq, temp):
+        self.folds += 1
+        v_cache, w_cache = _cache(seq, temp)
+        g = w_cache[0][len(seq)-1].e
+        if math.isfinite(g):
+            loops = MFE_LOOPS(0, len(seq)-1, v_cache, w_cache)
+            g = sum(loop[4] for loop in loops)
+        if not math.isfinite(g):
+            # No structure (seqfold.dg gives +/- inf) - constant in temperature
+            return SAMPLE(temp, STRUCTURE(('NO STRUCTURE', g), g, 0.0, None, None), g, g)
+
+        emap = RNA_ENERGIES if 'U' in seq else DNA_ENERGIES
+        key = tuple((loop[0], loop[1], loop[2]) for loop in loops)
+        structure = None
+        if not any(loop[0].startswith('BIFURCATION') for loop in loops):
+            # Every loop re-scored at a second temperature - DG = DH - T*DS per loop
+            t1, t2 = temp+KELVIN, temp+KELVIN+self.delta_t
+            e1 = np.array([LOOP_ENERGY(seq, loop, t1, emap) for loop in loops])
+            e2 = np.array([LOOP_ENERGY(seq, loop, t2, emap) for loop in loops])
+            if np.allclose(e1, [loop[4] for loop in loops], atol=1e-6):
+                loops_s = (e1-e2)/self.delta_t
+                loops_h = e1 + t1*loops_s
+                structure = STRUCTURE(key, float(loops_h.sum()), float(loops_s.sum()), loops_h, loops_s)
+        if structure is None:
+            # Multi-branch structure - fit the line from a second fold of the same structure
+            v2, w2 = _cache(seq, temp+self.delta_t)
+            self.folds += 1
+            loops2 = MFE_LOOPS(0, len(seq)-1, v2, w2)
+            if tuple((loop[0], loop[1], loop[2]) for loop in loops2) == key:
+                s = (g - sum(loop[4] for loop in loops2))/self.delta_t
+                structure = STRUCTURE(key, g + (temp+KELVIN)*s, s, None, None)
+            else:
+                structure = STRUCTURE(key, g, 0.0, None, None)
+        return SAMPLE(temp, structure, g, SEQFOLD_DG(loops, v_cache))
+
+    # Make sure the optimal structure is known on the whole of [T_LOW, T_HIGH]
+    def CERTIFY(self, SEQUENCE, T_LOW, T_HIGH, MIN_WIDTH=1e-3):
+        seq, state = self.STATE(SEQUENCE)
+        for t_low, t_high, _ in state['segments']:
+            if t_low <= T_LOW and T_HIGH <= t_high:
+                return
+        stack = [(self.FOLD(seq, T_LOW), self.FOLD(seq, T_HIGH))]
+        while stack:
+            low, high = stack.pop()
+            if low.structure.key == high.structure.key or high.temp - low.temp <= MIN_WIDTH:
+                self.ADD_SEGMENT(state, low.temp, high.temp, low.structure, high.structure)
+                continue
+            # Fold where the two lines cross - the optimal structure can only change there
+            t_cross = self.CROSSING(low.structure, high.structure)
+            if t_cross is None or not low.temp < t_cross < high.temp:
+                t_cross = (low.temp+high.temp)/2
+            middle = self.FOLD(seq, t_cross)
+            if abs(middle.g - self.LINE(low.structure, t_cross)) < 1e-6 and abs(middle.g - self.LINE(high.structure, t_cross)) < 1e-6:
+                self.ADD_SEGMENT(state, low.temp, t_cross, low.structure, low.structure)
+                self.ADD_SEGMENT(state, t_cross, high.temp, high.structure, high.structure)
+            else:
+                stack.append((middle, high))
+                stack.append((low, middle))
+
+    @staticmethod
+    def LINE(STRUCTURE_, TEMP):
+        return STRUCTURE_.h - (TEMP+KELVIN)*STRUCTURE_.s
+
+    @staticmethod
+    def CROSSING(A, B):
+        if A.s == B.s:
+            return None
+        return (A.h-B.h)/(A.s-B.s) - KELVIN
+
+    @staticmethod
+    def ADD_SEGMENT(state, T_LOW, T_HIGH, LOW, HIGH):
+        if LOW.key == HIGH.key:
+            state['segments'].append((T_LOW, T_HIGH, LOW))
+        else:     # unresolved sliver narrower than MIN_WIDTH
+            middle = (T_LOW+T_HIGH)/2
+            state['segments'].append((T_LOW, middle, LOW))
+            state['segments'].append((middle, T_HIGH, HIGH))
+
+    @staticmethod
+    def SEGMENT(state, TEMP):
+        for t_low, t_high, structure in state['segments']:
+            if t_low <= TEMP <= t_high:
+                return structure
+        return None
+
+    # Structures that are optimal at each temperature of TEMPS (folds only where needed)
+    def STRUCTURES(self, SEQUENCE, TEMPS):
+        temps = np.atleast_1d(np.asarray(TEMPS, dtype=float))
+        seq, state = self.STATE(SEQUENCE)
+        self.CERTIFY(seq, float(temps.min()), float(temps.max()))
+        return temps, [self.SEGMENT(state, t) for t in temps]
+
+    # seqfold.dg for a whole vector of temperatures - loops rounded to 0.1 & the sum to 0.01 as seqfold does
+    # Multi-branch loop energies are not exactly linear in T (seqfold picks the best dangling end of each branch),
+    # so structures holding one are folded at each of their temperatures instead
+    def DG_CURVE(self, SEQUENCE, TEMPS, SALT_CORR=None):
+        if not self.lines:
+            values = np.array([self.backend.DG(str(SEQUENCE), float(temp)) for temp in np.atleast_1d(TEMPS)])
+            return values + HAIRPIN_SALT_CORR(SALT_CORR) if SALT_CORR is not None else values
+        temps, structures = self.STRUCTURES(SEQUENCE, TEMPS)
+        values = np.empty(len(temps))
+        for structure in {id(s): s for s in structures}.values():
+            rows = np.array([s is structure for s in structures])
+            kelvin = temps[rows]+KELVIN
+            if structure.loops_h is not None:
+                loops = np.round(structure.loops_h[None, :] - kelvin[:, None]*structure.loops_s[None, :], 1)
+                values[rows] = np.round(loops.sum(axis=1), 2)
+            else:
+                values[rows] = [self.FOLD(SEQUENCE, temp).dg for temp in temps[rows]]
+        if SALT_CORR is not None:
+            values = values + HAIRPIN_SALT_CORR(SALT_CORR)
+        return values
+
+    # Temp & Salt corrected Gibbs Free Energy at one temperature (same call as FOLD_CACHE.DG)
+    def DG(self, SEQUENCE, TEMP, SALT_CORR):
+        return float(self.DG_CURVE(SEQUENCE, [TEMP], SALT_CORR)[0])
+
+    # Temperature where the temp & salt corrected DG of the MFE changes sign - solved on the line of the
+    # structure that is optimal there, so only the folds that locate that structure are needed
+    def OPEN_TEMP(self, SEQUENCE, SALT_CORR, T_START, T_MAX=100, TOL=0.1):
+        if not self.lines:
+            return HAIRPIN_OPEN_TEMP(SEQUENCE, SALT_CORR, T_START, T_MAX, TOL=TOL, BACKEND=self.backend)
+        folds = self.folds
+        corr = HAIRPIN_SALT_CORR(SALT_CORR)
+        seq, state = self.STATE(SEQUENCE)
+        low = self.FOLD(seq, T_START)
+        if not math.isfinite(low.g):
+            return OPEN_TEMP(None, self.folds-folds, None)
+        if low.g + corr >= 0:
+            return OPEN_TEMP(float(T_START), self.folds-folds, (float(T_START), float(T_START)))
+        high = self.FOLD(seq, T_MAX)
+
+        # Walk the intervals from low to high temperature, splitting at line crossings
+        stack = [(low, high)]
+        while stack:
+            low, high = stack.pop()
+            if low.structure.key == high.structure.key or high.temp-low.temp <= TOL:
+                structure = low.structure
+                if high.g + corr < 0:
+                    continue
+                if low.structure.key == high.structure.key and structure.s != 0:
+                    t_open = (structure.h+corr)/structure.s - KELVIN
+                else:
+                    t_open = low.temp - (low.g+corr)*(high.temp-low.temp)/(high.g-low.g)
+                return OPEN_TEMP(min(max(t_open, low.temp), high.temp), self.folds-folds, (low.temp, high.temp))
+            t_cross = self.CROSSING(low.structure, high.structure)
+            if t_cross is None or not low.temp < t_cross < high.temp:
+                t_cross = (low.temp+high.temp)/2
+            middle = self.FOLD(seq, t_cross)
+            if abs(middle.g - self.LINE(low.structure, t_cross)) < 1e-6 and abs(middle.g - self.LINE(high.structure, t_cross)) < 1e-6:
+                # Both structures certified - low structure on [low, cross] & high structure on [cross, high]
+                stack.append((SAMPLE(t_cross, high.structure, middle.g), high))
+                stack.append((low, SAMPLE(t_cross, low.structure, middle.g)))
+            else:
+                stack.append((middle, high))
+                stack.append((low, middle))
+        return OPEN_TEMP(None, self.folds-folds, (float(T_START), float(T_MAX)))
@@ -0,0 +1,129 @@
+# Run journal - append-only JSON lines record of the finished work of a batch, so an interrupted run can be restarted
+# without redoing it
+#
+# Each target folder gets ProbeDesign_{Target_Name}_Journal.jsonl (written by the worker of the target):
+#   {"record": "target", "key": ..., "th2_seed": ...}                    the design of the target started
+#   {"record": "stage", "key": ..., "stage": ..., "result": ...}         a stage passed - its STAGE_KEY & result
+# & the batch folder gets ProbeDesign_Journal.jsonl (written by the main process):
+#   {"record": "finished", "target_name": ..., "key": ..., "summary": ..., "design": ...}  the summary row & the
+#   DESIGN_RECORD (strobprobe/records.py) of a finished target - the report of a resumed stage is rendered from its result
+#   {"record": "error", "target_name": ..., "key": ..., "error": ...}   the design of a target stopped on an error that is
+#   not a design checkpoint (a full disk, a locked fold cache, a lost worker) - it is not finished & a resume designs it again
+#
+# key of a target: digest of the design VERSION, the strobprobe sources (SOURCE_DIGEST), the Sensor_Parameters of the target, the Toe Hold 2 seed (the whole RNG
+# state of the design - the search is seeded with it), the folding backend & the off-target index - a finished target of
+# another key is redone
+# key of a stage: STAGE_KEY of strobprobe/design.py - digest of only the parameters, settings & earlier stages the stage
+# reads, so a design whose probe end changed still reuses its place holder, Toe Hold 1 & fuel
+# The stages that can be reused are the ones the later stages build on: place_holder (PH1), probe (Toe Hold 1),
+# fuel (Toe Hold 2, fuel neck & opening temperature) & probe_hairpin (probe neck & opening temperature)
+# Every record is flushed & synced before the run goes on - a record cut short by a crash is skipped when read back
+# The stage records are compacted before a design journals its stages (COMPACT) - records written by other code are
+# dropped & only the last MAX_STAGE_RECORDS are kept, so the journal does not grow with every run
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from strobprobe.design import FUEL, PLACE_HOLDER, PROBE_1, PROBE_HAIRPIN, SOURCE_DIGEST, VERSION
+from strobprobe.folding import GET_BACKEND
+
+JOURNAL_VERSION = 4
+MAX_STAGE_RECORDS = 64
+RESUMABLE_STAGES = OrderedDict([('place_holder', PLACE_HOLDER), ('probe', PROBE_1), ('fuel', FUEL), ('probe_hairpin', PROBE_HAIRPIN)])
+
+
+def JOURNAL_KEY(PARAMETERS, SETTINGS):
+    text = json.dumps([JOURNAL_VERSION, VERSION, SOURCE_DIGEST, list(PARAMETERS), SETTINGS.th2_seed,
+                       GET_BACKEND(SETTINGS.fold_backend).name, SETTINGS.off_target_index])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class RUN_JOURNAL:
+    def __init__(self, PATH):
+        self.path = PATH
+
+    # Records of the journal in the order they were written (a missing journal has none)
+    def READ(self):
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'record' in record:
+                    records.append(record)
+        return records
+
+    # A record cut short by a crash has no line end - the next record starts on a new line
+    def APPEND(self, RECORD):
+        with open(self.path, 'ab+') as journal:
+            journal.seek(0, os.SEEK_END)
+            if journal.tell() > 0:
+                journal.seek(-1, os.SEEK_END)
+                if journal.read(1) != b'\n':
+                    journal.write(b'\n')
+            journal.write(json.dumps(RECORD).encode('utf-8') + b'\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    # Stage record of this journal version & these strobprobe sources
+    @staticmethod
+    def CURRENT(RECORD):
+        return (RECORD['record'] == 'stage' and RECORD.get('version') == JOURNAL_VERSION and RECORD.get('source') == SOURCE_DIGEST
+                and RECORD.get('stage') in RESUMABLE_STAGES)
+
+    # Results of the stages that passed - {STAGE_KEY: result} for DESIGN_SENSOR(RESUME=...), records of another journal
+    # version or other sources are left out
+    def STAGES(self):
+        stages = {}
+        for record in self.READ():
+            if self.CURRENT(record):
+                stages[record['key']] = RESUMABLE_STAGES[record['stage']](**record['result'])
+        return stages
+
+    # Rewrite the journal without the stale stage records & with only the last MAX_STAGE_RECORDS stages (one record per
+    # key) - returns the keys of the stages kept. The other records are kept as they are
+    def COMPACT(self):
+        records = self.READ()
+        latest = OrderedDict()
+        for index, record in enumerate(records):
+            if self.CURRENT(record):
+                latest.pop(record['key'], None)
+                latest[record['key']] = index
+        kept = set(list(latest.values())[-MAX_STAGE_RECORDS:])
+        compacted = [record for index, record in enumerate(records) if record['record'] != 'stage' or index in kept]
+        if len(compacted) < len(records):
+            with open(self.path + '.tmp', 'wb') as journal:
+                for record in compacted:
+                    journal.write(json.dumps(record).encode('utf-8') + b'\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+            os.replace(self.path + '.tmp', self.path)
+        return {records[index]['key'] for index in kept}
+
+    # Finished targets - {target_name: (key, summary row, design record)}, the last record of a target wins (an error
+    # record after it makes the target unfinished again)
+    def FINISHED(self):
+        finished = {}
+        for record in self.READ():
+            if record['record'] == 'finished':
+                finished[record['target_name']] = (record['key'], record['summary'], record.get('design'))
+            elif record['record'] == 'error':
+                finished.pop(record['target_name'], None)
+        return finished
+
+    # Journal the stages of a design - ON_STAGE callback of DESIGN_SENSOR (stages whose key is in STORED & still in the
+    # compacted journal are not written again)
+    def STAGE_WRITER(self, STORED=()):
+        stored = self.COMPACT() & set(STORED)
+
+        def ON_STAGE(NAME, RESULT, METRICS, KEY):
+            if NAME in RESUMABLE_STAGES and KEY not in stored:
+                self.APPEND(OrderedDict(record='stage', version=JOURNAL_VERSION, source=SOURCE_DIGEST, key=KEY, stage=NAME,
+                                        result=OrderedDict(RESULT._asdict())))
+        return ON_STAGE
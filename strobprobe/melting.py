@@ -0,0 +1,82 @@
+# Hairpin opening temperature - the temperature where the temp & salt corrected Gibbs Free Energy of the
+# folded strand (seqfold or a folding backend of strobprobe/folding.py) changes sign from negative (hairpin closed) to positive (hairpin open)
+# The sign change is bracketed with coarse steps upward from the starting temperature & then refined with
+# false position (Illinois) steps, falling back to bisection whenever a step does not halve the bracket
+#
+# T_MAX (100 C) bounds a search the original +2 C scan left open: its 50 C test only ended a scan that had already
+# stepped past the sign change, while a hairpin that stayed closed was followed up without a limit until its DG came
+# within 1 kcal/mol of 0 (Sensor_Parameters.csv: the probe hairpin crosses 0 at 52.7 C & was accepted at 49 C, a 50 C
+# limit would reject it). A hairpin whose DG jumped from below -1 to above 0 between two scan points was reported as
+# not unfolding - the bracketed search finds its opening temperature & accepts it
+
+import math
+from collections import namedtuple
+
+from strobprobe.foldcache import HAIRPIN_SALT_CORR
+from strobprobe.folding import GET_BACKEND
+
+# temp: opening temperature (C) or None if the hairpin does not open below T_MAX
+# folds: number of dg() evaluations used - bracket: final (low, high) temperatures around the sign change
+OPEN_TEMP = namedtuple('OPEN_TEMP', ['temp', 'folds', 'bracket'])
+
+
+# FOLDS: fold cache to go through - otherwise BACKEND (a folding backend or its name, None: the default one) folds
+def HAIRPIN_OPEN_TEMP(SEQUENCE, SALT_CORR, T_START, T_MAX=100, STEP=10, TOL=0.1, FOLDS=None, BACKEND=None):
+    folds = 0
+    backend = BACKEND if BACKEND is not None and not isinstance(BACKEND, str) else GET_BACKEND(BACKEND)
+
+    def CORRECTED_DG(T):
+        nonlocal folds
+        folds += 1
+        if FOLDS is not None:
+            return FOLDS.DG(SEQUENCE, T, SALT_CORR)
+        return backend.DG(str(SEQUENCE), T) + HAIRPIN_SALT_CORR(SALT_CORR)
+
+    # Bracket the sign change walking up from T_START
+    low = float(T_START)
+    g_low = CORRECTED_DG(low)
+    if not math.isfinite(g_low):
+        return OPEN_TEMP(None, folds, None)
+    if g_low >= 0:
+        return OPEN_TEMP(low, folds, (low, low))
+    while True:
+        high = min(low+STEP, T_MAX)
+        g_high = CORRECTED_DG(high)
+        if not math.isfinite(g_high):
+            return OPEN_TEMP(None, folds, None)
+        if g_high >= 0:
+            break
+        if high >= T_MAX:
+            return OPEN_TEMP(None, folds, (low, high))
+        low, g_low = high, g_high
+
+    # Refine until the bracket is narrower than TOL - the Illinois step halves the weight of a stuck end
+    side = 0
+    dg_low, dg_high = g_low, g_high
+    bisect = False
+    while high-low > TOL:
+        width = high-low
+        if bisect:
+            t = (low+high)/2
+        else:
+            t = high - g_high*(high-low)/(g_high-g_low)
+            t = min(max(t, low+TOL/4), high-TOL/4)
+        g = CORRECTED_DG(t)
+        if g == 0:
+            return OPEN_TEMP(t, folds, (t, t))
+        if g < 0:
+            low, g_low, dg_low = t, g, g
+            if side == -1:
+                g_high = g_high/2
+            side = -1
+        else:
+            high, g_high, dg_high = t, g, g
+            if side == 1:
+                g_low = g_low/2
+            side = 1
+        bisect = (high-low) > width/2
+
+    # Linear interpolation inside the final bracket
+    if dg_high == dg_low:
+        return OPEN_TEMP((low+high)/2, folds, (low, high))
+    return OPEN_TEMP(low - dg_low*(high-low)/(dg_high-dg_low), folds, (low, high))
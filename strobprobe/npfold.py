@@ -0,0 +1,446 @@
+# NumPy minimum free energy folding - the seqfold recursion (Zuker & Stiegler 1981, DNA energies of seqfold)
+# filled one anti-diagonal (j - i = d) at a time instead of one cell at a time
+#
+# Every cell of a diagonal only needs cells of shorter diagonals, so all the (i, j) cells of a diagonal - of every
+# sequence of a batch of equal-length sequences - are scored with array operations: the hairpin loop of each cell,
+# every stack / bulge / interior loop (i, j) -> (i1, j1) as one (batch, cells, inner pairs) array & every split point
+# of the multi-branch recursions as one (batch, cells, k) array
+#
+# Hairpin, stack, bulge & interior loop energies, the dangling end rules at the strand ends, the isolated pair
+# penalty & the tie breaking follow seqfold exactly, & the MFE structure is traced back & rounded the way seqfold.dg
+# does. seqfold takes a sequence without any T for RNA & folds it with its RNA energies - so does the fill (no
+# U can occur in such a sequence, so only the G-C pairs of both maps are ever formed). seqfold scores a multi-branch loop from the structures its branches were traced to (linear penalty
+# a + b*branches + c*unpaired & the best dangling end of each branch), which is no recursion on the cells - the fill
+# uses a lower bound of that energy instead (the lowest dangling end of each branch). A structure without a
+# multi-branch loop that is optimal against those bounds is optimal in seqfold too & its energy is exact; when the
+# optimal structure holds a multi-branch loop the sequence is folded again with seqfold
+
+import math
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from seqfold import dg
+from seqfold.dna import DNA_ENERGIES
+from seqfold.rna import RNA_ENERGIES
+
+from strobprobe.thermo import ENCODE, UNKNOWN
+
+KELVIN = 273.15
+GAS_CONSTANT = 1.9872e-3
+ISOLATED_PAIR = 1600.0
+COMPLEMENT_CODE = np.array([3, 2, 1, 0])
+PAIRS = COMPLEMENT_CODE[:, None] == np.arange(4)[None, :]
+# Choice of each V(i, j) & W(i, j) cell for the traceback
+V_NONE, V_HAIRPIN, V_ISOLATED, V_INNER, V_MULTI = range(5)
+W_NONE, W_LEFT, W_RIGHT, W_PAIR, W_SPLIT = range(5)
+# Largest batch filled at once - bounds the (batch, cells, inner pairs) arrays
+MAX_BATCH = 64
+
+# Loop energies at one temperature - the NN style tables are indexed by the 4 base codes of a 'XY/ZW' key
+ENERGY_TABLES = namedtuple('ENERGY_TABLES', ['stack_internal', 'stack_terminal', 'in_nn', 'terminal_mm', 'de_left', 'de_right',
+                                             'hairpin', 'bulge', 'internal', 'tri_tetra', 'multibranch', 'de_min'])
+# Filled tables of a batch - choice / arg of every cell & the branch summary of every W cell
+FOLD_TABLES = namedtuple('FOLD_TABLES', ['v', 'w', 'v_choice', 'v_arg', 'w_choice', 'count', 'wsum', 'span', 'first', 'last'])
+
+
+def PAIR_CODE(A, B, C, D):
+    return ((A*4 + B)*4 + C)*4 + D
+
+
+def _d_g(d_h, d_s, temp):
+    return d_h - temp * (d_s / 1000.0)
+
+
+# Loop size penalties 1..LENGTH - Jacobson-Stockmayer extrapolation from 30 as seqfold does
+def LOOP_TABLE(LOOPS, TEMP_K, LENGTH):
+    table = np.full(LENGTH+1, np.inf)
+    for size in range(1, LENGTH+1):
+        if size in LOOPS:
+            table[size] = _d_g(*LOOPS[size], TEMP_K)
+        else:
+            table[size] = _d_g(*LOOPS[30], TEMP_K) + 2.44 * GAS_CONSTANT * TEMP_K * math.log(size / float(30))
+    return table
+
+
+# RNA keys are read with U as T
+def KEY_TABLE(TABLE, TEMP_K):
+    values = np.full(256, np.nan)
+    for key, (d_h, d_s) in TABLE.items():
+        key = key.replace('U', 'T')
+        if len(key) == 5 and key[2] == '/' and all(base in 'ACGT' for base in key[:2]+key[3:]):
+            values[PAIR_CODE(*['ACGT'.index(base) for base in key[:2]+key[3:]])] = _d_g(d_h, d_s, TEMP_K)
+    return values
+
+
+ENERGY_CACHE = OrderedDict()
+
+
+def GET_ENERGIES(TEMP_K, LENGTH, RNA=False):
+    key = (TEMP_K, LENGTH, RNA)
+    if key in ENERGY_CACHE:
+        ENERGY_CACHE.move_to_end(key)
+        return ENERGY_CACHE[key]
+    emap = RNA_ENERGIES if RNA else DNA_ENERGIES
+    nn = KEY_TABLE(emap.NN, TEMP_K)
+    internal_mm = KEY_TABLE(emap.INTERNAL_MM, TEMP_K)
+    terminal_mm = KEY_TABLE(emap.TERMINAL_MM, TEMP_K)
+    # Dangling ends 'XY/.Z' (3' end, left) & '.X/YZ' (5' end, right) - missing ones add nothing
+    de_left = np.full((4, 4, 4), np.nan)
+    de_right = np.full((4, 4, 4), np.nan)
+    for key, (d_h, d_s) in emap.DE.items():
+        key = key.replace('U', 'T')
+        if key[3] == '.' and '.' not in key[:2]+key[4]:
+            de_left['ACGT'.index(key[0]), 'ACGT'.index(key[1]), 'ACGT'.index(key[4])] = _d_g(d_h, d_s, TEMP_K)
+        elif key[0] == '.' and '.' not in key[1]+key[3:]:
+            de_right['ACGT'.index(key[1]), 'ACGT'.index(key[3]), 'ACGT'.index(key[4])] = _d_g(d_h, d_s, TEMP_K)
+    # Tri & tetra loops by length - sorted codes & energies
+    tri_tetra = {}
+    for size in (5, 6):
+        loops = sorted((SEQUENCE_CODE(key), _d_g(d_h, d_s, TEMP_K)) for key, (d_h, d_s) in (emap.TRI_TETRA_LOOPS or {}).items()
+                       if len(key) == size)
+        if loops:
+            tri_tetra[size] = (np.array([code for code, _ in loops], dtype=np.int64), np.array([value for _, value in loops]))
+    energies = ENERGY_TABLES(np.where(np.isnan(nn), internal_mm, nn), np.where(np.isnan(nn), terminal_mm, nn), ~np.isnan(nn),
+                             terminal_mm, de_left, de_right, LOOP_TABLE(emap.HAIRPIN_LOOPS, TEMP_K, LENGTH),
+                             LOOP_TABLE(emap.BULGE_LOOPS, TEMP_K, LENGTH), LOOP_TABLE(emap.INTERNAL_LOOPS, TEMP_K, LENGTH),
+                             tri_tetra, emap.MULTIBRANCH, min(0.0, min(_d_g(d_h, d_s, TEMP_K) for d_h, d_s in emap.DE.values())))
+    ENERGY_CACHE[key] = energies
+    if len(ENERGY_CACHE) > 256:
+        ENERGY_CACHE.popitem(last=False)
+    return energies
+
+
+def SEQUENCE_CODE(SEQUENCE):
+    code = 0
+    for base in SEQUENCE:
+        code = 4*code + 'ACGT'.index(base)
+    return code
+
+
+# Inner pairs (i1 - i, j - j1) of a diagonal in seqfold's search order - i1 ascending, then j1 ascending
+COMBO_CACHE = {}
+
+
+def COMBOS(D):
+    if D not in COMBO_CACHE:
+        pairs = [(a, b) for a in range(1, D-4) for b in range(D-4-a, 0, -1)]
+        COMBO_CACHE[D] = (np.array([a for a, _ in pairs], dtype=np.int64), np.array([b for _, b in pairs], dtype=np.int64))
+    return COMBO_CACHE[D]
+
+
+# Lowest dangling end energy of a branch closed by (i, j) - seqfold takes the stack on the outer mismatch
+# (i-1, j+1), the 5' dangling end (i, j+1) or the better of the two - 0 when no dangling end is taken
+def DANGLES(codes, energies):
+    batch, n = codes.shape
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    after = np.minimum(j+1, n-1)
+    # 5' dangling end - nothing past the 3' end of the strand
+    right = np.where(j < n-1, energies.de_right[codes[:, i], codes[:, after], codes[:, j]], 0.0)
+    before = np.maximum(i-1, 0)
+    outer = PAIR_CODE(codes[:, before], codes[:, i], codes[:, after], codes[:, j])
+    stack = np.where(((before > 0) & (after < n-1))[None], energies.stack_internal[outer], energies.stack_terminal[outer])
+    de_left = energies.de_left[codes[:, np.maximum(before-1, 0)], codes[:, before], codes[:, after]]
+    de_right = energies.de_right[codes[:, before], codes[:, np.minimum(after+1, n-1)], codes[:, after]]
+    stack = np.where(((before > 0) & (after == n-1))[None] & ~np.isnan(de_left), stack + de_left, stack)
+    stack = np.where(((before == 0) & (after < n-1))[None] & ~np.isnan(de_right), stack + de_right, stack)
+    stack = np.where((i == 0)[None], right, np.where((j == n-1)[None], 0.0, stack))
+    return np.fmin(0.0, np.fmin(np.nan_to_num(stack), np.nan_to_num(right)))
+
+
+# Multi-branch energy of two W cells side by side - branch summaries added, unpaired bases counted in the loop
+def MULTI_BRANCH(energies, w_left, w_right, count, wsum, unpaired, HELIX):
+    a, b, c, d = energies.multibranch
+    branches = count + 1 if HELIX else count
+    penalty = np.where(unpaired == 0, a + d, a + b*branches + c*unpaired)
+    return np.where(np.isfinite(w_left) & np.isfinite(w_right) & (count >= 2), penalty + wsum, np.inf)
+
+
+# Fill V & W of a batch of equal-length sequences (base codes, shape (batch, n)) at TEMP (C)
+def FILL(CODES, TEMP, RNA=False):
+    codes = np.asarray(CODES, dtype=np.int64)
+    batch, n = codes.shape
+    temp_k = TEMP + KELVIN
+    energies = GET_ENERGIES(temp_k, n, RNA)
+    v = np.full((batch, n, n), np.inf)
+    w = np.full((batch, n, n), np.inf)
+    v_choice = np.zeros((batch, n, n), dtype=np.int8)
+    v_arg = np.zeros((batch, n, n), dtype=np.int64)
+    w_choice = np.zeros((batch, n, n), dtype=np.int8)
+    # Branch summary of every W cell - branches, W energy of the branches, bases they span, first & last base
+    count = np.zeros((batch, n, n), dtype=np.int64)
+    wsum = np.zeros((batch, n, n))
+    span = np.zeros((batch, n, n), dtype=np.int64)
+    first = np.zeros((batch, n, n), dtype=np.int64)
+    last = np.zeros((batch, n, n), dtype=np.int64)
+    dangles = DANGLES(codes, energies)
+    # Dangling end of the closing pair of a multi-branch loop - its outer mismatch or any dangling end
+    closing = np.fmin(dangles, energies.de_min)
+    flat = [table.reshape(batch, n*n) for table in (v, w, count, wsum, span, first, last)]
+    v_flat, w_flat, count_flat, wsum_flat, span_flat, first_flat, last_flat = flat
+
+    for d in range(4, n):
+        I = np.arange(n-d)
+        J = I + d
+        x_i, x_j = codes[:, I], codes[:, J]
+        paired = PAIRS[x_i, x_j]
+        isolated_outer = np.ones((batch, len(I)), dtype=bool)
+        inside = (I > 0) & (J < n-1)
+        isolated_outer[:, inside] = ~PAIRS[codes[:, I[inside]-1], codes[:, J[inside]+1]]
+        isolated = isolated_outer & ~PAIRS[codes[:, I+1], codes[:, J-1]]
+
+        # E1 - hairpin loop of d-1 bases
+        size = d - 1
+        e1 = np.full((batch, len(I)), energies.hairpin[size])
+        if d+1 in energies.tri_tetra:
+            keys, values = energies.tri_tetra[d+1]
+            loop = np.zeros((batch, len(I)), dtype=np.int64)
+            for offset in range(d+1):
+                loop = 4*loop + codes[:, I+offset]
+            index = np.minimum(np.searchsorted(keys, loop), len(keys)-1)
+            e1 = np.where(keys[index] == loop, values[index] + energies.hairpin[size], e1)
+        if size > 3:
+            mismatch = energies.terminal_mm[PAIR_CODE(x_i, codes[:, I+1], x_j, codes[:, J-1])]
+            e1 = np.where(np.isnan(mismatch), e1, e1 + mismatch)
+        if size == 3:
+            e1 = np.where((x_i == 0) | (x_j == 0), e1 + 0.5, e1)
+
+        best = e1
+        choice = np.full((batch, len(I)), V_HAIRPIN, dtype=np.int8)
+        arg = np.zeros((batch, len(I)), dtype=np.int64)
+        if d > 5:
+            # E2 - stack, bulge or interior loop closed by every inner pair (i1, j1)
+            A, B = COMBOS(d)
+            i1 = I[:, None] + A[None, :]
+            j1 = J[:, None] - B[None, :]
+            y_i, y_j = x_i[:, :, None], x_j[:, :, None]
+            y_i1, y_j1 = codes[:, i1], codes[:, j1]
+            loops = np.full(y_i1.shape, np.inf)
+
+            # seqfold _stack - internal / terminal NN & mismatch tables & the dangling end of a pair at one strand end
+            left_dangle = ((I > 0) & (J == n-1))[None, :, None]
+            right_dangle = ((I == 0) & (J < n-1))[None, :, None]
+            de_left = energies.de_left[codes[:, np.maximum(I-1, 0)], x_i, x_j][:, :, None]
+            de_right = energies.de_right[x_i, codes[:, np.minimum(J+1, n-1)], x_j][:, :, None]
+
+            def STACK(CODE):
+                value = np.where(inside[None, :, None], energies.stack_internal[CODE], energies.stack_terminal[CODE])
+                value = np.where(left_dangle & ~np.isnan(de_left), value + de_left, value)
+                return np.where(right_dangle & ~np.isnan(de_right), value + de_right, value)
+
+            stack = (A == 1) & (B == 1)
+            bulge = (A == 1) != (B == 1)
+            single = (A == 2) & (B == 2)
+            interior = (A > 1) & (B > 1) & ~single
+            outer_mismatch = PAIR_CODE(y_i, codes[:, I+1][:, :, None], y_j, codes[:, J-1][:, :, None])
+            pair_inner = energies.in_nn[outer_mismatch] | energies.in_nn[PAIR_CODE(codes[:, i1-1], y_i1, codes[:, j1+1], y_j1)]
+
+            loops[:, :, stack] = STACK(outer_mismatch)
+            if bulge.any():
+                sizes = np.maximum(A[bulge], B[bulge]) - 1
+                value = np.broadcast_to(energies.bulge[sizes], (batch, len(I), len(sizes)))
+                value = np.where(sizes == 1, value + STACK(PAIR_CODE(y_i, y_i1[:, :, bulge], y_j, y_j1[:, :, bulge])), value)
+                adenine = (y_i == 0) | (y_i1[:, :, bulge] == 0) | (y_j == 0) | (y_j1[:, :, bulge] == 0)
+                loops[:, :, bulge] = np.where(adenine, value + 0.5, value)
+            if single.any():
+                value = STACK(PAIR_CODE(y_i, y_i1[:, :, single], y_j, y_j1[:, :, single]))
+                value = value + energies.stack_internal[PAIR_CODE(codes[:, i1[:, single]-1], y_i1[:, :, single],
+                                                                  codes[:, j1[:, single]+1], y_j1[:, :, single])]
+                loops[:, :, single] = np.where(pair_inner[:, :, single], np.inf, value)
+            if interior.any():
+                value = energies.internal[A[interior] + B[interior] - 2] + 0.3*np.abs(A[interior] - B[interior])
+                value = value + energies.terminal_mm[outer_mismatch]
+                value = value + energies.terminal_mm[PAIR_CODE(codes[:, i1[:, interior]-1], y_i1[:, :, interior],
+                                                               codes[:, j1[:, interior]+1], y_j1[:, :, interior])]
+                value = np.where(np.isnan(value), np.inf, value)
+                loops[:, :, interior] = np.where(pair_inner[:, :, interior], np.inf, value)
+
+            loops = np.where(np.isnan(loops), np.inf, loops)
+            e2 = np.where(PAIRS[y_i1, y_j1], loops + v_flat[:, i1*n + j1], np.inf)
+            inner = np.argmin(e2, axis=2)
+            e2 = np.take_along_axis(e2, inner[:, :, None], axis=2)[:, :, 0]
+            take = e2 < best
+            best = np.where(take, e2, best)
+            choice = np.where(take, V_INNER, choice).astype(np.int8)
+            arg = np.where(take, inner, arg)
+
+        if d > 4:
+            # E3 - multi-branch loop closed by (i, j): W(i+1, k) + W(k+1, j-1)
+            K = I[:, None] + np.arange(1, d-1)[None, :]
+            left = (I[:, None]+1)*n + K
+            right = (K+1)*n + (J[:, None]-1)
+            e3 = MULTI_BRANCH(energies, w_flat[:, left], w_flat[:, right], count_flat[:, left] + count_flat[:, right],
+                              wsum_flat[:, left] + wsum_flat[:, right], (d-1) - span_flat[:, left] - span_flat[:, right], True)
+            e3 = e3 + closing[:, I, J][:, :, None]
+            split = np.argmin(e3, axis=2)
+            e3 = np.take_along_axis(e3, split[:, :, None], axis=2)[:, :, 0]
+            take = (~isolated_outer | (I == 0) | (J == n-1))[:, :] & (e3 < best)
+            best = np.where(take, e3, best)
+            choice = np.where(take, V_MULTI, choice).astype(np.int8)
+            arg = np.where(take, split, arg)
+
+        best = np.where(isolated, ISOLATED_PAIR, best)
+        choice = np.where(isolated, V_ISOLATED, choice)
+        best = np.where(paired, best, np.inf)
+        choice = np.where(paired, choice, V_NONE).astype(np.int8)
+        v[:, I, J] = best
+        v_choice[:, I, J] = choice
+        v_arg[:, I, J] = arg
+
+        # W(i, j) - W(i+1, j), W(i, j-1), V(i, j) or two W cells side by side (multi-branch outside a helix)
+        K = I[:, None] + np.arange(1, d-1)[None, :]
+        left = I[:, None]*n + K
+        right = (K+1)*n + J[:, None]
+        count_l, count_r = count_flat[:, left], count_flat[:, right]
+        outer_first = np.where(count_l > 0, first_flat[:, left], first_flat[:, right])
+        outer_last = np.where(count_r > 0, last_flat[:, right], last_flat[:, left])
+        spans = span_flat[:, left] + span_flat[:, right]
+        w4 = MULTI_BRANCH(energies, w_flat[:, left], w_flat[:, right], count_l + count_r,
+                          wsum_flat[:, left] + wsum_flat[:, right], outer_last - outer_first + 1 - spans, False)
+        split = np.argmin(w4, axis=2)
+        w4 = np.take_along_axis(w4, split[:, :, None], axis=2)[:, :, 0]
+
+        w_best = np.full((batch, len(I)), np.inf)
+        w_pick = np.full((batch, len(I)), W_NONE, dtype=np.int8)
+        for candidate, code in ((w[:, I+1, J], W_LEFT), (w[:, I, J-1], W_RIGHT), (best, W_PAIR), (w4, W_SPLIT)):
+            take = candidate < w_best
+            w_best = np.where(take, candidate, w_best)
+            w_pick = np.where(take, code, w_pick).astype(np.int8)
+        w[:, I, J] = w_best
+        w_choice[:, I, J] = w_pick
+
+        # Branch summary of the new W cells
+        rows = np.arange(batch)[:, None]
+        cells = np.arange(len(I))[None, :]
+        pair_summary = [np.zeros((batch, len(I)), dtype=np.int64), np.zeros((batch, len(I))),
+                        np.zeros((batch, len(I)), dtype=np.int64), np.zeros((batch, len(I)), dtype=np.int64),
+                        np.zeros((batch, len(I)), dtype=np.int64)]
+        if d > 4:
+            is_inner = choice == V_INNER
+            A, B = COMBOS(d) if d > 5 else (np.ones(1, dtype=np.int64), np.ones(1, dtype=np.int64))
+            inner_arg = np.where(is_inner, arg, 0)
+            inner_i, inner_j = I[None, :] + A[inner_arg], J[None, :] - B[inner_arg]
+            pair_summary = [np.where(is_inner, 1, 0), np.where(is_inner, w[rows, inner_i, inner_j] + dangles[rows, inner_i, inner_j], 0.0),
+                            np.where(is_inner, inner_j - inner_i + 1, 0), np.where(is_inner, inner_i, 0), np.where(is_inner, inner_j, 0)]
+            is_multi = choice == V_MULTI
+            if is_multi.any():
+                k_multi = I[None, :] + 1 + np.where(is_multi, arg, 0)
+                for index, table in enumerate((count, wsum, span)):
+                    combined = table[rows, I[None, :]+1, k_multi] + table[rows, k_multi+1, J[None, :]-1]
+                    pair_summary[index] = np.where(is_multi, combined, pair_summary[index])
+                lc = count[rows, I[None, :]+1, k_multi]
+                rc = count[rows, k_multi+1, J[None, :]-1]
+                pair_summary[3] = np.where(is_multi, np.where(lc > 0, first[rows, I[None, :]+1, k_multi], first[rows, k_multi+1, J[None, :]-1]), pair_summary[3])
+                pair_summary[4] = np.where(is_multi, np.where(rc > 0, last[rows, k_multi+1, J[None, :]-1], last[rows, I[None, :]+1, k_multi]), pair_summary[4])
+        split_summary = [count_l[rows, cells, split] + count_r[rows, cells, split],
+                         wsum_flat[:, left][rows, cells, split] + wsum_flat[:, right][rows, cells, split],
+                         spans[rows, cells, split], outer_first[rows, cells, split], outer_last[rows, cells, split]]
+        for index, table in enumerate((count, wsum, span, first, last)):
+            table[:, I, J] = np.select([w_pick == W_LEFT, w_pick == W_RIGHT, w_pick == W_PAIR, w_pick == W_SPLIT],
+                                       [table[:, I+1, J], table[:, I, J-1], pair_summary[index], split_summary[index]], 0)
+
+    return FOLD_TABLES(v, w, v_choice, v_arg, w_choice, count, wsum, span, first, last)
+
+
+# Traceback of one sequence of a filled batch - seqfold's walk & rounding (every loop to 0.1, the sum to 0.01)
+# DG is None when the optimal structure holds a multi-branch loop (its energy in the fill is only a lower bound)
+class TRACEBACK:
+    def __init__(self, TABLES, ROW):
+        self.v = TABLES.v[ROW]
+        self.w = TABLES.w[ROW]
+        self.v_choice = TABLES.v_choice[ROW]
+        self.v_arg = TABLES.v_arg[ROW]
+        self.w_choice = TABLES.w_choice[ROW]
+        self.n = self.v.shape[0]
+
+    # Cell holding the structure of W(i, j) - W(i+1, j) & W(i, j-1) share the structure of the cell they took
+    def ROOT(self, i, j):
+        while self.w_choice[i, j] in (W_LEFT, W_RIGHT):
+            if self.w_choice[i, j] == W_LEFT:
+                i += 1
+            else:
+                j -= 1
+        return i, j, int(self.w_choice[i, j])
+
+    # Inner pairs of V(i, j) - one for a stack / bulge / interior loop, a marker for a multi-branch loop
+    def V_IJ(self, i, j):
+        choice = self.v_choice[i, j]
+        if choice == V_INNER:
+            A, B = COMBOS(j-i)
+            arg = self.v_arg[i, j]
+            return ((i + int(A[arg]), j - int(B[arg])),)
+        if choice == V_MULTI:
+            return ('MULTI', i, j)
+        return ()
+
+    # Energy & inner pairs of a W cell - what seqfold compares while walking to the start of a structure
+    def W_STRUCT(self, i, j):
+        if i > j or i >= self.n or j < 0:
+            return (-math.inf, ())
+        root_i, root_j, choice = self.ROOT(i, j)
+        if choice == W_NONE:
+            return (math.inf, ())
+        if choice == W_SPLIT:
+            return (float(self.w[i, j]), ('SPLIT', root_i, root_j))
+        return (float(self.w[i, j]), self.V_IJ(root_i, root_j))
+
+    def DG(self):
+        i, j = 0, self.n-1
+        s = self.W_STRUCT(i, j)
+        root_i, root_j, choice = self.ROOT(i, j)
+        if choice == W_SPLIT:
+            return None
+        if not (choice == W_PAIR and self.v_choice[root_i, root_j] == V_HAIRPIN):
+            while self.W_STRUCT(i+1, j) == s:
+                i += 1
+            while self.W_STRUCT(i, j-1) == s:
+                j -= 1
+        energies = []
+        while True:
+            if j - i < 4:
+                energies.append(-math.inf)     # cell seqfold never filled
+                break
+            energies.append(float(self.v[i, j]))
+            ij = self.V_IJ(i, j)
+            if not ij:
+                break
+            if len(ij) != 1:
+                return None
+            i, j = ij[0]
+        loops = [round(e - (energies[index+1] if index+1 < len(energies) else 0.0), 1) for index, e in enumerate(energies)]
+        return round(sum(loops), 2)
+
+
+# Base codes of DNA sequences (a=0, c=1, g=2, t=3) - anything else cannot be folded
+def FOLD_CODES(SEQUENCES):
+    codes = [ENCODE(str(sequence).lower()) for sequence in SEQUENCES]
+    for sequence, code in zip(SEQUENCES, codes):
+        if (code == UNKNOWN).any():
+            raise ValueError('Only DNA (a, c, g, t) can be folded with the NumPy backend: {0}'.format(sequence))
+    return codes
+
+
+# seqfold.dg of every sequence at TEMP (C) - equal-length sequences are filled together in batches of MAX_BATCH
+# (the ones without a T apart, seqfold folds them as RNA)
+def DG_BATCH(SEQUENCES, TEMP=37.0):
+    codes = FOLD_CODES(SEQUENCES)
+    values = [None]*len(codes)
+    by_length = {}
+    for index, code in enumerate(codes):
+        by_length.setdefault((len(code), not (code == 3).any()), []).append(index)
+    for (length, rna), indexes in by_length.items():
+        if length < 5:
+            for index in indexes:
+                values[index] = -math.inf     # nothing can fold
+            continue
+        for start in range(0, len(indexes), MAX_BATCH):
+            block = indexes[start:start+MAX_BATCH]
+            tables = FILL(np.stack([codes[index] for index in block]), float(TEMP), rna)
+            for row, index in enumerate(block):
+                values[index] = TRACEBACK(tables, row).DG()
+                if values[index] is None:
+                    values[index] = dg(str(SEQUENCES[index]).upper(), temp=float(TEMP))
+    return values
+
+
+def DG(SEQUENCE, TEMP=37.0):
+    return DG_BATCH([SEQUENCE], TEMP)[0]
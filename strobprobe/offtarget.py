@@ -0,0 +1,283 @@
+# Off-target screen - cross-hybridization of the designed strands (PH_final, FUEL_final, PROBE_final) with a
+# background of the sample (transcriptome / genome FASTA)
+#
+#   python3 -m strobprobe.offtarget build Background.fa --index Background_Index
+#   python3 -m strobprobe.offtarget screen Batch_Output/ProbeDesign_Summary.csv --index Background_Index
+#
+# The index is built once: every k-mer of the background (k bases, 2 bits per base) is counting-sorted into
+# OFFSETS (4^k + 1 entries) & POSITIONS, so the positions of one k-mer are POSITIONS[OFFSETS[code]:OFFSETS[code+1]]
+# The arrays are saved as .npy files & memory mapped on later runs - only the pages that are looked up are read
+# The build streams the FASTA into the memory mapped base codes (1 byte per base) & counts / places the k-mers one
+# chunk of CHUNK_BASES at a time (uint32 codes), so a genome is indexed with about the size of POSITIONS (4 or 8 bytes
+# per base) on disk & the OFFSETS table (8 bytes * 4^k, k is at most 13) with its fill counters in memory
+# Every k-mer of each designed strand & of its reverse complement is looked up & every diagonal (background position -
+# query offset) with a seed hit is compared with the query in one array operation - each run of at least k equal bases
+# holding a seed is an exact match, which is scored with the Nearest-Neighbor duplex model (thermo.py)
+# Hits overlapping an exact occurrence of the Target (either strand) are the designed hybridization & are marked on_target
+
+import argparse
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from strobprobe.thermo import ENCODE, GIBBS_CALC, GIBBS_FIXER, MELT_TEMP, THERMO_INDEX, UNKNOWN
+
+INDEX_VERSION = 1
+DEFAULT_K = 12
+MAX_K = 13
+# Seed hits looked at per query - past it the most frequent k-mers of the query are left out
+MAX_SEEDS = 100000
+CHUNK_BASES = 2**22
+COMPLEMENT_CODE = np.array([3, 2, 1, 0, UNKNOWN], dtype=np.int8)
+BASES = 'acgt'
+# One scored hit - orientation 'binds' : the background holds the complement of the strand (it hybridizes with it)
+# 'same' : the background holds the strand itself (its complementary strand hybridizes with it in double stranded DNA)
+# start is 0-based on the record - gcorr (kcal/mol) & tm (C) of the matched region
+OFF_TARGET_HIT = namedtuple('OFF_TARGET_HIT', ['strand', 'orientation', 'record', 'start', 'length', 'match', 'gcorr', 'tm', 'on_target'])
+
+
+# Codes of every k-mer of CODES (-1 where the k-mer holds an unknown base)
+def KMER_CODES(CODES, K):
+    codes = np.asarray(CODES)
+    if len(codes) < K:
+        return np.zeros(0, dtype=np.int64)
+    kmers = np.zeros(len(codes)-K+1, dtype=np.int64)
+    for offset in range(K):
+        kmers = 4*kmers + np.minimum(codes[offset:len(codes)-K+1+offset], 3)
+    unknown = np.concatenate([[0], np.cumsum(codes == UNKNOWN)])
+    kmers[unknown[K:] - unknown[:-K] > 0] = -1
+    return kmers
+
+
+# Records of a FASTA file - [name, start, length] with the records joined by one unknown base in between
+def FASTA_RECORDS(FASTA):
+    records = []
+    with open(FASTA) as fasta:
+        for line in fasta:
+            if line.startswith('>'):
+                start = records[-1][1] + records[-1][2] + 1 if records else 0
+                records.append([line[1:].split(maxsplit=1)[0] if line[1:].strip() else '', start, 0])
+            elif records:
+                records[-1][2] += len(line.strip())
+    return records
+
+
+# uint32 codes of the k-mers starting in CODES[:len(CODES)-K+1] & whether each one is free of unknown bases
+def CHUNK_KMERS(CODES, K):
+    kmers = np.zeros(len(CODES)-K+1, dtype=np.uint32)
+    for offset in range(K):
+        kmers = 4*kmers + np.minimum(CODES[offset:len(CODES)-K+1+offset], 3)
+    unknown = np.concatenate([[0], np.cumsum(CODES == UNKNOWN)])
+    return kmers, unknown[K:] - unknown[:-K] == 0
+
+
+# Build the k-mer index of a FASTA background into DIRECTORY (records are joined with one unknown base in between)
+def BUILD_INDEX(FASTA, DIRECTORY, K=DEFAULT_K):
+    if not 4 <= K <= MAX_K:
+        raise ValueError('K has to be between 4 and {0}'.format(MAX_K))
+    records = FASTA_RECORDS(FASTA)
+    length = records[-1][1] + records[-1][2] if records else 0
+    os.makedirs(DIRECTORY, exist_ok=True)
+
+    # Base codes - written line by line into the memory mapped sequence.npy
+    codes = np.lib.format.open_memmap(os.path.join(DIRECTORY, 'sequence.npy'), mode='w+', dtype=np.uint8, shape=(length,))
+    codes[[record[1] - 1 for record in records[1:]]] = UNKNOWN
+    record = -1
+    with open(FASTA) as fasta:
+        for line in fasta:
+            if line.startswith('>'):
+                record += 1
+                position = records[record][1]
+                continue
+            line = line.strip().lower()
+            if record >= 0 and line:
+                codes[position:position+len(line)] = ENCODE(line)
+                position += len(line)
+    codes.flush()
+
+    # Counting sort over chunks of k-mer starts - count every k-mer, then place the positions of each chunk behind the
+    # ones of the earlier chunks (positions of one k-mer stay in increasing order)
+    chunks = [(start, min(start + CHUNK_BASES, length - K + 1)) for start in range(0, max(0, length - K + 1), CHUNK_BASES)]
+    offsets = np.zeros(4**K + 1, dtype=np.int64)
+    for start, end in chunks:
+        kmers, valid = CHUNK_KMERS(codes[start:end+K-1], K)
+        offsets[1:] += np.bincount(kmers[valid], minlength=4**K)
+    offsets = np.cumsum(offsets)
+    position_type = np.uint32 if length < 2**32 else np.int64
+    positions = np.lib.format.open_memmap(os.path.join(DIRECTORY, 'positions.npy'), mode='w+', dtype=position_type,
+                                          shape=(int(offsets[-1]),))
+    filled = offsets[:-1].copy()
+    for start, end in chunks:
+        kmers, valid = CHUNK_KMERS(codes[start:end+K-1], K)
+        starts = np.flatnonzero(valid)
+        order = np.argsort(kmers[starts], kind='stable')
+        starts, kmers = starts[order], kmers[starts][order]
+        first = np.flatnonzero(np.concatenate([[True], kmers[1:] != kmers[:-1]]))
+        rank = np.arange(len(kmers)) - np.repeat(first, np.diff(np.append(first, len(kmers))))
+        positions[filled[kmers] + rank] = start + starts
+        filled[kmers[first]] += np.diff(np.append(first, len(kmers)))
+    positions.flush()
+    del codes, positions
+
+    np.save(os.path.join(DIRECTORY, 'offsets.npy'), offsets)
+    with open(os.path.join(DIRECTORY, 'index.json'), 'w') as info:
+        json.dump({'version': INDEX_VERSION, 'k': K, 'source': os.path.abspath(FASTA), 'bases': int(length),
+                   'kmers': int(offsets[-1]), 'records': records}, info)
+    return OFF_TARGET_INDEX(DIRECTORY)
+
+
+class OFF_TARGET_INDEX:
+    # Open a saved index - the arrays are memory mapped, not read
+    def __init__(self, DIRECTORY):
+        with open(os.path.join(DIRECTORY, 'index.json')) as info:
+            meta = json.load(info)
+        if meta['version'] != INDEX_VERSION:
+            raise ValueError('{0} was built with another index version - rebuild it'.format(DIRECTORY))
+        self.directory = DIRECTORY
+        self.k = meta['k']
+        self.source = meta['source']
+        self.records = meta['records']
+        self.record_starts = np.array([record[1] for record in self.records], dtype=np.int64)
+        self.sequence = np.load(os.path.join(DIRECTORY, 'sequence.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(DIRECTORY, 'offsets.npy'), mmap_mode='r')
+        self.positions = np.load(os.path.join(DIRECTORY, 'positions.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.sequence)
+
+    # (query offsets, background positions) arrays of every seed hit of the base codes QUERY
+    # k-mers found more than MAX_OCCURRENCES times (low complexity / repeats) are not used as seeds & past MAX_SEEDS hits
+    # the most frequent k-mers of the query are left out too
+    def SEEDS(self, QUERY, MAX_OCCURRENCES=10000, MAX_SEEDS=MAX_SEEDS):
+        codes = KMER_CODES(QUERY, self.k)
+        offsets = np.flatnonzero(codes >= 0)
+        first = np.asarray(self.offsets[codes[offsets]], dtype=np.int64)
+        counts = np.asarray(self.offsets[codes[offsets]+1], dtype=np.int64) - first
+        keep = np.flatnonzero(counts <= MAX_OCCURRENCES)
+        keep = keep[np.argsort(counts[keep], kind='stable')]
+        keep = np.sort(keep[np.cumsum(counts[keep]) <= MAX_SEEDS])
+        offsets, first, counts = offsets[keep], first[keep], counts[keep]
+        # positions of all the kept k-mers in one gather
+        rank = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(offsets, counts), np.asarray(self.positions[np.repeat(first, counts) + rank], dtype=np.int64)
+
+    # Exact matches of QUERY (a sequence) in the background - (query start, background start, length) of every run of at
+    # least k equal bases on a diagonal that holds a seed hit (a diagonal can hold more than one run)
+    def MATCHES(self, QUERY):
+        query = ENCODE(str(QUERY).lower())
+        offsets, positions = self.SEEDS(query)
+        if len(offsets) == 0:
+            return []
+        diagonals, rows = np.unique(positions - offsets, return_inverse=True)
+        rows = rows.reshape(-1)
+        # query against the background along every diagonal
+        background = diagonals[:, None] + np.arange(len(query))[None, :]
+        inside = (background >= 0) & (background < len(self.sequence))
+        bases = np.full(background.shape, UNKNOWN, dtype=np.int16)
+        bases[inside] = self.sequence[background[inside]]
+        equal = (bases == query[None, :]) & (query[None, :] != UNKNOWN)
+        change = np.diff(np.pad(equal, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+        row, start = np.nonzero(change == 1)
+        end = np.nonzero(change == -1)[1]
+        runs = np.flatnonzero(end - start >= self.k)
+        row, start, end = row[runs], start[runs], end[runs]
+        # a run is kept if a seed hit lies in it (the run of a k-mer left out as a seed is not a match)
+        width = len(query) + 1
+        seeds = np.sort(rows*width + offsets)
+        held = np.searchsorted(seeds, row*width + end - self.k, side='right') > np.searchsorted(seeds, row*width + start)
+        row, start, end = row[held], start[held], end[held]
+        return [(int(begin), int(diagonals[line] + begin), int(stop - begin)) for line, begin, stop in zip(row, start, end)]
+
+    # Record & 0-based position on the record of a background position
+    def LOCATE(self, POSITION):
+        record = int(np.searchsorted(self.record_starts, POSITION, side='right')) - 1
+        return self.records[record][0], int(POSITION - self.records[record][1])
+
+    # Scored hits of the named strands {name: sequence} - strongest (most negative gcorr) first
+    # TARGET: sequences whose exact occurrences (either strand) in the background are the designed hybridization -
+    # hits overlapping them are marked on_target
+    def SCREEN(self, STRANDS, TEMPERATURE, SALT_CORR, TARGET=()):
+        loci = []
+        for target in TARGET:
+            for query in (str(target).lower(), REVERSE_COMPLEMENT(target)):
+                loci += [(position, position + length) for query_start, position, length in self.MATCHES(query) if length == len(query)]
+        hits = []
+        for name, strand in STRANDS.items():
+            strand = str(strand).lower()
+            for orientation, query in (('binds', REVERSE_COMPLEMENT(strand)), ('same', strand)):
+                for query_start, position, length in self.MATCHES(query):
+                    match = query[query_start:query_start+length]
+                    h, s, g = THERMO_INDEX(match).THERMO(0, length)
+                    gcorr = GIBBS_CALC(TEMPERATURE, h, s) - GIBBS_FIXER(length, SALT_CORR)
+                    record, start = self.LOCATE(position)
+                    on_target = any(position < end and begin < position + length for begin, end in loci)
+                    hits.append(OFF_TARGET_HIT(name, orientation, record, start, length, match, gcorr,
+                                               MELT_TEMP(h, s, SALT_CORR)-273.15, on_target))
+        return sorted(hits, key=lambda hit: hit.gcorr)
+
+
+# Reverse complement of a lowercase sequence (anything but a, c, g & t becomes n)
+def REVERSE_COMPLEMENT(SEQUENCE):
+    return ''.join(BASES[code] if code != UNKNOWN else 'n' for code in COMPLEMENT_CODE[ENCODE(str(SEQUENCE).lower())][::-1])
+
+
+# One open index per directory in each process - repeated designs reuse the memory map
+OPEN_INDEXES = {}
+
+
+def GET_INDEX(DIRECTORY):
+    key = (os.getpid(), os.path.abspath(DIRECTORY))
+    if key not in OPEN_INDEXES:
+        OPEN_INDEXES[key] = OFF_TARGET_INDEX(key[1])
+    return OPEN_INDEXES[key]
+
+
+# Screen the designs of a Batch / Scan summary table - one row per hit (on-target hits are left out)
+def SCREEN_SUMMARY(SUMMARY_FILE, DIRECTORY, TEMPERATURE, SALT_CORR, OUTPUT_FILE=None, TOP=10):
+    index = GET_INDEX(DIRECTORY)
+    summary = pd.read_csv(SUMMARY_FILE, dtype=str)
+    rows = []
+    for design in summary.to_dict('records'):
+        if design.get('Status', 'Designed') != 'Designed':
+            continue
+        strands = {column: design[column] for column in ('PH_final', 'FUEL_final', 'PROBE_final') if not pd.isna(design.get(column))}
+        hits = [hit for hit in index.SCREEN(strands, TEMPERATURE, SALT_CORR, [design['Target']]) if not hit.on_target]
+        for hit in hits[:TOP]:
+            rows.append({'Target_Name': design['Target_Name'], **hit._asdict()})
+    table = pd.DataFrame(rows, columns=['Target_Name'] + list(OFF_TARGET_HIT._fields))
+    if OUTPUT_FILE is not None:
+        table.to_csv(OUTPUT_FILE, index=False)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StrobProbe off-target screen of the designed strands against a background')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Build the k-mer index of a background FASTA')
+    build.add_argument('fasta', help='Background FASTA (transcriptome / genome)')
+    build.add_argument('--index', required=True, help='Folder for the index')
+    build.add_argument('--k', type=int, default=DEFAULT_K, help='Seed length (4 to {0})'.format(MAX_K))
+    screen = commands.add_parser('screen', help='Screen the designs of a ProbeDesign_Summary.csv / ProbeScan_Summary.csv')
+    screen.add_argument('summary', help='Summary table of Batch Design Mode or Scan Mode')
+    screen.add_argument('--index', required=True, help='Folder of the index')
+    screen.add_argument('--params', default='Sensor_Parameters.csv', help='Sensor_Parameters.csv for the temperature & salt')
+    screen.add_argument('--out', default=None, help='Output .csv (default: OffTarget_Summary.csv next to the summary)')
+    screen.add_argument('--top', type=int, default=10, help='Hits kept per design')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        index = BUILD_INDEX(args.fasta, args.index, args.k)
+        print('{0} bases, {1} k-mers (k = {2}) indexed into {3}'.format(len(index), len(index.positions), index.k, os.path.abspath(args.index)))
+        return
+    from strobprobe.design import READ_PARAMETERS    # design.py imports this module for its off-target stage
+    parameters = READ_PARAMETERS(args.params)
+    output = args.out if args.out is not None else os.path.join(os.path.dirname(os.path.abspath(args.summary)), 'OffTarget_Summary.csv')
+    table = SCREEN_SUMMARY(args.summary, args.index, parameters.temperature, parameters.salt_correction, output, args.top)
+    print('{0} off-target hits saved to {1}'.format(len(table), output))
+
+
+if __name__ == '__main__':
+    main()
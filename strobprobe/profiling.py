@@ -0,0 +1,87 @@
+# Per-stage metrics of a design - wall time, folds & NN thermodynamics calls of every stage, what the stage counted
+# (candidates, Toe Hold 2 outcomes, neck lengths) & one record per neck length iteration, written as
+# ProbeDesign_{Target_Name}_Metrics.json next to the report
+#
+# Call counts are read from the counters of this process: fold_requests - folds asked of the fold cache (cached or not),
+# folds - sequences folded by the folding backend (cache misses & the bracket searches of melting.py), engine_folds -
+# seqfold folds of the fold-once hairpin engine (opening temperatures),
+# nn_calls / nn_duplexes - NN thermodynamics calls & duplexes scored. Fuel candidates checked in worker processes
+# (fuel_workers > 1) are folded there & only their per-candidate records come back
+# PROFILE_CALL runs a design under cProfile & dumps the stats (pstats format) even when the design fails
+
+import cProfile
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from strobprobe.thermo import NN_CALLS
+
+METRICS_VERSION = 1
+
+
+class DESIGN_PROFILE:
+    def __init__(self, FOLDS, ENGINE):
+        self.folds = FOLDS
+        self.engine = ENGINE
+        self.stages = OrderedDict()
+        self.started = time.perf_counter()
+        self.start = self.COUNTERS()
+
+    # Running totals of the process counters
+    def COUNTERS(self):
+        stats = self.folds.STATS()
+        return {'fold_requests': stats['memory_hits'] + stats['disk_hits'] + stats['misses'], 'folds': self.folds.backend.folds,
+                'engine_folds': self.engine.folds, 'nn_calls': NN_CALLS['calls'], 'nn_duplexes': NN_CALLS['duplexes']}
+
+    def DELTA(self, BEFORE):
+        after = self.COUNTERS()
+        return {name: after[name] - BEFORE[name] for name in after}
+
+    # Time & count everything inside the block as stage NAME - the stage record is returned for the stage's own counts
+    @contextmanager
+    def STAGE(self, NAME):
+        record = self.stages.setdefault(NAME, OrderedDict(status='running'))
+        before = self.COUNTERS()
+        started = time.perf_counter()
+        try:
+            yield record
+            record['status'] = 'passed'
+        except BaseException:
+            record['status'] = 'failed'
+            raise
+        finally:
+            record['wall_time'] = time.perf_counter() - started
+            record.update(self.DELTA(before))
+
+    def COUNT(self, STAGE, **COUNTS):
+        self.stages.setdefault(STAGE, OrderedDict()).update(COUNTS)
+
+    def ITERATION(self, STAGE, **VALUES):
+        self.stages.setdefault(STAGE, OrderedDict()).setdefault('iterations', []).append(VALUES)
+
+    def METRICS(self, TARGET_NAME=None, TARGET=None):
+        failed = [name for name, record in self.stages.items() if record.get('status') == 'failed']
+        totals = self.DELTA(self.start)
+        totals['wall_time'] = time.perf_counter() - self.started
+        return OrderedDict(version=METRICS_VERSION, target_name=TARGET_NAME, target_length=None if TARGET is None else len(TARGET),
+                           status='failed' if failed else 'designed', failed_stage=failed[0] if failed else None,
+                           fold_backend=self.folds.backend.name, totals=totals, stages=self.stages)
+
+
+# Write the metrics of a DESIGN_RESULT or DESIGN_ERROR as ProbeDesign_{Target_Name}_Metrics.json in FOLDER
+def WRITE_METRICS(DESIGN, TARGET_NAME, FOLDER='.'):
+    path = os.path.join(FOLDER, 'ProbeDesign_{0}_Metrics.json'.format(TARGET_NAME))
+    with open(path, 'w') as metrics:
+        json.dump(DESIGN.metrics, metrics, indent=1)
+    return path
+
+
+# FUNCTION(*ARGUMENTS, **KEYWORDS) under cProfile - the stats are dumped to PATH whatever the outcome
+def PROFILE_CALL(PATH, FUNCTION, *ARGUMENTS, **KEYWORDS):
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(FUNCTION, *ARGUMENTS, **KEYWORDS)
+    finally:
+        profile.dump_stats(PATH)
@@ -0,0 +1,226 @@
+# Top-N design mode - instead of the first Toe Hold 1, Toe Hold 2 & neck lengths that pass, collect every complete
+# design of the first few of each & rank them
+#
+#   python3 -m strobprobe.ranking --params Sensor_Parameters.csv --top 10 --rank ddg_fph_tph=2 length=0.5
+#
+# Work shared between the candidates instead of rerunning the design N times:
+#   - Target - Place Holder 1 thermodynamics & the Gibbs window check once
+#   - every Toe Hold 1 length scored in one THERMO_INDEX pass (as PROBE_STAGE) - the first TH1_COUNT that pass are used
+#   - one seeded Toe Hold 2 search per Toe Hold 1 returning up to DESIGN_SETTINGS.fuel_candidates Toe Hold 2s
+#   - the fuel necks of each Toe Hold 2 & the probe necks of each Place Holder 3 are found once & combined with each other
+#   - every fold goes through the fold cache & the hairpin engine of the run, so repeated strands are never refolded
+# When DESIGN_SENSOR passes with the same settings its design is the first candidate enumerated (rank ties keep that
+# order) - the smallest Toe Hold 1, the first Toe Hold 2 whose fuel hairpin passes & the first passing neck lengths
+# DESIGN_SENSOR fails when that Toe Hold 2 gets no probe hairpin or no Toe Hold 2 of the smallest Toe Hold 1 gets a fuel
+# hairpin, while the enumeration goes on with the next Toe Hold 2s & Toe Hold 1s - its first candidate is then no
+# DESIGN_SENSOR design
+
+import argparse
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from strobprobe.design import (AS_PARAMETERS, DEFAULT_FOLD_CACHE_FILE, DESIGN_CONTEXT, DESIGN_SETTINGS, PLACE_HOLDER_STAGE,
+                               PROBE_HAIRPIN_HIGH, PROBE_HAIRPIN_LOW, READ_PARAMETERS)
+from strobprobe.fuel import FUEL_HAIRPIN_HIGH, FUEL_HAIRPIN_LOW
+from strobprobe.screen import HAIRPIN_ESTIMATE
+from strobprobe.strand import STRAND
+from strobprobe.thermo import GIBBS_CALC, GIBBS_FIXER, THERMO_INDEX
+from strobprobe.toehold import TH2_SEARCH
+
+# One neck length of a fuel or probe hairpin that passes the Gibbs window & opens below HAIRPIN_OPEN_TEMP_MAX
+# neck_length: bases of the neck - strand: the fuel strand / the probe strand including the spacer
+HAIRPIN_OPTION = namedtuple('HAIRPIN_OPTION', ['neck_length', 'neck', 'strand', 'ghpcorr', 'open_temp'])
+# One complete design - order: position in the enumeration (0 is the design of DESIGN_SENSOR when that one passes)
+# criteria: {criterion: value} of RANK_CRITERIA - score: weighted sum of the criteria (lower is better)
+RANKED_DESIGN = namedtuple('RANKED_DESIGN', ['rank', 'score', 'order', 'th1', 'th2', 'fuel_neck', 'probe_neck', 'ph_final',
+                                             'fuel_final', 'probe_final', 'gcorr_tph1', 'gcorr_ph2p', 'gcorr_fph3', 'ddg_fph_tph',
+                                             'ghpcorr_f', 'ghpcorr_p', 'temp_open_f', 'temp_open_p', 'criteria'])
+
+
+# Ranking criteria - each is 0 for an ideal design & about 1 at the edge of what passes (lower is better)
+#   ddg_fph_tph:   distance of DDG FPH-TPH from the center of its window, in half windows
+#   fuel_hairpin:  distance of the fuel hairpin DG from the center of [-6, -2] kcal/mol, in half windows
+#   probe_hairpin: distance of the probe hairpin DG from the center of [-7, -5] kcal/mol, in half windows
+#   open_margin:   1 - (lowest hairpin opening temperature - temperature) / (HAIRPIN_OPEN_TEMP_MAX - temperature)
+#   length:        total length of the PH, Fuel & Probe strands beyond 3x the Target length, in Target lengths
+def WINDOW_DISTANCE(VALUE, LOW, HIGH):
+    return abs(VALUE - (LOW+HIGH)/2)/((HIGH-LOW)/2)
+
+
+RANK_CRITERIA = {
+    'ddg_fph_tph': lambda design, parameters, t_max: WINDOW_DISTANCE(design['ddg_fph_tph'], parameters.ddg_fph_tph_min, parameters.ddg_fph_tph_max),
+    'fuel_hairpin': lambda design, parameters, t_max: WINDOW_DISTANCE(design['ghpcorr_f'], FUEL_HAIRPIN_LOW, FUEL_HAIRPIN_HIGH),
+    'probe_hairpin': lambda design, parameters, t_max: WINDOW_DISTANCE(design['ghpcorr_p'], PROBE_HAIRPIN_LOW, PROBE_HAIRPIN_HIGH),
+    'open_margin': lambda design, parameters, t_max: 1 - (min(design['temp_open_f'], design['temp_open_p']) - parameters.temperature)/(t_max - parameters.temperature),
+    'length': lambda design, parameters, t_max: (len(design['ph_final']) + len(design['fuel_final']) + len(design['probe_final']))/len(parameters.target) - 3,
+}
+DEFAULT_WEIGHTS = {'ddg_fph_tph': 1.0, 'fuel_hairpin': 1.0, 'probe_hairpin': 1.0, 'open_margin': 1.0, 'length': 1.0}
+
+
+# Toe Hold 1 lengths that pass the Probe 1 - Place Holder 2 check, smallest first (the scoring of PROBE_STAGE)
+def TH1_OPTIONS(PARAMETERS, PLACE_HOLDER_RESULT, COUNT):
+    th1_lengths = np.arange(PARAMETERS.toehold_min, len(PLACE_HOLDER_RESULT.ph1))
+    phosphates_ph2 = len(PLACE_HOLDER_RESULT.target) - th1_lengths
+    h_all, s_all, _ = THERMO_INDEX(PLACE_HOLDER_RESULT.target).THERMO(np.zeros_like(phosphates_ph2), phosphates_ph2)
+    gcorr_all = GIBBS_CALC(PARAMETERS.temperature, h_all, s_all) - GIBBS_FIXER(phosphates_ph2, PARAMETERS.salt_correction)
+    passed = np.flatnonzero(gcorr_all - PLACE_HOLDER_RESULT.gcorr_tph1 > PARAMETERS.ddg_pht_pph)[:COUNT]
+    return [(int(th1_lengths[index]), float(gcorr_all[index])) for index in passed]
+
+
+# Fuel neck lengths of F2 = TH2 + F1 that pass - the neck length loop of FUEL_HAIRPIN_CHECK, kept going after the
+# first pass until COUNT options are found (neck lengths screened out by the NN estimate are not folded)
+def FUEL_OPTIONS(F2, FUEL_LOOP, K_MIN, PARAMETERS, CONTEXT, COUNT):
+    settings = CONTEXT.settings
+    temperature, salt_corr = PARAMETERS.temperature, PARAMETERS.salt_correction
+    f3 = F2 + STRAND(FUEL_LOOP)
+    options = []
+    k = K_MIN
+    while True:
+        neck = F2[len(F2)-k:len(F2)]
+        fuel = f3 + neck.reverse_complement()
+        skip = CONTEXT.fuel_screen is not None and CONTEXT.fuel_screen.SKIP(HAIRPIN_ESTIMATE(neck, len(FUEL_LOOP), temperature, salt_corr, OUTER=0))
+        if not skip:
+            ghpcorr_f = CONTEXT.folds.DG(fuel, temperature, salt_corr)
+            if FUEL_HAIRPIN_LOW <= ghpcorr_f <= FUEL_HAIRPIN_HIGH:
+                opened = CONTEXT.engine.OPEN_TEMP(fuel, salt_corr, temperature, settings.hairpin_open_temp_max, TOL=settings.hairpin_open_temp_tol)
+                if opened.temp is not None:
+                    options.append(HAIRPIN_OPTION(k, str(neck), str(fuel), ghpcorr_f, opened.temp))
+                    if len(options) == COUNT:
+                        return options
+        k = k + 1
+        if k == ((len(fuel)/2)-2):
+            return options
+
+
+# Probe neck lengths of P2 that pass - the neck length loop of PROBE_HAIRPIN_STAGE, kept going until COUNT options are found
+def PROBE_OPTIONS(P2, PARAMETERS, CONTEXT, COUNT):
+    settings = CONTEXT.settings
+    temperature, salt_corr = PARAMETERS.temperature, PARAMETERS.salt_correction
+    options = []
+    k = PARAMETERS.p_hairpin_min
+    while True:
+        neck = P2[len(P2)-k:len(P2)]
+        probe_check = neck.reverse_complement() + P2
+        skip = CONTEXT.probe_screen is not None and CONTEXT.probe_screen.SKIP(HAIRPIN_ESTIMATE(neck, len(P2)-k, temperature, salt_corr, OUTER=-1))
+        if not skip:
+            ghpcorr_p = CONTEXT.folds.DG(probe_check, temperature, salt_corr)
+            if PROBE_HAIRPIN_LOW <= ghpcorr_p <= PROBE_HAIRPIN_HIGH:
+                probe_test = '{0}'.format(PARAMETERS.probe_spacer) + probe_check
+                opened = CONTEXT.engine.OPEN_TEMP(probe_test, salt_corr, temperature, settings.hairpin_open_temp_max, TOL=settings.hairpin_open_temp_tol)
+                if opened.temp is not None:
+                    options.append(HAIRPIN_OPTION(k, str(neck), str(probe_test), ghpcorr_p, opened.temp))
+                    if len(options) == COUNT:
+                        return options
+        if k == ((len(probe_check)/2)-2):
+            return options
+        k = k + 1
+
+
+# Score & rank the complete designs - WEIGHTS: {criterion of RANK_CRITERIA: weight} (criteria left out are not used)
+def RANK_DESIGNS(DESIGNS, PARAMETERS, WEIGHTS=None, T_MAX=100):
+    weights = WEIGHTS if WEIGHTS is not None else DEFAULT_WEIGHTS
+    unknown = sorted(set(weights) - set(RANK_CRITERIA))
+    if unknown:
+        raise ValueError('Unknown ranking criteria: {0} (use {1})'.format(', '.join(unknown), ', '.join(RANK_CRITERIA)))
+    scored = []
+    for design in DESIGNS:
+        criteria = {name: float(RANK_CRITERIA[name](design, PARAMETERS, T_MAX)) for name in weights}
+        scored.append((sum(weights[name]*criteria[name] for name in weights), design['order'], design, criteria))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [RANKED_DESIGN(rank=rank+1, score=score, criteria=criteria, **design) for rank, (score, _, design, criteria) in enumerate(scored)]
+
+
+# The N best complete designs of PARAMETERS (SENSOR_PARAMETERS, dict, parameter table or Sensor_Parameters.csv path)
+# TH1_COUNT Toe Hold 1 lengths x DESIGN_SETTINGS.fuel_candidates Toe Hold 2s x NECK_COUNT fuel necks x NECK_COUNT probe
+# necks are enumerated - raises DESIGN_ERROR if the Target fails the Place Holder check, returns [] if nothing passes
+def TOP_DESIGNS(PARAMETERS, N=10, SETTINGS=None, WEIGHTS=None, TH1_COUNT=3, NECK_COUNT=2, FOLDS=None, ENGINE=None, LOG=None):
+    parameters = AS_PARAMETERS(PARAMETERS)
+    context = DESIGN_CONTEXT(SETTINGS, FOLDS, ENGINE, LOG)
+    settings = context.settings
+    temperature, salt_corr = parameters.temperature, parameters.salt_correction
+    place_holder = PLACE_HOLDER_STAGE(parameters, context)
+    target = STRAND(place_holder.target)
+    ph1 = STRAND(place_holder.ph1)
+    fuel_loop = STRAND('{0}'.format(parameters.fuel_loop))
+    probe_options = {}
+    designs = []
+    for th1_length, gcorr_ph2p in TH1_OPTIONS(parameters, place_holder, TH1_COUNT):
+        th1, ph2 = ph1[0:th1_length], ph1[th1_length:len(ph1)]
+        f1 = target[:-th1_length].lower()
+        found = TH2_SEARCH(ph2, th1_length, len(target)-2, temperature, salt_corr, place_holder.gcorr_tph1, parameters.ddg_fph_tph_min,
+                           parameters.ddg_fph_tph_max, len(target), SEED=settings.th2_seed, COUNT=settings.fuel_candidates,
+                           MAX_CANDIDATES=settings.th2_max_candidates)
+        context.LOG('Toe Hold 1 of {0} bases: {1} Toe Hold 2 candidates ({2} scored)'.format(th1_length, len(found.toe_holds), found.candidates))
+        for toe_hold in found.toe_holds:
+            # The design passes K_MIN = P_Hairpin_Minimum to the fuel neck loop as well
+            fuel_options = FUEL_OPTIONS(STRAND(toe_hold.th2) + f1, fuel_loop, parameters.p_hairpin_min, parameters, context, NECK_COUNT)
+            if not fuel_options:
+                continue
+            ph3 = ph2 + STRAND(toe_hold.th2).reverse_complement()
+            p2 = ph3.reverse_complement()
+            if str(p2) not in probe_options:
+                probe_options[str(p2)] = PROBE_OPTIONS(p2, parameters, context, NECK_COUNT)
+            for fuel in fuel_options:
+                for probe in probe_options[str(p2)]:
+                    designs.append({'order': len(designs), 'th1': str(th1), 'th2': toe_hold.th2, 'fuel_neck': fuel.neck_length,
+                                    'probe_neck': probe.neck_length, 'ph_final': str(th1 + ph3), 'fuel_final': fuel.strand,
+                                    'probe_final': probe.strand, 'gcorr_tph1': place_holder.gcorr_tph1, 'gcorr_ph2p': gcorr_ph2p,
+                                    'gcorr_fph3': toe_hold.gcorr, 'ddg_fph_tph': toe_hold.ddg, 'ghpcorr_f': fuel.ghpcorr,
+                                    'ghpcorr_p': probe.ghpcorr, 'temp_open_f': fuel.open_temp, 'temp_open_p': probe.open_temp})
+    context.LOG('{0} complete designs enumerated'.format(len(designs)))
+    return RANK_DESIGNS(designs, parameters, WEIGHTS, settings.hairpin_open_temp_max)[:N]
+
+
+# Ranked designs as a table - one column per RANKED_DESIGN field & one per criterion
+def RANKED_TABLE(DESIGNS):
+    rows = []
+    for design in DESIGNS:
+        row = {field: getattr(design, field) for field in RANKED_DESIGN._fields if field != 'criteria'}
+        row.update({'criterion_{0}'.format(name): value for name, value in design.criteria.items()})
+        rows.append(row)
+    if not rows:
+        return pd.DataFrame(columns=[field for field in RANKED_DESIGN._fields if field != 'criteria'])
+    return pd.DataFrame(rows)
+
+
+# Ranking weights from the command line - criterion=weight
+def PARSE_WEIGHTS(VALUES):
+    weights = {}
+    for value in VALUES:
+        name, _, weight = value.partition('=')
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StrobProbe top-N designs - every complete design of the first few Toe Holds & necks, ranked')
+    parser.add_argument('--params', default='Sensor_Parameters.csv', help='Sensor_Parameters.csv of the Target')
+    parser.add_argument('--top', type=int, default=10, help='Number of designs kept')
+    parser.add_argument('--th1', type=int, default=3, help='Toe Hold 1 lengths tried (smallest that pass first)')
+    parser.add_argument('--th2', type=int, default=8, help='Toe Hold 2 candidates per Toe Hold 1')
+    parser.add_argument('--necks', type=int, default=2, help='Passing neck lengths kept per fuel / probe hairpin')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the Toe Hold 2 search')
+    parser.add_argument('--rank', nargs='+', default=None, metavar='CRITERION=WEIGHT',
+                        help='Ranking weights ({0}) - default: all of them with weight 1'.format(', '.join(RANK_CRITERIA)))
+    parser.add_argument('--out', default='.', help='Folder for ProbeDesign_{Target_Name}_Top.csv')
+    args = parser.parse_args(argv)
+
+    parameters = READ_PARAMETERS(args.params)
+    settings = DESIGN_SETTINGS(fold_cache_file=DEFAULT_FOLD_CACHE_FILE, th2_seed=args.seed, fuel_candidates=args.th2)
+    weights = PARSE_WEIGHTS(args.rank) if args.rank else None
+    designs = TOP_DESIGNS(parameters, args.top, settings, weights, args.th1, args.necks, LOG=print)
+    os.makedirs(args.out, exist_ok=True)
+    output = os.path.join(os.path.abspath(args.out), 'ProbeDesign_{0}_Top.csv'.format(parameters.target_name))
+    RANKED_TABLE(designs).to_csv(output, index=False)
+    for design in designs:
+        print('{0}. score {1} - TH1 {2} TH2 {3} - fuel neck {4} ({5} kcal/mol) probe neck {6} ({7} kcal/mol)'.format(
+            design.rank, round(design.score, 3), design.th1, design.th2, design.fuel_neck, round(design.ghpcorr_f, 2),
+            design.probe_neck, round(design.ghpcorr_p, 2)))
+    print('{0} designs saved to {1}'.format(len(designs), output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+# Structured design records - one typed record per design (DESIGN_RECORD) with the parameters, every intermediate
+# strand & value, the checkpoint outcomes & the run totals. The ProbeDesign_{Target_Name}.txt report is rendered from
+# the record (RENDER_REPORT), so the text & the table can not disagree
+#
+# Records are written one per line as JSON Lines while a run goes (RECORD_WRITER) & in bulk as a columnar file
+# (WRITE_RECORDS - .parquet, or .feather / .arrow for Arrow IPC, both need pyarrow) - READ_RECORDS reads either back
+# into one pandas table. RECORD_FROM_JSON turns a JSON line back into a DESIGN_RECORD (RENDER_REPORT works on it)
+#
+# Checkpoint flags (place_holder_pass, probe_pass, fuel_pass, probe_hairpin_pass) are None for a stage that did not
+# run. A failed stage keeps the values it got to before its checkpoint (e.g. the T-PH1 thermodynamics)
+# dimer_pairs: one entry per strand pair (strand_a, strand_b, gcorr, tm, length, intended) in report order
+# off_target_top: the off_target_top strongest off-target hits (strand, orientation, record, start, length, match, gcorr, tm)
+
+import json
+import os
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+from strobprobe.dimers import INTENDED_PAIRS
+
+RECORD_VERSION = 1
+
+# Field name & type - str, float, int & bool columns are nullable, list columns hold JSON objects
+RECORD_FIELDS = [
+    ('record_version', int), ('design_version', int), ('status', str), ('failed_stage', str), ('error', str),
+    # Sensor_Parameters.csv
+    ('target_name', str), ('target', str), ('salt_correction', float), ('temperature', float), ('gibbs_pht_max', float),
+    ('gibbs_pht_min', float), ('toehold_min', int), ('ddg_pht_pph', int), ('p_hairpin_min', int), ('probe_spacer', str),
+    ('fuel_loop', str), ('f_hairpin_min', int), ('ddg_fph_tph_max', int), ('ddg_fph_tph_min', int),
+    # Final strands
+    ('th1', str), ('th2', str), ('ph_final', str), ('fuel_final', str), ('probe_final', str),
+    # Place Holder - Target - Place Holder 1
+    ('ph1', str), ('h_tph1', float), ('s_tph1', float), ('g_tph1', float), ('gcorr_tph1', float), ('tm_tph1', float),
+    ('place_holder_pass', bool),
+    # Probe 1 - Toe Hold 1 & Place Holder 2 - Probe 1
+    ('th1_length', int), ('ph2', str), ('p1', str), ('h_ph2p', float), ('s_ph2p', float), ('g_ph2p', float),
+    ('gcorr_ph2p', float), ('tm_ph2p', float), ('probe_pass', bool),
+    # Fuel - Toe Hold 2, fuel hairpin & Fuel 2 - Place Holder 3
+    ('th2_length', int), ('f2', str), ('ph3', str), ('fuel_neck', str), ('fuel_k', int), ('ghpcorr_ftest', float),
+    ('fuel_structure_warning', bool), ('ghpcorr_f', float), ('fuel_rejected', int), ('fuel_hairpin_pass', bool),
+    ('temp_open_f', float), ('h_fph3', float), ('s_fph3', float), ('g_fph3', float), ('gcorr_fph3', float),
+    ('tm_fph3', float), ('ddg_fph_tph', float), ('th2_candidates', int), ('fuel_evaluated', int), ('fuel_pass', bool),
+    # Probe hairpin
+    ('p2', str), ('probe_neck', str), ('probe_k', int), ('ghpcorr_ptest', float), ('probe_structure_warning', bool),
+    ('ghpcorr_p', float), ('temp_open_p', float), ('probe_hairpin_pass', bool),
+    # Strand interactions
+    ('dimer_min_length', int), ('dimer_pairs', list), ('dimer_worst_pair', str), ('dimer_worst_gcorr', float),
+    # Off-target screen
+    ('off_target_background', str), ('off_target_bases', int), ('off_target_k', int), ('off_target_hits', int),
+    ('on_target_hits', int), ('off_target_gcorr', float), ('off_target_top', list),
+    # Run
+    ('th2_seed', int), ('fold_backend', str), ('wall_time', float), ('folds', int),
+]
+DESIGN_RECORD = namedtuple('DESIGN_RECORD', [field for field, _ in RECORD_FIELDS])
+COLUMN_TYPES = {str: 'string', float: 'Float64', int: 'Int64', bool: 'boolean', list: 'object'}
+# Stage result field -> record field, where the names differ
+FUEL_FIELDS = {'neck': 'fuel_neck', 'k': 'fuel_k'}
+PROBE_HAIRPIN_FIELDS = {'neck': 'probe_neck', 'k': 'probe_k'}
+
+
+def AS_VALUE(VALUE, KIND):
+    if VALUE is None or KIND is list:
+        return VALUE
+    return KIND(VALUE)
+
+
+# Record of a design from its stage results - STAGES: {stage: result} of the stages that ran (the failed one with the
+# values it got to), FAILED_STAGE & ERROR (first line of the message) for a failed design, METRICS of strobprobe/profiling.py
+def DESIGN_RECORD_FROM(PARAMETERS, STAGES, SETTINGS, DESIGN_VERSION, FAILED_STAGE=None, ERROR=None, METRICS=None):
+    values = dict.fromkeys(DESIGN_RECORD._fields)
+    values.update(PARAMETERS._asdict())
+    values.update(record_version=RECORD_VERSION, design_version=DESIGN_VERSION, status='failed' if FAILED_STAGE else 'designed',
+                  failed_stage=FAILED_STAGE, error=ERROR, th2_seed=SETTINGS.th2_seed)
+    for stage in ('place_holder', 'probe', 'fuel', 'probe_hairpin'):
+        if stage in STAGES or stage == FAILED_STAGE:
+            values['{0}_pass'.format(stage)] = stage != FAILED_STAGE
+
+    place_holder = STAGES.get('place_holder')
+    if place_holder is not None:
+        values.update({field: value for field, value in place_holder._asdict().items() if field != 'target'})
+    probe = STAGES.get('probe')
+    if probe is not None:
+        values.update(probe._asdict())
+        values['th1_length'] = len(probe.th1) if probe.th1 is not None else None
+    fuel = STAGES.get('fuel')
+    if fuel is not None:
+        values.update({FUEL_FIELDS.get(field, field): value for field, value in fuel._asdict().items() if field != 'fuel_loop'})
+        if fuel.th2 is not None:
+            values['th2_length'] = len(fuel.th2)
+            values['fuel_structure_warning'] = fuel.ghpcorr_ftest <= -4
+            values['fuel_hairpin_pass'] = fuel.temp_open_f is not None
+    hairpin = STAGES.get('probe_hairpin')
+    if hairpin is not None:
+        values.update({PROBE_HAIRPIN_FIELDS.get(field, field): value for field, value in hairpin._asdict().items()})
+        if hairpin.ghpcorr_ptest is not None:
+            values['probe_structure_warning'] = hairpin.ghpcorr_ptest <= -3
+    dimers = STAGES.get('dimers')
+    if dimers is not None:
+        matrix = dimers.matrix
+        pairs = []
+        for first in range(len(matrix.names)):
+            for second in range(first, len(matrix.names)):
+                pairs.append(OrderedDict(strand_a=matrix.names[first], strand_b=matrix.names[second], gcorr=float(matrix.gcorr[first, second]),
+                                         tm=float(matrix.tm[first, second]), length=int(matrix.length[first, second]),
+                                         intended=(matrix.names[first], matrix.names[second]) in INTENDED_PAIRS or
+                                                  (matrix.names[second], matrix.names[first]) in INTENDED_PAIRS))
+        values.update(dimer_min_length=SETTINGS.dimer_min_length, dimer_pairs=pairs, dimer_worst_pair=dimers.worst_pair,
+                      dimer_worst_gcorr=dimers.worst_gcorr)
+    off_target = STAGES.get('off_target')
+    if off_target is not None:
+        hits = [hit for hit in off_target.hits if not hit.on_target]
+        top = [OrderedDict(strand=hit.strand, orientation=hit.orientation, record=hit.record, start=int(hit.start), length=int(hit.length),
+                           match=str(hit.match), gcorr=float(hit.gcorr), tm=float(hit.tm)) for hit in hits[:SETTINGS.off_target_top]]
+        values.update(off_target_background=off_target.background, off_target_bases=off_target.bases, off_target_k=off_target.k,
+                      off_target_hits=off_target.off_target_hits, on_target_hits=len(off_target.hits)-len(hits),
+                      off_target_gcorr=off_target.min_gcorr, off_target_top=top)
+    if METRICS is not None:
+        values.update(fold_backend=METRICS['fold_backend'], wall_time=METRICS['totals']['wall_time'],
+                      folds=METRICS['totals']['folds'] + METRICS['totals']['engine_folds'])
+    return DESIGN_RECORD(*[AS_VALUE(values[field], kind) for field, kind in RECORD_FIELDS])
+
+
+###### Report - every section is rendered from the record ######
+def REPORT_HEADER(RECORD):
+    return ('##################################################################################\n'
+            'Welcome to the StrobProbe DNA Sensor Design Algorithm \nDeveloped in Collaboration with the Strobbia, Dima & Stan Research Groups \nUniversity of Cincinnati\n'
+            'VERSION {0}\n'.format(RECORD.design_version) +
+            '##################################################################################\n'
+            '------------------------------------- Probe Design {0} --------------------------------------\n\n'.format(RECORD.target_name) +
+            'Design Parameters: \n'
+            'Target Sequence: {} \n'.format(RECORD.target) +
+            'Length of Target: {0} \n'.format(len(RECORD.target)) +
+            'Salt Correction Used (M): {0} \n'.format(RECORD.salt_correction) +
+            'Temperature Used (C): {0} \n'.format(RECORD.temperature) +
+            'Max Gibbs Limit Used for PH-T (kcal/mol): {0} \n'.format(RECORD.gibbs_pht_max) +
+            'Min Gibbs Limit Used for PH-T (kcal/mol): {0} \n'.format(RECORD.gibbs_pht_min))
+
+
+def REPORT_PLACE_HOLDER(RECORD):
+    lines = ['\n------------------------- PLACE HOLDER GENERATOR -------------------------\n',
+             ' \n',
+             '--- Target - Place Holder 1 Thermodynamics ---\n',
+             '- Theoretical Thermodynamics based on Santa Lucia 2004 -\n',
+             'DH - Enthalpy (kcal/mol): {0} \n'.format(round(RECORD.h_tph1, 4)),
+             'DS - Entropy (kcal/Kmol): {0} \n'.format(round(RECORD.s_tph1, 4)),
+             'DG - Gibbs Free Energy (kcal/mol): {0} \n'.format(round(RECORD.g_tph1, 4)),
+             ' \n',
+             '- Corrected Values -\n',
+             'Temp & Salt corrected Gibbs Free Energy (kcal/mol): {0} \n'.format(round(RECORD.gcorr_tph1, 4)),
+             'Melting Temperature (C): {0} \n'.format(round(RECORD.tm_tph1, 4))]
+    if RECORD.place_holder_pass:
+        lines.append('{0} kcal/mol > Corrected Gibbs Free Energy > {1} kcal/mol \n Calculated Target-Placeholder Hybridization = {2} kcal/mol \n'.format(
+            RECORD.gibbs_pht_min, RECORD.gibbs_pht_max, round(RECORD.gcorr_tph1, 1)))
+    else:
+        lines.append(RECORD.error)
+    return ''.join(lines)
+
+
+def REPORT_PROBE(RECORD):
+    lines = ['\n------------------------- PROBE 1 GENERATOR -------------------------\n']
+    if not RECORD.probe_pass:
+        lines.append(RECORD.error)
+        return ''.join(lines)
+    lines += ['Corrected PH2P > Corrected TPH1 + DDG PHT-PPH\n DDG_PHT_PPH = {1} kcal/mol\nCalculated Probe 1 - Place Holder 2 = {0} kcal/mol \n'.format(
+                  round(RECORD.gcorr_ph2p, 3), RECORD.ddg_pht_pph),
+              ' \n',
+              '--- Place Holder 2 - Probe 1 Thermodynamics ---\n',
+              '- Toe Hold 1 ({0} elements): {1}'.format(RECORD.th1_length, RECORD.th1),
+              '- Theoretical Thermodynamics based on Santa Lucia 2004 -\n',
+              'DH - Enthalpy (kcal/mol): {0} \n'.format(round(RECORD.h_ph2p, 4)),
+              'DS - Entropy (kcal/Kmol): {0} \n'.format(round(RECORD.s_ph2p, 4)),
+              'DG - Gibbs Free Energy (kcal/mol): {0} \n'.format(round(RECORD.g_ph2p, 4)),
+              ' \n',
+              '- Calculated Values -\n',
+              'Temp & Salt corrected Gibbs Free Energy (kcal/mol): {0} \n'.format(round(RECORD.gcorr_ph2p, 4)),
+              'Melting Temperature (C): {0} \n'.format(round(RECORD.tm_ph2p, 4))]
+    return ''.join(lines)
+
+
+def REPORT_FUEL(RECORD):
+    lines = ['\n ------------------------- FUEL GENERATOR -------------------------\n']
+    if not RECORD.fuel_pass:
+        lines.append(RECORD.error)
+        return ''.join(lines)
+    if RECORD.fuel_structure_warning:
+        lines += [' \n', '\n~~~~~ WARNING CHECK SECONDARY STRUCTURE IN FUEL ~~~~~\n', ' \n']
+    lines += ['This hairpin will not unfold - try a larger hairpin loop\n']*(RECORD.fuel_rejected or 0)
+    lines += ['{1} kcal/mol < DDG_FPH3_TPH1 < {2} kcal/mol \nCalculated DDG Fuel - Place Holder 3 & Target - Place Holder 1 = {0} kcal/mol \n'.format(
+                  round(RECORD.ddg_fph_tph, 3), RECORD.ddg_fph_tph_min, RECORD.ddg_fph_tph_max),
+              '\nHairpin Check:\n',
+              'Fuel Hairpin LOOP of {0} elements\n'.format(len(RECORD.fuel_loop)),
+              'Fuel Hairpin NECK of {0} elements\n'.format(len(RECORD.fuel_neck)),
+              ' \n',
+              '--- Fuel 2 - Place Holder 3 Thermodynamics ---\n',
+              'Toe Hold 2 ({0} elements): {1} \n'.format(RECORD.th2_length, RECORD.th2),
+              ' \n',
+              '- Theoretical Thermodynamics based on Santa Lucia 2004 -\n',
+              'DH - Enthalpy (kcal/mol): {0} \n'.format(round(RECORD.h_fph3, 4)),
+              'DS - Entropy (kcal/Kmol): {0} \n'.format(round(RECORD.s_fph3, 4)),
+              'DG - Gibbs Free Energy (kcal/mol): {0} \n'.format(round(RECORD.g_fph3, 4)),
+              ' \n',
+              '- Calculated Values -\n',
+              'Temp & Salt corrected Gibbs Free Energy (kcal/mol): {0} \n'.format(round(RECORD.gcorr_fph3, 4)),
+              'Melting Temperature (C): {0} \n'.format(round(RECORD.tm_fph3, 4))]
+    return ''.join(lines)
+
+
+def REPORT_PROBE_HAIRPIN(RECORD):
+    lines = ['\n------------------------- PROBE HAIRPIN GENERATOR -------------------------\n', 'Hairpin Check:']
+    if RECORD.probe_structure_warning:
+        lines += [' \n', '\n~~~~~ WARNING CHECK SECONDARY STRUCTURE IN FUEL ~~~~~\n', ' \n']
+    if not RECORD.probe_hairpin_pass:
+        lines.append(RECORD.error)
+        return ''.join(lines)
+    lines += [' \n',
+              '-- Hairpin Thermodynamics with Seq Fold --\n',
+              'Probe Hairpin LOOP of {0} elements\n'.format(RECORD.probe_k),
+              'Probe Hairpin NECK of {0} elements\n'.format(len(RECORD.probe_neck)),
+              'The probe hairpin will open at {0} C in {1} M monovalent salt\n'.format(round(RECORD.temp_open_p, 2), RECORD.salt_correction),
+              '- Calculated Values -\n',
+              'Temp & Salt corrected Gibbs Free Energy (kcal/mol): {0} \n'.format(round(RECORD.ghpcorr_p, 4)),
+              'Melting Temp - Hairpin will open (C): {0} \n'.format(round(RECORD.temp_open_p, 2)),
+              ' \n']
+    return ''.join(lines)
+
+
+def REPORT_DIMERS(RECORD):
+    lines = ['\n------------------------- STRAND INTERACTIONS -------------------------\n',
+             'Best local duplex of each strand pair ({0} or more base pairs, Temp & Salt corrected):\n'.format(RECORD.dimer_min_length)]
+    for pair in RECORD.dimer_pairs:
+        designed = ' (designed hybrid)' if pair['intended'] else ''
+        if pair['length'] == 0:
+            lines.append('{0} - {1}: no duplex{2}\n'.format(pair['strand_a'], pair['strand_b'], designed))
+        else:
+            lines.append('{0} - {1}: {2} kcal/mol - Melting Temperature {3} C - {4} base pairs{5}\n'.format(
+                pair['strand_a'], pair['strand_b'], round(pair['gcorr'], 3), round(pair['tm'], 2), pair['length'], designed))
+    if RECORD.dimer_worst_pair is not None:
+        lines.append('Strongest unintended pair: {0} = {1} kcal/mol\n'.format(RECORD.dimer_worst_pair, round(RECORD.dimer_worst_gcorr, 3)))
+    lines.append(' \n')
+    return ''.join(lines)
+
+
+def REPORT_OFF_TARGET(RECORD):
+    lines = ['\n------------------------- OFF-TARGET SCREEN -------------------------\n',
+             'Background: {0} ({1} bases, seed of {2} bases)\n'.format(os.path.basename(RECORD.off_target_background), RECORD.off_target_bases, RECORD.off_target_k),
+             'Off-target hits: {0} ({1} on-target)\n'.format(RECORD.off_target_hits, RECORD.on_target_hits)]
+    for hit in RECORD.off_target_top:
+        lines.append(OFF_TARGET_LINE(hit) + '\n')
+    lines.append(' \n')
+    return ''.join(lines)
+
+
+# One off-target hit of the report (a hit of off_target_top)
+def OFF_TARGET_LINE(HIT):
+    return '{0} {1} {2}:{3} - {4} bases {5} - Temp & Salt corrected Gibbs Free Energy {6} kcal/mol - Melting Temperature {7} C'.format(
+        HIT['strand'], HIT['orientation'], HIT['record'], HIT['start']+1, HIT['length'], HIT['match'], round(HIT['gcorr'], 3), round(HIT['tm'], 2))
+
+
+def REPORT_FINAL_SEQUENCES(RECORD):
+    return ('##################################################################################\n'
+            '------------------------------ FINAL SEQUENCES ------------------------------\n'
+            'Identified Target:\n'
+            '{0} \n'.format(RECORD.target) +
+            'Length of Target: {0}\n'.format(len(RECORD.target)) +
+            ' \n'
+            'Identified Final Place Holder: \n'
+            '{0} \n'.format(RECORD.ph_final) +
+            'Length of Final Place Holder: {0}\n'.format(len(RECORD.ph_final)) +
+            ' \n'
+            'Identified Final Fuel : \n'
+            '{0} \n'.format(RECORD.fuel_final) +
+            'Length of Final Fuel: {0}\n'.format(len(RECORD.fuel_final)) +
+            ' \n'
+            'Identified Final Probe: \n'
+            '{0} \n'.format(RECORD.probe_final) +
+            'Length of Final Probe: {0}\n'.format(len(RECORD.probe_final)) +
+            ' \n'
+            'Identified Final Toe Hold 1 ({0} elements): \n'.format(len(RECORD.th1)) +
+            '{0} \n'.format(RECORD.th1) +
+            ' \n'
+            'Identified Final Toe Hold 2 ({0} elements): \n'.format(len(RECORD.th2)) +
+            '{0} \n'.format(RECORD.th2) +
+            '\nThanks for using StrobeProbe.py for your DNA Sensor Design Needs!\n')
+
+
+# Report section of each stage - a stage is in the report once it ran (its pass flag / values are set)
+REPORT_SECTIONS = OrderedDict([('place_holder', (REPORT_PLACE_HOLDER, 'place_holder_pass')), ('probe', (REPORT_PROBE, 'probe_pass')),
+                               ('fuel', (REPORT_FUEL, 'fuel_pass')), ('probe_hairpin', (REPORT_PROBE_HAIRPIN, 'probe_hairpin_pass')),
+                               ('dimers', (REPORT_DIMERS, 'dimer_pairs')), ('off_target', (REPORT_OFF_TARGET, 'off_target_top'))])
+
+
+# ProbeDesign_{Target_Name}.txt text of a record - up to & including the error of a failed design
+def RENDER_REPORT(RECORD):
+    text = [REPORT_HEADER(RECORD)]
+    for stage, (section, field) in REPORT_SECTIONS.items():
+        if getattr(RECORD, field) is None:
+            continue
+        text.append(section(RECORD))
+        if stage == RECORD.failed_stage:
+            return ''.join(text)
+    if RECORD.status == 'designed':
+        text.append(REPORT_FINAL_SEQUENCES(RECORD))
+    return ''.join(text)
+
+
+###### JSON Lines & columnar files ######
+def RECORD_AS_JSON(RECORD):
+    return json.dumps(OrderedDict(RECORD._asdict()))
+
+
+# DESIGN_RECORD from a JSON line (or its dict) - fields missing from an older record are None
+def RECORD_FROM_JSON(LINE):
+    values = json.loads(LINE) if isinstance(LINE, str) else LINE
+    return DESIGN_RECORD(*[AS_VALUE(values.get(field), kind) for field, kind in RECORD_FIELDS])
+
+
+# Records appended one JSON line at a time, flushed after each so a reader (or a crash) sees every finished design
+class RECORD_WRITER:
+    def __init__(self, PATH, MODE='a'):
+        self.path = PATH
+        self.file = open(PATH, MODE)
+
+    def WRITE(self, RECORD):
+        self.file.write(RECORD_AS_JSON(RECORD) + '\n')
+        self.file.flush()
+
+    def CLOSE(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *EXCEPTION):
+        self.CLOSE()
+
+
+# Typed pandas table of records (DESIGN_RECORD or their dicts) - one column per field, nullable types
+def RECORDS_TABLE(RECORDS):
+    rows = [record._asdict() if hasattr(record, '_asdict') else record for record in RECORDS]
+    table = pd.DataFrame(rows, columns=DESIGN_RECORD._fields)
+    return table.astype({field: COLUMN_TYPES[kind] for field, kind in RECORD_FIELDS})
+
+
+# Records to PATH - .parquet, .feather / .arrow (Arrow IPC) or .jsonl by the extension
+def WRITE_RECORDS(RECORDS, PATH):
+    extension = os.path.splitext(PATH)[1].lower()
+    if extension == '.jsonl':
+        with RECORD_WRITER(PATH, 'w') as writer:
+            for record in RECORDS:
+                writer.WRITE(record if hasattr(record, '_asdict') else RECORD_FROM_JSON(record))
+        return PATH
+    table = RECORDS_TABLE(RECORDS)
+    if extension == '.parquet':
+        table.to_parquet(PATH, index=False)
+    elif extension in ('.feather', '.arrow'):
+        table.to_feather(PATH)
+    else:
+        raise ValueError('Unknown record file type {0} - use .parquet, .feather, .arrow or .jsonl'.format(extension))
+    return PATH
+
+
+# One pandas table of the records of a .jsonl, .parquet or .feather / .arrow file
+def READ_RECORDS(PATH):
+    extension = os.path.splitext(PATH)[1].lower()
+    if extension == '.jsonl':
+        with open(PATH) as lines:
+            return RECORDS_TABLE([RECORD_FROM_JSON(line) for line in lines if line.strip()])
+    if extension == '.parquet':
+        return pd.read_parquet(PATH)
+    if extension in ('.feather', '.arrow'):
+        return pd.read_feather(PATH)
+    raise ValueError('Unknown record file type {0} - use .parquet, .feather, .arrow or .jsonl'.format(extension))
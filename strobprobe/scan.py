@@ -0,0 +1,226 @@
+# Scan Mode - finds every designable target window of a long sequence (gene, chromosome, genome) in one pass
+#
+#   python3 -m strobprobe.scan Genome.fa --params Sensor_Parameters.csv --lengths 20 35 --out Scan_Output
+#
+# The FASTA is streamed in chunks of CHUNK_SIZE bases, so a whole chromosome is never held in memory
+# For every window length the Target - Place Holder 1 DH/DS of all windows of a chunk come from one cumulative
+# Nearest-Neighbor sum (the same integer sums as THERMO_INDEX, so the corrected DG equals the one of the design)
+# Only windows whose corrected DG is inside [GIBBS_PHT_MAX, GIBBS_PHT_MIN] go on to the full probe / fuel design
+# Windows with a base other than a, c, g or t are skipped - only the given strand is scanned
+# Results are written to Scan_Output/ProbeScan_Summary.csv as soon as each window is done
+# A window whose design stops on an error (not a design checkpoint) gets Status Error & the scan goes on
+
+import argparse
+import csv
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from strobprobe.batch import SUMMARY_FIELDS, SUMMARY_RECORD
+from strobprobe.design import (DEFAULT_FOLD_CACHE_FILE, DESIGN_ERROR, DESIGN_SETTINGS, DESIGN_SENSOR, READ_PARAMETERS,
+                               WRITE_REPORT)
+from strobprobe.thermo import (ENCODE, GIBBS_FIXER_ARRAY, INIT_H, INIT_S, NN_H_INT, NN_S_INT, TERMINAL_AT, TERMINAL_AT_H,
+                               TERMINAL_AT_S, UNKNOWN)
+
+CHUNK_SIZE = 1 << 20    # bases per chunk
+# One window inside the Gibbs window - start is 0-based on the record, gcorr_tph1 in kcal/mol
+SCAN_WINDOW = namedtuple('SCAN_WINDOW', ['record', 'start', 'length', 'target', 'gcorr_tph1'])
+SCAN_FIELDS = ['Target_Name', 'Record', 'Start', 'Length', 'Target', 'Gcorr_TPH1', 'Status', 'Error']
+
+
+# Stream the records of a FASTA file as (record id, position of the chunk on the record, lowercase chunk)
+def FASTA_CHUNKS(FILE, CHUNK_SIZE=CHUNK_SIZE):
+    record = None
+    position = 0
+    buffer = []
+    size = 0
+    with open(FILE) as fasta:
+        for line in fasta:
+            if line.startswith('>'):
+                if record is not None and size:
+                    yield record, position, ''.join(buffer)
+                record = line[1:].split(maxsplit=1)[0] if line[1:].strip() else ''
+                position, buffer, size = 0, [], 0
+                continue
+            line = line.strip().lower()
+            if record is None or not line:
+                continue
+            buffer.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                chunk = ''.join(buffer)
+                yield record, position, chunk
+                position += len(chunk)
+                buffer, size = [], 0
+    if record is not None and size:
+        yield record, position, ''.join(buffer)
+
+
+# Corrected Target - Place Holder 1 DG (kcal/mol) of every window of each length in LENGTHS over the base codes CODES
+# Only windows ending at or after FIRST_END are scored (the ones before were scored with the previous chunk)
+# Returns (start, length, gcorr) arrays of the windows without unknown bases
+def WINDOW_GIBBS(CODES, LENGTHS, TEMPERATURE, SALT_CORR, FIRST_END=0):
+    codes = np.asarray(CODES)
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    coup = 5*codes[:-1].astype(np.int64) + codes[1:]
+    cum_h = np.concatenate([[0], np.cumsum(NN_H_INT[coup])])
+    cum_s = np.concatenate([[0], np.cumsum(NN_S_INT[coup])])
+    cum_unknown = np.concatenate([[0], np.cumsum(codes == UNKNOWN)])
+    terminal_at = TERMINAL_AT[codes].astype(np.int64)
+    kelvin = TEMPERATURE+273.15
+    starts, lengths, gibbs = [], [], []
+    for length in LENGTHS:
+        start = np.arange(max(0, FIRST_END-length), len(codes)-length+1)
+        if len(start) == 0:
+            continue
+        stop = start + length
+        start = start[cum_unknown[stop] - cum_unknown[start] == 0]
+        stop = start + length
+        terminal = terminal_at[start] + terminal_at[stop-1]
+        h = INIT_H + TERMINAL_AT_H*terminal + (cum_h[stop-1]-cum_h[start])/100
+        s = (INIT_S + TERMINAL_AT_S*terminal + (cum_s[stop-1]-cum_s[start])/100)/1000
+        starts.append(start)
+        lengths.append(np.full(len(start), length))
+        gibbs.append(h - kelvin*s - GIBBS_FIXER_ARRAY(length, SALT_CORR))
+    if not starts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(starts), np.concatenate(lengths), np.concatenate(gibbs)
+
+
+# All windows of LENGTH_MIN to LENGTH_MAX bases of the FASTA file whose corrected DG is inside [GIBBS_MAX, GIBBS_MIN]
+# Windows are yielded chunk by chunk (by start, then length) - STEP only keeps the starts that are a multiple of STEP
+def SCAN_WINDOWS(FILE, LENGTH_MIN, LENGTH_MAX, TEMPERATURE, SALT_CORR, GIBBS_MAX, GIBBS_MIN, STEP=1, CHUNK_SIZE=CHUNK_SIZE):
+    lengths = range(LENGTH_MIN, LENGTH_MAX+1)
+    carry_record, carry = None, ''
+    for record, position, chunk in FASTA_CHUNKS(FILE, max(CHUNK_SIZE, LENGTH_MAX)):
+        if record != carry_record:
+            carry_record, carry = record, ''
+        sequence = carry + chunk
+        offset = position - len(carry)
+        start, length, gcorr = WINDOW_GIBBS(ENCODE(sequence), lengths, TEMPERATURE, SALT_CORR, FIRST_END=len(carry)+1)
+        keep = (gcorr >= GIBBS_MAX) & (gcorr <= GIBBS_MIN) & ((start + offset) % STEP == 0)
+        start, length, gcorr = start[keep], length[keep], gcorr[keep]
+        for index in np.lexsort((length, start)):
+            begin = int(start[index])
+            yield SCAN_WINDOW(record, offset + begin, int(length[index]), sequence[begin:begin+int(length[index])], float(gcorr[index]))
+        carry = sequence[len(sequence)-(LENGTH_MAX-1):] if LENGTH_MAX > 1 else ''
+
+
+def WINDOW_NAME(WINDOW):
+    return '{0}_{1}_{2}'.format(WINDOW.record, WINDOW.start+1, WINDOW.length)
+
+
+def WINDOW_ROW(WINDOW, STATUS='Designed', ERROR=''):
+    return {'Target_Name': WINDOW_NAME(WINDOW), 'Record': WINDOW.record, 'Start': WINDOW.start+1, 'Length': WINDOW.length,
+            'Target': WINDOW.target, 'Gcorr_TPH1': WINDOW.gcorr_tph1, 'Status': STATUS, 'Error': ERROR}
+
+
+# Summary row of a window whose design stopped on an error other than a design checkpoint (a lost worker, a full disk)
+def ERROR_ROW(WINDOW, ERROR):
+    return WINDOW_ROW(WINDOW, 'Error', '{0}: {1}'.format(type(ERROR).__name__, ERROR))
+
+
+# Full design of one window - returns the scan summary row (& writes the report into REPORT_DIR if given)
+# A failed design checkpoint is recorded as Status Failed & any other error as Status Error, as in Batch Design Mode -
+# one window never stops the scan
+def DESIGN_WINDOW(JOB):
+    window, parameters, settings, report_dir = JOB
+    name = WINDOW_NAME(window)
+    row = WINDOW_ROW(window)
+    try:
+        design = DESIGN_SENSOR(parameters._replace(target_name=name, target=window.target), settings)
+        row.update(SUMMARY_RECORD(design))
+        if report_dir is not None:
+            WRITE_REPORT(design, name, report_dir)
+    except DESIGN_ERROR as error:
+        row['Status'] = 'Failed'
+        row['Error'] = str(error).strip().splitlines()[0].strip()
+    except Exception as error:
+        return ERROR_ROW(window, error)
+    return row
+
+
+# Scan FILE & design every window inside the Gibbs window - rows are appended to OUTPUT_DIR/ProbeScan_Summary.csv
+# as they finish (in window order with one worker, in finishing order over a pool of WORKERS processes)
+# DESIGN=False only lists the windows. Returns the number of windows found
+def RUN_SCAN(FILE, PARAMETER_FILE='Sensor_Parameters.csv', OUTPUT_DIR='Scan_Output', LENGTH_MIN=None, LENGTH_MAX=None,
+             STEP=1, DESIGN=True, WORKERS=1, SEED=None, REPORTS=False, CHUNK_SIZE=CHUNK_SIZE, OFF_TARGET_INDEX=None):
+    parameters = READ_PARAMETERS(PARAMETER_FILE)
+    length_min = LENGTH_MIN if LENGTH_MIN is not None else len(parameters.target)
+    length_max = LENGTH_MAX if LENGTH_MAX is not None else length_min
+    settings = DESIGN_SETTINGS(fold_cache_file=DEFAULT_FOLD_CACHE_FILE, fuel_workers=1, off_target_index=OFF_TARGET_INDEX)
+    if SEED is not None:
+        settings = settings._replace(th2_seed=SEED)
+    output_dir = os.path.abspath(OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    report_dir = output_dir if REPORTS else None
+
+    windows = SCAN_WINDOWS(FILE, length_min, length_max, parameters.temperature, parameters.salt_correction,
+                           parameters.gibbs_pht_max, parameters.gibbs_pht_min, STEP, CHUNK_SIZE)
+    fields = SCAN_FIELDS + [column for column, stage, field in SUMMARY_FIELDS] if DESIGN else SCAN_FIELDS[:6]
+    found = 0
+    with open(os.path.join(output_dir, 'ProbeScan_Summary.csv'), 'w', newline='') as summary:
+        writer = csv.DictWriter(summary, fieldnames=fields, restval='')
+
+        def WRITE(row):
+            writer.writerow(row)
+            summary.flush()
+            print('{0}: {1} {2}'.format(row['Target_Name'], row.get('Status', ''), row.get('Error', '')).rstrip())
+
+        writer.writeheader()
+        if not DESIGN:
+            for window in windows:
+                found += 1
+                WRITE({field: value for field, value in WINDOW_ROW(window).items() if field in fields})
+        elif WORKERS is None or WORKERS <= 1:
+            for window in windows:
+                found += 1
+                WRITE(DESIGN_WINDOW((window, parameters, settings, report_dir)))
+        else:
+            # At most 2 windows per worker are queued, so the scan never runs far ahead of the designs
+            with ProcessPoolExecutor(max_workers=WORKERS) as pool:
+                pending = {}
+
+                def WRITE_DONE(done):
+                    for future in done:
+                        window = pending.pop(future)
+                        try:
+                            WRITE(future.result())
+                        except Exception as error:     # the worker itself was lost
+                            WRITE(ERROR_ROW(window, error))
+
+                for window in windows:
+                    found += 1
+                    pending[pool.submit(DESIGN_WINDOW, (window, parameters, settings, report_dir))] = window
+                    if len(pending) >= 2*WORKERS:
+                        WRITE_DONE(wait(pending, return_when=FIRST_COMPLETED).done)
+                WRITE_DONE(wait(pending).done)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StrobProbe scan for designable targets along long sequences')
+    parser.add_argument('fasta', help='FASTA file to scan (any number of records)')
+    parser.add_argument('--params', default='Sensor_Parameters.csv', help='Sensor_Parameters.csv used for every window (the Target is ignored)')
+    parser.add_argument('--out', default='Scan_Output', help='Folder for ProbeScan_Summary.csv (& the reports with --reports)')
+    parser.add_argument('--lengths', type=int, nargs=2, default=None, metavar=('MIN', 'MAX'), help='Window lengths to scan (default: length of the Target in --params)')
+    parser.add_argument('--step', type=int, default=1, help='Only start a window every STEP bases')
+    parser.add_argument('--windows-only', action='store_true', help='Only list the windows inside the Gibbs window, without designing them')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes for the designs')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the Toe Hold 2 search of every window')
+    parser.add_argument('--reports', action='store_true', help='Write the ProbeDesign_{Target_Name}.txt report of every designed window')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Bases read per chunk')
+    parser.add_argument('--off-target', default=None, help='Off-target index folder (python3 -m strobprobe.offtarget build) to screen every design against')
+    args = parser.parse_args(argv)
+
+    length_min, length_max = args.lengths if args.lengths is not None else (None, None)
+    found = RUN_SCAN(args.fasta, args.params, args.out, length_min, length_max, args.step, not args.windows_only,
+                     args.workers, args.seed, args.reports, args.chunk_size, args.off_target)
+    print('\n{0} windows inside the Gibbs window - summary saved to {1}'.format(found, os.path.join(os.path.abspath(args.out), 'ProbeScan_Summary.csv')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Nearest-Neighbor pre-screen of the fuel & probe neck lengths before the full seqfold fold
+# The DG of the designed hairpin (neck stem + loop) is estimated from the Santa Lucia NN tables of thermo.py
+# plus the hairpin loop initiation penalty (SantaLucia&Hicks2004, entropic - scaled with the temperature)
+#
+# The estimate is NOT a bound of the seqfold fold: seqfold scores the stem with its own NN & terminal mismatch tables,
+# so the fold can be less stable than the designed hairpin estimate as well as more (fold - estimate reached
+# +2.3 kcal/mol over random fuel hairpins at 25 C & 0.05 M salt). A neck whose estimate is more than MARGIN below the
+# lower end of the DG window is not folded - any MARGIN smaller than the largest fold - estimate can skip a neck that
+# would have passed & change the design, so the screen is off (screen_margin=None) unless a margin is asked for
+# Nothing is skipped on the weak side - other structures can make the fold much more stable than the estimate
+#
+# HAIRPIN_SCREEN keeps the (estimate, fold) pairs of every neck that is folded - the largest fold - estimate is
+# the error the MARGIN has to cover. With AUDIT=True the skipped necks are folded as well & any skipped neck
+# that would have been inside the window is counted, so a margin can be checked without changing the designs
+
+import numpy as np
+
+from strobprobe.foldcache import HAIRPIN_SALT_CORR
+from strobprobe.thermo import ENCODE, NN_H, NN_S, TERMINAL_AT, TERMINAL_AT_H, TERMINAL_AT_S
+
+# Hairpin loop initiation DG at 37 C (kcal/mol) by loop length - SantaLucia&Hicks2004
+HAIRPIN_LOOP_LENGTH = np.array([3, 4, 5, 6, 7, 8, 9, 10, 12, 14, 16, 18, 20, 25, 30])
+HAIRPIN_LOOP_G37 = np.array([3.5, 3.5, 3.3, 4.0, 4.2, 4.3, 4.5, 4.6, 5.0, 5.1, 5.3, 5.5, 5.7, 6.1, 6.3])
+GAS_CONSTANT = 1.9872e-3    # kcal/Kmol
+
+
+# Loop initiation DG (kcal/mol) of a hairpin loop of LOOP bases at TEMPERATURE (C)
+# Interpolated inside the table & extrapolated with 2.44*R*T*ln(n/30) for longer loops
+def HAIRPIN_LOOP_G(LOOP, TEMPERATURE):
+    loop = np.maximum(np.asarray(LOOP, dtype=float), HAIRPIN_LOOP_LENGTH[0])
+    g37 = np.interp(loop, HAIRPIN_LOOP_LENGTH, HAIRPIN_LOOP_G37)
+    g37 = np.where(loop > HAIRPIN_LOOP_LENGTH[-1], HAIRPIN_LOOP_G37[-1] + 2.44*GAS_CONSTANT*310.15*np.log(loop/HAIRPIN_LOOP_LENGTH[-1]), g37)
+    return g37*(TEMPERATURE+273.15)/310.15
+
+
+# Temp & Salt corrected DG estimate (kcal/mol) of a hairpin with the stem NECK (paired with its reverse complement)
+# & a loop of LOOP bases - OUTER is the position in NECK of the base pair at the open end of the stem (0 or -1)
+def HAIRPIN_ESTIMATE(NECK, LOOP, TEMPERATURE, SALT_CORR, OUTER=0):
+    codes = ENCODE(NECK.lower())
+    coup = 5*codes[:-1].astype(np.int64) + codes[1:]
+    terminal = int(TERMINAL_AT[codes[OUTER]]) if len(codes) else 0
+    h = NN_H[coup].sum() + TERMINAL_AT_H*terminal
+    s = (NN_S[coup].sum() + TERMINAL_AT_S*terminal)/1000
+    return float(h - (TEMPERATURE+273.15)*s + HAIRPIN_LOOP_G(LOOP, TEMPERATURE) + HAIRPIN_SALT_CORR(SALT_CORR))
+
+
+class HAIRPIN_SCREEN:
+    # LOW & HIGH: DG window of the neck loop (kcal/mol) - MARGIN: how far past LOW the estimate has to be to skip
+    def __init__(self, LOW, HIGH, MARGIN, AUDIT=False):
+        self.low = LOW
+        self.high = HIGH
+        self.margin = MARGIN
+        self.audit = AUDIT
+        self.records = []     # (estimate, fold DG or None, skipped)
+
+    # Can the fold of this neck be skipped? (in AUDIT mode the caller folds it anyway & records the result)
+    def SKIP(self, ESTIMATE):
+        return ESTIMATE < self.low - self.margin
+
+    def RECORD(self, ESTIMATE, DG, SKIPPED):
+        self.records.append((ESTIMATE, DG, SKIPPED))
+
+    def STATS(self):
+        folded = [(estimate, g) for estimate, g, skipped in self.records if g is not None and np.isfinite(g)]
+        errors = np.array([g - estimate for estimate, g in folded])
+        wrong = [1 for estimate, g, skipped in self.records if skipped and g is not None and self.low <= g <= self.high]
+        return {'screened': len(self.records),
+                'skipped': sum(1 for record in self.records if record[2]),
+                'max_fold_minus_estimate': float(errors.max()) if len(errors) else None,
+                'mean_fold_minus_estimate': float(errors.mean()) if len(errors) else None,
+                'wrong_skips': len(wrong) if self.audit else None,
+                'margin': self.margin}
@@ -0,0 +1,366 @@
+# Design Service - a resident localhost HTTP service that designs sensors on demand, so repeated designs do not pay
+# the Python start up, the imports & cold caches every time
+#
+#   python3 -m strobprobe.service --params Sensor_Parameters.csv --port 8765 --workers 2 --queue 16
+#
+# POST /designs            JSON object of Sensor_Parameters.csv fields (names of the file or of SENSOR_PARAMETERS) -
+#                          every field not given is taken from the --params file. "Seed" sets the Toe Hold 2 seed
+#                          Answers 202 {"job": id} - with ?stream=1 the events of the job are streamed back instead
+# GET  /designs/{id}       Status, events & result of a job
+# GET  /designs/{id}/events  Events of a job as JSON lines - the ones already sent, then each new one until the job ends
+# GET  /status             Workers, queued & running jobs
+#
+# Jobs wait in a bounded queue (503 when it is full) & are designed over a pool of worker processes that stay up
+# between jobs - every worker keeps its fold cache (the on-disk cache of the command line is shared) & hairpin engine
+# warm. Events of a job (JSON lines): queued, started, one stage event as each stage passes (place_holder, probe,
+# fuel, probe_hairpin, dimers, off_target) with its result & metrics, then done (summary columns of Batch Design Mode,
+# report text & metrics) or failed (error, stage & report up to the error)
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from strobprobe.batch import SUMMARY_RECORD
+from strobprobe.design import (DEFAULT_FOLD_CACHE_FILE, DESIGN_ERROR, DESIGN_SETTINGS, DESIGN_SENSOR, GET_ENGINE, PARAMETERS_FROM_TABLE,
+                               SENSOR_PARAMETERS)
+from strobprobe.foldcache import GET_FOLD_CACHE
+
+DEFAULT_PORT = 8765
+# Finished jobs kept for GET /designs/{id} - the oldest ones are dropped first
+JOB_HISTORY = 1000
+# Events queue of the worker processes (set by SERVICE_WORKER_INIT)
+WORKER_EVENTS = None
+
+
+# Plain JSON form of a stage result - namedtuples become objects & NumPy values lists / numbers
+def AS_JSON(VALUE):
+    if hasattr(VALUE, '_asdict'):
+        return OrderedDict((field, AS_JSON(value)) for field, value in VALUE._asdict().items())
+    if isinstance(VALUE, dict):
+        return OrderedDict((str(key), AS_JSON(value)) for key, value in VALUE.items())
+    if isinstance(VALUE, (list, tuple)):
+        return [AS_JSON(value) for value in VALUE]
+    if isinstance(VALUE, np.ndarray):
+        return AS_JSON(VALUE.tolist())
+    if isinstance(VALUE, np.generic):
+        return VALUE.item()
+    if VALUE is None or isinstance(VALUE, (str, int, float, bool)):
+        return VALUE
+    return str(VALUE)
+
+
+# Worker process start up - opens the fold cache & hairpin engine the jobs of this worker share
+# Ctrl+C is left to the service, which shuts the workers down
+def SERVICE_WORKER_INIT(EVENTS, SETTINGS):
+    global WORKER_EVENTS
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    WORKER_EVENTS = EVENTS
+    GET_ENGINE(SETTINGS.fold_backend, GET_FOLD_CACHE(SETTINGS.fold_cache_file, SETTINGS.fold_cache_size, BACKEND=SETTINGS.fold_backend))
+
+
+def SERVICE_WARMUP():
+    return os.getpid()
+
+
+# Design one job in a worker - every event goes through the events queue (in order), the final one included
+def SERVICE_JOB(JOB_ID, PARAMETERS, SETTINGS):
+    started = time.perf_counter()
+    WORKER_EVENTS.put((JOB_ID, OrderedDict(event='started', pid=os.getpid())))
+
+    def ON_STAGE(NAME, RESULT, METRICS, KEY):
+        WORKER_EVENTS.put((JOB_ID, OrderedDict(event='stage', stage=NAME, key=KEY, result=AS_JSON(RESULT), metrics=AS_JSON(METRICS))))
+
+    try:
+        design = DESIGN_SENSOR(PARAMETERS, SETTINGS, ON_STAGE=ON_STAGE)
+    except DESIGN_ERROR as error:
+        event = OrderedDict(event='failed', error=str(error).strip().splitlines()[0].strip(), stage=error.stage, report=error.report,
+                            record=AS_JSON(error.record), metrics=AS_JSON(error.metrics))
+    except Exception as error:
+        event = OrderedDict(event='failed', error='{0}: {1}'.format(type(error).__name__, error), stage=None, report=None, record=None,
+                            metrics=None)
+    else:
+        event = OrderedDict(event='done', summary=AS_JSON(SUMMARY_RECORD(design)), report=design.report, record=AS_JSON(design.record),
+                            metrics=AS_JSON(design.metrics))
+    event['compute_time'] = time.perf_counter() - started
+    WORKER_EVENTS.put((JOB_ID, event))
+
+
+class SERVICE_JOB_RECORD:
+    def __init__(self, JOB_ID, PARAMETERS):
+        self.id = JOB_ID
+        self.target_name = PARAMETERS.target_name
+        self.status = 'queued'
+        self.events = []
+        self.submitted = time.time()
+        self.finished = None
+
+    # Called with DESIGN_SERVICE.changed held - the events are not changed once added, so the copy can be sent without it
+    def AS_JSON(self):
+        return OrderedDict(job=self.id, target_name=self.target_name, status=self.status, events=list(self.events))
+
+
+class DESIGN_SERVICE:
+    def __init__(self, TEMPLATE, SETTINGS=None, WORKERS=None, QUEUE_SIZE=16):
+        self.template = TEMPLATE
+        self.settings = SETTINGS if SETTINGS is not None else DESIGN_SETTINGS(fold_cache_file=DEFAULT_FOLD_CACHE_FILE, fuel_workers=1)
+        self.workers = WORKERS or os.cpu_count() or 1
+        self.queue_size = QUEUE_SIZE
+        self.jobs = OrderedDict()
+        self.pending = 0
+        self.ids = itertools.count(1)
+        self.changed = threading.Condition()
+        self.events = multiprocessing.Queue()
+        self.pool = None
+        self.START_POOL()
+        self.reader = threading.Thread(target=self.READ_EVENTS, daemon=True)
+        self.reader.start()
+
+    # (Re)start the worker pool - every worker is started & warmed up right away
+    def START_POOL(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=SERVICE_WORKER_INIT, initargs=(self.events, self.settings))
+        for _ in range(self.workers):
+            self.pool.submit(SERVICE_WARMUP)
+
+    # Parameters of a job - the --params template with the given fields replaced
+    def JOB_PARAMETERS(self, FIELDS):
+        table = self.template.copy()
+        names = [str(name) for name in table.iloc[:len(SENSOR_PARAMETERS._fields), 0]]
+        settings = self.settings
+        for key, value in FIELDS.items():
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise ValueError('{0} has to be a string or a number'.format(key))
+            if key == 'Seed':
+                settings = settings._replace(th2_seed=int(value))
+            elif key in names:
+                table.iloc[names.index(key), 1] = value
+            elif key in SENSOR_PARAMETERS._fields:
+                table.iloc[SENSOR_PARAMETERS._fields.index(key), 1] = value
+            else:
+                raise ValueError('Unknown field {0}'.format(key))
+        parameters = PARAMETERS_FROM_TABLE(table)
+        return parameters._replace(target=parameters.target.strip().lower()), settings
+
+    # Queue a design job - raises ValueError for bad fields & OverflowError when the queue is full
+    # The job is sent to the pool with self.changed held, so it never sees a pool that broke but was not replaced yet. A
+    # pool found broken is replaced & the job sent again once - if that fails too the job fails & BrokenExecutor is raised
+    def SUBMIT(self, FIELDS):
+        parameters, settings = self.JOB_PARAMETERS(FIELDS)
+        broken = None
+        try:
+            with self.changed:
+                if self.pending >= self.workers + self.queue_size:
+                    raise OverflowError('The design queue is full ({0} jobs)'.format(self.pending))
+                job = SERVICE_JOB_RECORD(next(self.ids), parameters)
+                self.jobs[job.id] = job
+                self.pending += 1
+                self.ADD_EVENT(job, OrderedDict(event='queued', target_name=parameters.target_name))
+                self.FORGET()
+                try:
+                    pool = self.pool
+                    future = pool.submit(SERVICE_JOB, job.id, parameters, settings)
+                except BrokenExecutor:
+                    broken = self.pool
+                    self.START_POOL()
+                    try:
+                        pool = self.pool
+                        future = pool.submit(SERVICE_JOB, job.id, parameters, settings)
+                    except BrokenExecutor as error:
+                        self.ADD_EVENT(job, OrderedDict(event='failed', error='{0}: {1}'.format(type(error).__name__, error), stage=None,
+                                                        report=None, metrics=None))
+                        raise
+        finally:
+            if broken is not None:
+                broken.shutdown(wait=False, cancel_futures=True)
+        future.add_done_callback(lambda done: self.JOB_EXIT(job, done, pool))
+        return job
+
+    # Called with self.changed held
+    def ADD_EVENT(self, JOB, EVENT):
+        EVENT['job'] = JOB.id
+        EVENT['time'] = time.time() - JOB.submitted
+        JOB.events.append(EVENT)
+        if EVENT['event'] == 'started':
+            JOB.status = 'running'
+        elif EVENT['event'] in ('done', 'failed'):
+            JOB.status = EVENT['event']
+            JOB.finished = time.time()
+            self.pending -= 1
+        self.changed.notify_all()
+
+    def FORGET(self):
+        finished = [job.id for job in self.jobs.values() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished)-JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    def READ_EVENTS(self):
+        while True:
+            message = self.events.get()
+            if message is None:
+                return
+            job_id, event = message
+            with self.changed:
+                job = self.jobs.get(job_id)
+                if job is not None and job.finished is None:
+                    self.ADD_EVENT(job, event)
+
+    # A job left the pool - a worker that died (or a job that could not be sent) fails the job without a result event
+    # A job that failed with BrokenExecutor broke its POOL - if that is still the pool of the service it is replaced & shut
+    # down, so its remaining processes & management thread do not linger (the other jobs of that pool find it replaced)
+    def JOB_EXIT(self, JOB, FUTURE, POOL):
+        error = None if FUTURE.cancelled() else FUTURE.exception()
+        if error is None:
+            return
+        with self.changed:
+            if JOB.finished is None:
+                self.ADD_EVENT(JOB, OrderedDict(event='failed', error='{0}: {1}'.format(type(error).__name__, error), stage=None,
+                                                report=None, metrics=None))
+            if not isinstance(error, BrokenExecutor) or self.pool is not POOL:
+                return
+            self.START_POOL()
+        POOL.shutdown(wait=False, cancel_futures=True)
+
+    # Events of a job from FIRST on, waiting for new ones until the job ends
+    def STREAM(self, JOB, FIRST=0):
+        sent = FIRST
+        while True:
+            with self.changed:
+                while sent >= len(JOB.events) and JOB.finished is None:
+                    self.changed.wait()
+                events = JOB.events[sent:]
+                finished = JOB.finished is not None
+            for event in events:
+                yield event
+            sent += len(events)
+            if finished and sent >= len(JOB.events):
+                return
+
+    def STATUS(self):
+        with self.changed:
+            statuses = [job.status for job in self.jobs.values()]
+            return OrderedDict(workers=self.workers, queue_size=self.queue_size, queued=statuses.count('queued'),
+                               running=statuses.count('running'), done=statuses.count('done'), failed=statuses.count('failed'))
+
+    def CLOSE(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.events.put(None)
+        self.reader.join()
+
+
+class SERVICE_HANDLER(BaseHTTPRequestHandler):
+    service = None
+
+    def SEND_JSON(self, STATUS, VALUE):
+        body = json.dumps(VALUE).encode('utf-8')
+        self.send_response(STATUS)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # JSON lines, written & flushed as the events come - the connection is closed at the end of the job
+    def SEND_STREAM(self, JOB):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for event in self.service.STREAM(JOB):
+            self.wfile.write(json.dumps(event).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+    def JOB(self, PARTS):
+        try:
+            return self.service.jobs.get(int(PARTS[1]))
+        except ValueError:
+            return None
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/designs':
+            return self.SEND_JSON(404, {'error': 'Unknown path {0}'.format(url.path)})
+        try:
+            fields = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(fields, dict):
+                raise ValueError('The job has to be a JSON object of Sensor_Parameters fields')
+            job = self.service.SUBMIT(fields)
+        except (OverflowError, BrokenExecutor) as error:        # a full queue or a pool that could not be restarted
+            return self.SEND_JSON(503, {'error': str(error) or type(error).__name__})
+        except (TypeError, ValueError, KeyError) as error:     # a field that can not be read fails the request, not the handler
+            return self.SEND_JSON(400, {'error': '{0}: {1}'.format(type(error).__name__, error)})
+        if parse_qs(url.query).get('stream', ['0'])[0] == '1':
+            return self.SEND_STREAM(job)
+        self.SEND_JSON(202, {'job': job.id, 'status': job.status})
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if parts == ['status']:
+            return self.SEND_JSON(200, self.service.STATUS())
+        if len(parts) in (2, 3) and parts[0] == 'designs':
+            job = self.JOB(parts)
+            if job is None:
+                return self.SEND_JSON(404, {'error': 'Unknown job {0}'.format(parts[1])})
+            if len(parts) == 2:
+                # a slow client must not hold the lock the event reader & the other handlers wait for
+                with self.service.changed:
+                    value = job.AS_JSON()
+                return self.SEND_JSON(200, value)
+            if parts[2] == 'events':
+                return self.SEND_STREAM(job)
+        self.SEND_JSON(404, {'error': 'Unknown path {0}'.format(self.path)})
+
+    def log_message(self, FORMAT, *ARGUMENTS):
+        if self.server.verbose:
+            super().log_message(FORMAT, *ARGUMENTS)
+
+
+# HTTP server of SERVICE on HOST:PORT (PORT 0 takes a free port - server.server_port)
+def SERVICE_SERVER(SERVICE, HOST='127.0.0.1', PORT=DEFAULT_PORT, VERBOSE=False):
+    handler = type('SERVICE_HANDLER', (SERVICE_HANDLER,), {'service': SERVICE})
+    server = ThreadingHTTPServer((HOST, PORT), handler)
+    server.daemon_threads = True
+    server.verbose = VERBOSE
+    return server
+
+
+def RUN_SERVICE(PARAMETER_FILE='Sensor_Parameters.csv', HOST='127.0.0.1', PORT=DEFAULT_PORT, WORKERS=None, QUEUE_SIZE=16, SETTINGS=None,
+                VERBOSE=False):
+    service = DESIGN_SERVICE(pd.read_csv(PARAMETER_FILE, header=None), SETTINGS, WORKERS, QUEUE_SIZE)
+    server = SERVICE_SERVER(service, HOST, PORT, VERBOSE)
+    print('StrobProbe design service on http://{0}:{1} ({2} workers, queue of {3})'.format(HOST, server.server_port, service.workers, QUEUE_SIZE))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.CLOSE()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StrobProbe design service - designs sensors on localhost HTTP with warm caches')
+    parser.add_argument('--params', default='Sensor_Parameters.csv', help='Sensor_Parameters.csv with the defaults of every job')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--queue', type=int, default=16, help='Jobs that can wait for a worker')
+    parser.add_argument('--no-disk-cache', action='store_true', help='Only keep the folds in the memory of each worker')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args(argv)
+
+    settings = DESIGN_SETTINGS(fold_cache_file=None if args.no_disk_cache else DEFAULT_FOLD_CACHE_FILE, fuel_workers=1)
+    RUN_SERVICE(args.params, args.host, args.port, args.workers, args.queue, settings, args.verbose)
+
+
+if __name__ == '__main__':
+    main()
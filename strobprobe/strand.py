@@ -0,0 +1,119 @@
+# Compact strand type for the search loops - a sequence held as one byte per base (a=0, c=1, g=2, t=3, the other
+# IUPAC letters & upper case after that) instead of a new Bio.Seq / str for every slice, complement & concatenation
+#
+# Slices are views of the same bytes (no copy), the complement, reverse complement & case changes are one
+# translation table pass & the string form is only built when it is asked for (seqfold, the fold cache keys & the
+# report) and then kept. The NN code of strobprobe/thermo.py is read straight from the bytes
+# The methods the design uses on Bio.Seq (slicing, +, len, reverse_complement, complement, lower, upper) keep their
+# Bio.Seq names, so a STRAND goes where a Seq went. STRAND(Seq) & STRAND.SEQ() convert DNA without loss
+# Only the DNA letters of LETTERS are accepted - an RNA base (u), a space or any other letter raises ValueError
+
+import numpy as np
+from Bio.Seq import Seq
+
+# Letters in code order - the code of a base is its index, codes 0-3 are the ones the NN tables score
+LETTERS = 'acgtACGTnrykmswbdhvNRYKMSWBDHV-'
+COMPLEMENTS = 'tgcaTGCAnyrmkswvhdbNYRMKSWVHDB-'
+CODES = bytes(range(len(LETTERS)))
+
+# Translation tables - text -> codes & back, codes -> complement / lower / upper codes
+ENCODE_TABLE = bytes.maketrans(LETTERS.encode('ascii'), CODES)
+DECODE_TABLE = bytes.maketrans(CODES, LETTERS.encode('ascii'))
+COMPLEMENT_TABLE = bytes.maketrans(CODES, bytes(LETTERS.index(base) for base in COMPLEMENTS))
+LOWER_TABLE = bytes.maketrans(CODES, bytes(LETTERS.index(base) for base in LETTERS.lower()))
+UPPER_TABLE = bytes.maketrans(CODES, bytes(LETTERS.index(base) for base in LETTERS.upper()))
+# Letters that are not in LETTERS are deleted by the encoding - a shorter result means the text was not DNA
+NOT_LETTERS = bytes(sorted(set(range(256)) - set(LETTERS.encode('ascii'))))
+# Code -> base code of strobprobe/thermo.py (only lower case a, c, g, t are scored, anything else is 4)
+THERMO_CODE = np.full(256, 4, dtype=np.int8)
+THERMO_CODE[:4] = np.arange(4)
+
+
+# Codes of a sequence given as text (str, Bio.Seq or anything with a str form)
+def STRAND_CODES(SEQUENCE):
+    text = str(SEQUENCE)
+    try:
+        raw = text.encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError('Not a DNA sequence: {0}'.format(text)) from None
+    codes = raw.translate(ENCODE_TABLE, NOT_LETTERS)
+    if len(codes) != len(raw):
+        raise ValueError('Not a DNA sequence: {0}'.format(text))
+    return memoryview(codes)
+
+
+class STRAND:
+    __slots__ = ('codes', 'text')
+
+    def __init__(self, SEQUENCE='', CODES=None):
+        if CODES is not None:
+            self.codes = CODES
+            self.text = None
+        elif isinstance(SEQUENCE, STRAND):
+            self.codes = SEQUENCE.codes
+            self.text = SEQUENCE.text
+        else:
+            self.text = SEQUENCE if isinstance(SEQUENCE, str) else str(SEQUENCE)
+            self.codes = STRAND_CODES(self.text)
+
+    def __str__(self):
+        if self.text is None:
+            self.text = self.codes.tobytes().translate(DECODE_TABLE).decode('ascii')
+        return self.text
+
+    def __repr__(self):
+        return "STRAND('{0}')".format(self)
+
+    def __format__(self, SPEC):
+        return format(str(self), SPEC)
+
+    def __len__(self):
+        return len(self.codes)
+
+    # A single base is a str (as Bio.Seq gives) - a slice is a view of the same codes (a stepped slice is copied)
+    def __getitem__(self, INDEX):
+        if isinstance(INDEX, slice):
+            codes = self.codes[INDEX]
+            return STRAND(CODES=codes if codes.contiguous else memoryview(codes.tobytes()))
+        return LETTERS[self.codes[INDEX]]
+
+    def __add__(self, OTHER):
+        other = OTHER if isinstance(OTHER, STRAND) else STRAND(OTHER)
+        return STRAND(CODES=memoryview(b''.join((self.codes, other.codes))))
+
+    def __radd__(self, OTHER):
+        return STRAND(OTHER) + self
+
+    def __eq__(self, OTHER):
+        if isinstance(OTHER, STRAND):
+            return self.codes == OTHER.codes
+        return str(self) == str(OTHER)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __getstate__(self):
+        return str(self)
+
+    def __setstate__(self, STATE):
+        self.text = STATE
+        self.codes = STRAND_CODES(STATE)
+
+    def reverse_complement(self):
+        return STRAND(CODES=memoryview(self.codes[::-1].tobytes().translate(COMPLEMENT_TABLE)))
+
+    def complement(self):
+        return STRAND(CODES=memoryview(self.codes.tobytes().translate(COMPLEMENT_TABLE)))
+
+    def lower(self):
+        return STRAND(CODES=memoryview(self.codes.tobytes().translate(LOWER_TABLE)))
+
+    def upper(self):
+        return STRAND(CODES=memoryview(self.codes.tobytes().translate(UPPER_TABLE)))
+
+    # Base codes of strobprobe/thermo.py - the NN tables & the pre-screen read these without going through the text
+    def THERMO_CODES(self):
+        return THERMO_CODE[np.frombuffer(self.codes, dtype=np.uint8)]
+
+    def SEQ(self):
+        return Seq(str(self))
@@ -0,0 +1,190 @@
+# Parameter Sweep Mode - where do the designs pass? Every check of the design is evaluated for a set of candidate
+# designs over a grid of temperatures, salt corrections & checkpoint thresholds
+#
+#   python3 -m strobprobe.sweep --params Sensor_Parameters.csv --temperatures 15:35:20 --salts 0.05:0.5:20 --out Sweep_Output
+#
+# The candidates are fixed sets of strands (designed at the --params point or read from a Batch / Scan summary) -
+# the sweep tells where each of them still passes, it does not redesign the sensor at every grid point
+# The temperature independent parts are computed once per candidate:
+#   - DH & DS of the T-PH1, PH2-P1 & F2-PH3 hybrids (THERMO_INDEX) - the corrections are applied to the whole grid as arrays
+#   - the seqfold DG curve of the fuel & probe hairpins over all the temperatures (HAIRPIN_ENGINE, a few folds per
+#     hairpin) - the salt correction is added as an array
+#   - the hairpin opening temperature of each salt (solved on the same folded structure lines)
+# Results go to Sweep_Output/ProbeSweep_Summary.csv - one row per candidate & grid point with the values & the pass flags
+
+import argparse
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from strobprobe.design import (DEFAULT_FOLD_CACHE_FILE, DESIGN_ERROR, DESIGN_SETTINGS, DESIGN_SENSOR, GET_ENGINE, PROBE_HAIRPIN_HIGH,
+                               PROBE_HAIRPIN_LOW, READ_PARAMETERS)
+from strobprobe.foldcache import HAIRPIN_SALT_CORR
+from strobprobe.fuel import FUEL_HAIRPIN_HIGH, FUEL_HAIRPIN_LOW
+from strobprobe.thermo import GIBBS_CALC_ARRAY, GIBBS_FIXER_ARRAY, THERMO_INDEX
+
+# Checkpoint thresholds that can be swept (SENSOR_PARAMETERS fields) - one value (the --params one) unless a grid is given
+THRESHOLD_FIELDS = ['gibbs_pht_max', 'gibbs_pht_min', 'ddg_pht_pph', 'ddg_fph_tph_max', 'ddg_fph_tph_min']
+THRESHOLD_COLUMNS = ['Gibbs_PHT_Max', 'Gibbs_PHT_Min', 'DDG_PHT_PPH', 'DDG_FPH_TPH_Max', 'DDG_FPH_TPH_Min']
+# Temperature independent part of one candidate design - h (kcal/mol) & s (kcal/Kmol) of the three hybrids
+# probe_check: probe hairpin without the spacer (the strand of the Gibbs check) - probe_final is used for the opening temperature
+SWEEP_CANDIDATE = namedtuple('SWEEP_CANDIDATE', ['name', 'target', 'th1', 'th2', 'fuel_final', 'probe_final', 'probe_check',
+                                                 'h_tph1', 's_tph1', 'h_ph2p', 's_ph2p', 'length_ph2', 'h_fph3', 's_fph3'])
+# Values & pass flags of every sweep row, in the column order of the summary
+SWEEP_FIELDS = ['Candidate', 'Temperature', 'Salt_Correction'] + THRESHOLD_COLUMNS + [
+    'Gcorr_TPH1', 'Gcorr_PH2P', 'Gcorr_FPH3', 'DDG_FPH_TPH', 'Ghpcorr_F', 'Ghpcorr_P', 'Fuel_Hairpin_Open_Temp',
+    'Probe_Hairpin_Open_Temp', 'Place_Holder_Pass', 'Probe_Pass', 'Fuel_Pass', 'Fuel_Hairpin_Pass', 'Probe_Hairpin_Pass', 'Pass']
+
+
+# Grid values from the command line - a number or START:STOP:COUNT (COUNT evenly spaced values, both ends included)
+def GRID_VALUES(VALUES):
+    grid = []
+    for value in VALUES:
+        if ':' in str(value):
+            start, stop, count = str(value).split(':')
+            grid.extend(np.linspace(float(start), float(stop), int(count)))
+        else:
+            grid.append(float(value))
+    return np.array(grid, dtype=float)
+
+
+# Invariants of a design from its strands - NAME labels the candidate in the summary, SPACER is the probe spacer
+# Hybrids as in the design: T-PH1 (whole Target), PH2-P1 (Target without TH1) & F2-PH3 (TH2 + Target without TH1)
+def SWEEP_CANDIDATE_FROM(NAME, TARGET, TH1, TH2, FUEL_FINAL, PROBE_FINAL, SPACER):
+    target = str(TARGET).lower()
+    length_ph2 = len(target) - len(TH1)
+    h_tph1, s_tph1, _ = THERMO_INDEX(target).THERMO(0, len(target))
+    h_ph2p, s_ph2p, _ = THERMO_INDEX(target).THERMO(0, length_ph2)
+    f2 = str(TH2).lower() + target[:length_ph2]
+    h_fph3, s_fph3, _ = THERMO_INDEX(f2).THERMO(0, len(f2))
+    return SWEEP_CANDIDATE(NAME, target, str(TH1), str(TH2), str(FUEL_FINAL), str(PROBE_FINAL), str(PROBE_FINAL)[len(str(SPACER)):],
+                           h_tph1, s_tph1, h_ph2p, s_ph2p, length_ph2, h_fph3, s_fph3)
+
+
+# Candidate of a finished design (DESIGN_RESULT)
+def DESIGN_CANDIDATE(DESIGN, SPACER, NAME=None):
+    return SWEEP_CANDIDATE_FROM(NAME if NAME is not None else DESIGN.target_name, DESIGN.target, DESIGN.th1, DESIGN.th2,
+                                DESIGN.fuel_final, DESIGN.probe_final, SPACER)
+
+
+# Hairpin opening temperature of SEQUENCE for each salt & temperature of the grid - (temperatures, salts) array, NaN if
+# the hairpin does not open below T_MAX. The search of each salt starts at the lowest temperature; only where the
+# first sign change lies below the grid temperature (it can close again above it) is the search repeated from there
+def OPEN_TEMP_GRID(ENGINE, SEQUENCE, TEMPERATURES, SALTS, T_MAX, TOL):
+    grid = np.full((len(TEMPERATURES), len(SALTS)), np.nan)
+    for column, salt in enumerate(SALTS):
+        first = ENGINE.OPEN_TEMP(SEQUENCE, salt, float(TEMPERATURES.min()), T_MAX, TOL=TOL).temp
+        for row, temperature in enumerate(TEMPERATURES):
+            if first is not None and first >= temperature:
+                grid[row, column] = first
+            else:
+                opened = ENGINE.OPEN_TEMP(SEQUENCE, salt, float(temperature), T_MAX, TOL=TOL).temp
+                grid[row, column] = np.nan if opened is None else opened
+    return grid
+
+
+# Sweep the candidates over the grid - THRESHOLDS: {SENSOR_PARAMETERS field: values} for the fields of THRESHOLD_FIELDS
+# (fields left out use the PARAMETERS value) - returns the summary table (SWEEP_FIELDS)
+def SWEEP(CANDIDATES, PARAMETERS, TEMPERATURES, SALTS, THRESHOLDS=None, ENGINE=None, T_MAX=100, TOL=0.1):
+    engine = ENGINE if ENGINE is not None else GET_ENGINE()
+    temperatures = np.asarray(TEMPERATURES, dtype=float)
+    salts = np.asarray(SALTS, dtype=float)
+    thresholds = THRESHOLDS or {}
+    limits = [np.asarray(thresholds.get(field, [getattr(PARAMETERS, field)]), dtype=float) for field in THRESHOLD_FIELDS]
+    # Grid axes: temperature, salt & each threshold - every array below broadcasts to the full grid
+    axes = [temperatures, salts] + limits
+    shape = tuple(len(axis) for axis in axes)
+    grid = list(np.meshgrid(*axes, indexing='ij'))
+    t = temperatures.reshape((-1,) + (1,)*(len(shape)-1))
+    salt = salts.reshape((1, -1) + (1,)*(len(shape)-2))
+    gibbs_max, gibbs_min, ddg_pht_pph, ddg_max, ddg_min = grid[2:]
+
+    tables = []
+    for candidate in CANDIDATES:
+        length_t = len(candidate.target)
+        gcorr_tph1 = GIBBS_CALC_ARRAY(t, candidate.h_tph1, candidate.s_tph1) - GIBBS_FIXER_ARRAY(length_t, salt)
+        gcorr_ph2p = GIBBS_CALC_ARRAY(t, candidate.h_ph2p, candidate.s_ph2p) - GIBBS_FIXER_ARRAY(candidate.length_ph2, salt)
+        # Gcorr_FPH3 is corrected with the length of the Target as in the design script
+        gcorr_fph3 = GIBBS_CALC_ARRAY(t, candidate.h_fph3, candidate.s_fph3) - GIBBS_FIXER_ARRAY(length_t, salt)
+        ddg_fph_tph = gcorr_fph3 - gcorr_tph1
+        # seqfold DG of the hairpins - one curve over the temperatures + the salt correction of each salt
+        salt_corr = HAIRPIN_SALT_CORR(salts).reshape(salt.shape)
+        ghpcorr_f = engine.DG_CURVE(candidate.fuel_final, temperatures).reshape(t.shape) + salt_corr
+        ghpcorr_p = engine.DG_CURVE(candidate.probe_check, temperatures).reshape(t.shape) + salt_corr
+        open_f = OPEN_TEMP_GRID(engine, candidate.fuel_final, temperatures, salts, T_MAX, TOL).reshape(t.shape[:1] + salt.shape[1:])
+        open_p = OPEN_TEMP_GRID(engine, candidate.probe_final, temperatures, salts, T_MAX, TOL).reshape(t.shape[:1] + salt.shape[1:])
+
+        place_holder = (gcorr_tph1 >= gibbs_max) & (gcorr_tph1 <= gibbs_min)
+        probe = gcorr_ph2p - gcorr_tph1 > ddg_pht_pph
+        fuel = (ddg_min < ddg_fph_tph) & (ddg_fph_tph < ddg_max)
+        fuel_hairpin = (FUEL_HAIRPIN_LOW <= ghpcorr_f) & (ghpcorr_f <= FUEL_HAIRPIN_HIGH) & ~np.isnan(open_f)
+        probe_hairpin = (PROBE_HAIRPIN_LOW <= ghpcorr_p) & (ghpcorr_p <= PROBE_HAIRPIN_HIGH) & ~np.isnan(open_p)
+        columns = [np.full(shape, candidate.name, dtype=object)] + grid + [
+            gcorr_tph1, gcorr_ph2p, gcorr_fph3, ddg_fph_tph, ghpcorr_f, ghpcorr_p, open_f, open_p,
+            place_holder, probe, fuel, fuel_hairpin, probe_hairpin, place_holder & probe & fuel & fuel_hairpin & probe_hairpin]
+        tables.append(pd.DataFrame({field: np.broadcast_to(column, shape).ravel() for field, column in zip(SWEEP_FIELDS, columns)}))
+    if not tables:
+        return pd.DataFrame(columns=SWEEP_FIELDS)
+    return pd.concat(tables, ignore_index=True)
+
+
+# Candidates of a Batch / Scan summary table (designed rows only)
+def SUMMARY_CANDIDATES(SUMMARY_FILE, SPACER):
+    summary = pd.read_csv(SUMMARY_FILE, dtype=str)
+    return [SWEEP_CANDIDATE_FROM(design['Target_Name'], design['Target'], design['TH1'], design['TH2'], design['FUEL_final'],
+                                 design['PROBE_final'], SPACER)
+            for design in summary.to_dict('records') if design.get('Status', 'Designed') == 'Designed']
+
+
+# Candidates designed at the --params point - one design per Toe Hold 2 seed (seeds giving the same strands are kept once)
+def SEED_CANDIDATES(PARAMETERS, SEEDS, SETTINGS=None):
+    settings = SETTINGS if SETTINGS is not None else DESIGN_SETTINGS(fold_cache_file=DEFAULT_FOLD_CACHE_FILE)
+    candidates, strands = [], set()
+    for seed in SEEDS:
+        try:
+            design = DESIGN_SENSOR(PARAMETERS, settings._replace(th2_seed=seed))
+        except DESIGN_ERROR as error:
+            print('seed {0}: {1}'.format(seed, str(error).strip().splitlines()[0].strip()))
+            continue
+        key = (design.ph_final, design.fuel_final, design.probe_final)
+        if key not in strands:
+            strands.add(key)
+            candidates.append(DESIGN_CANDIDATE(design, PARAMETERS.probe_spacer, '{0}_seed{1}'.format(design.target_name, seed)))
+    return candidates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StrobProbe parameter sweep - where the designs pass over a temperature / salt / threshold grid')
+    parser.add_argument('--params', default='Sensor_Parameters.csv', help='Sensor_Parameters.csv of the design point')
+    parser.add_argument('--designs', default=None, help='ProbeDesign_Summary.csv / ProbeScan_Summary.csv whose designs are swept (default: design the --params Target)')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0], help='Toe Hold 2 seeds of the designs of the --params Target')
+    parser.add_argument('--temperatures', nargs='+', default=None, help='Temperatures (C) - values or START:STOP:COUNT (default: the --params one)')
+    parser.add_argument('--salts', nargs='+', default=None, help='Salt corrections (M) - values or START:STOP:COUNT (default: the --params one)')
+    for field, column in zip(THRESHOLD_FIELDS, THRESHOLD_COLUMNS):
+        parser.add_argument('--{0}'.format(field.replace('_', '-')), nargs='+', default=None, help='{0} values (default: the --params one)'.format(column))
+    parser.add_argument('--out', default='Sweep_Output', help='Folder for ProbeSweep_Summary.csv')
+    args = parser.parse_args(argv)
+
+    parameters = READ_PARAMETERS(args.params)
+    if args.designs is not None:
+        candidates = SUMMARY_CANDIDATES(args.designs, parameters.probe_spacer)
+    else:
+        candidates = SEED_CANDIDATES(parameters, args.seeds)
+    temperatures = GRID_VALUES(args.temperatures) if args.temperatures else np.array([parameters.temperature])
+    salts = GRID_VALUES(args.salts) if args.salts else np.array([parameters.salt_correction])
+    thresholds = {field: GRID_VALUES(getattr(args, field)) for field in THRESHOLD_FIELDS if getattr(args, field) is not None}
+    settings = DESIGN_SETTINGS()
+    table = SWEEP(candidates, parameters, temperatures, salts, thresholds, T_MAX=settings.hairpin_open_temp_max, TOL=settings.hairpin_open_temp_tol)
+
+    os.makedirs(args.out, exist_ok=True)
+    output = os.path.join(os.path.abspath(args.out), 'ProbeSweep_Summary.csv')
+    table.to_csv(output, index=False)
+    for name, rows in table.groupby('Candidate', sort=False):
+        print('{0}: passes at {1} of {2} grid points'.format(name, int(rows['Pass'].sum()), len(rows)))
+    print('Sweep of {0} designs saved to {1}'.format(len(candidates), output))
+
+
+if __name__ == '__main__':
+    main()
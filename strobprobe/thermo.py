@@ -0,0 +1,220 @@
+# Nearest-Neighbor Thermodynamics of DNA duplexes
+# Equations and Values taken from SantaLucia&Hicks2004
+# Sequences are encoded as small-integer arrays (a=0, c=1, g=2, t=3, anything else=4) so that
+# a whole batch of duplexes is scored with one table lookup + sum instead of a Python loop per strand
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from strobprobe.strand import STRAND
+
+BASES = 'acgt'
+UNKNOWN = 4
+
+# Initial Energy of every duplex
+INIT_H = 0.2    # enthalpy (h) in kcal/mol
+INIT_S = -5.7    # entropy (s) in eu (cal/Kmol)
+INIT_G = 1.96    # Gibbs Free Energy (g) in kcal/mol
+# Terminal AT penalty - applied for each end of the duplex
+TERMINAL_AT_H = 2.2
+TERMINAL_AT_S = 6.9
+TERMINAL_AT_G = 0.05
+
+# Dinucleotide (nearest neighbor) parameters for Watson-Crick base pairs in 1M NaCl
+# h in kcal/mol - s in eu (cal/Kmol) - g in kcal/mol
+NN_PARAMETERS = {
+    'aa': (-7.6, -21.3, -1.00), 'tt': (-7.6, -21.3, -1.00),
+    'at': (-7.2, -20.4, -0.88),
+    'ta': (-7.2, -21.3, -0.58),
+    'ca': (-8.5, -22.7, -1.45), 'tg': (-8.5, -22.7, -1.45),
+    'gt': (-8.4, -22.4, -1.44), 'ac': (-8.4, -22.4, -1.44),
+    'ct': (-7.8, -21.0, -1.28), 'ag': (-7.8, -21.0, -1.28),
+    'ga': (-8.2, -22.2, -1.30), 'tc': (-8.2, -22.2, -1.30),
+    'cg': (-10.6, -27.2, -2.17),
+    'gc': (-9.8, -24.4, -2.24),
+    'gg': (-8.0, -19.9, -1.84), 'cc': (-8.0, -19.9, -1.84),
+}
+
+# Byte -> base code lookup (only lowercase bases are scored, as in the original STRAND_THERMO)
+BASE_CODE = np.full(256, UNKNOWN, dtype=np.int8)
+for code, base in enumerate(BASES):
+    BASE_CODE[ord(base)] = code
+
+# NN tables indexed by 5*first_base + second_base - pairs with an unknown base add nothing
+NN_H = np.zeros(25)
+NN_S = np.zeros(25)
+NN_G = np.zeros(25)
+for coup, (h, s, g) in NN_PARAMETERS.items():
+    index = 5*BASES.index(coup[0]) + BASES.index(coup[1])
+    NN_H[index], NN_S[index], NN_G[index] = h, s, g
+# Terminal AT penalty lookup by base code
+TERMINAL_AT = np.array([True, False, False, True, False])
+
+# NN thermodynamics calls (STRAND_THERMO_BATCH & THERMO_INDEX.THERMO) & duplexes scored in this process - read by
+# the per-stage metrics of strobprobe/profiling.py
+NN_CALLS = {'calls': 0, 'duplexes': 0}
+
+
+# Encode one sequence as an array of base codes - a STRAND already holds them
+def ENCODE(SEQUENCE):
+    if isinstance(SEQUENCE, STRAND):
+        return SEQUENCE.THERMO_CODES()
+    return BASE_CODE[np.frombuffer(str(SEQUENCE).encode('ascii'), dtype=np.uint8)]
+
+
+# Encode a batch of sequences as a padded (n, max_length) array of base codes + the length of each sequence
+def ENCODE_BATCH(SEQUENCES):
+    sequences = [str(sequence) for sequence in SEQUENCES]
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    codes = np.full((len(sequences), max(lengths, default=0)), UNKNOWN, dtype=np.int8)
+    for row, sequence in enumerate(sequences):
+        codes[row, :len(sequence)] = ENCODE(sequence)
+    return codes, lengths
+
+
+# Calculate the DH, DS, & DG values for a whole batch of strand couples in one vectorized pass
+# Same rules as STRAND_THERMO: the terminal AT penalties are taken from the ends of STRAND1 and the
+# nearest neighbors from the first len(STRAND1) bases of STRAND2
+# Returns arrays of h (kcal/mol), s (kcal/Kmol) & g (kcal/mol)
+def STRAND_THERMO_BATCH(STRANDS1, STRANDS2):
+    codes1, lengths1 = ENCODE_BATCH(STRANDS1)
+    codes2, lengths2 = ENCODE_BATCH(STRANDS2)
+    if len(lengths1) != len(lengths2):
+        raise ValueError('STRANDS1 & STRANDS2 need the same number of strands')
+    if len(lengths1) == 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    if np.any(lengths1 == 0):
+        raise ValueError('Strands can not be empty')
+    NN_CALLS['calls'] += 1
+    NN_CALLS['duplexes'] += len(lengths1)
+    rows = np.arange(len(lengths1))
+
+    # Terminal AT penalties from both ends of STRAND1
+    terminal = TERMINAL_AT[codes1[:, 0]].astype(np.int64) + TERMINAL_AT[codes1[rows, lengths1-1]]
+
+    # Nearest neighbors of STRAND2 - only the first len(STRAND1)-1 couples are counted
+    width = max(codes2.shape[1], int(lengths1.max()))
+    padded = np.full((len(rows), width+1), UNKNOWN, dtype=np.int8)
+    padded[:, :codes2.shape[1]] = codes2
+    coup = 5*padded[:, :-2].astype(np.int64) + padded[:, 1:-1]
+    coup[np.arange(width-1)[None, :] >= (lengths1-1)[:, None]] = 5*UNKNOWN + UNKNOWN
+
+    h = INIT_H + TERMINAL_AT_H*terminal + NN_H[coup].sum(axis=1)
+    s = INIT_S + TERMINAL_AT_S*terminal + NN_S[coup].sum(axis=1)
+    g = INIT_G + TERMINAL_AT_G*terminal + NN_G[coup].sum(axis=1)
+    s = s/1000   # Convert Entropy to (kcal/Kmol)
+    return h, s, g
+
+
+# Calculate the DH, DS, & DG values for a given strand couple
+# Based on the thermodynamic nearest neighbor parameters for Watson-Crick base pairs in 1M NaCl
+def STRAND_THERMO(STRAND1, STRAND2, H, S, G):
+    h, s, g = STRAND_THERMO_BATCH([STRAND1], [STRAND2])
+    thermo_list = namedtuple("thermo_list", [H, S, G])
+    return thermo_list(float(h[0]), float(s[0]), float(g[0]))
+
+
+###### Corrections - Equations and Values taken from SantaLucia&Hicks2004 ######
+# Change in Gibbs Free Energy as a Function of Temperature
+def GIBBS_CALC(T, H, S):
+    return H-(T+273.15)*S    # H & S are in kcal ; Convert temp to Kelvin
+
+
+# Fixing the calculated Gibbs Free Energy to account for the length of the sequence and the salt
+def GIBBS_FIXER(LENGTH, SALT_CORR):
+    return 0.114*(LENGTH/2)*math.log(SALT_CORR)
+
+
+# Melting Temperature (K) of a given pair of strands - converts the H to cal/mol and the S to cal/mol
+def MELT_TEMP(H, S, SALT_CORR):
+    return (H*1000)/((S*1000)+(-0.0108)+(0.00199*math.log(0.25e-9)))+16.6*math.log(SALT_CORR)
+
+
+###### Array forms of the corrections - H, S & LENGTH can be arrays of any shape ######
+# Change in Gibbs Free Energy as a Function of Temperature
+def GIBBS_CALC_ARRAY(T, H, S):
+    return np.asarray(H) - (np.asarray(T)+273.15)*np.asarray(S)    # H & S are in kcal ; Convert temp to Kelvin
+
+
+# Fixing the calculated Gibbs Free Energy to account for the length of the sequence and the salt
+def GIBBS_FIXER_ARRAY(LENGTH, SALT_CORR):
+    return 0.114*(np.asarray(LENGTH)/2)*np.log(SALT_CORR)
+
+
+# Melting Temperature (K) of a given pair of strands - converts the H to cal/mol and the S to cal/mol
+def MELT_TEMP_ARRAY(H, S, SALT_CORR):
+    return (np.asarray(H)*1000)/((np.asarray(S)*1000)+(-0.0108)+(0.00199*math.log(0.25e-9)))+16.6*np.log(SALT_CORR)
+
+
+# Temp & Salt corrected Gibbs Free Energy for a batch of duplexes of the given lengths
+def CORRECTED_GIBBS_ARRAY(T, H, S, LENGTH, SALT_CORR):
+    return GIBBS_CALC_ARRAY(T, H, S) - GIBBS_FIXER_ARRAY(LENGTH, SALT_CORR)
+
+
+###### Cumulative (prefix-sum) index for O(1) substring thermodynamics ######
+# Every duplex of the design is a strand against its own reverse complement (T-PH1, PH2-P1, F2-PH3)
+# Nearest neighbor energies are additive & the NN table is symmetric under reverse complement, so the
+# DH, DS & DG of any substring duplex come from a difference of two cumulative sums + the terminal corrections
+# Sums are kept as integers in 1/100 units so they stay exact along long sequences
+NN_H_INT = np.rint(NN_H*100).astype(np.int64)
+NN_S_INT = np.rint(NN_S*100).astype(np.int64)
+NN_G_INT = np.rint(NN_G*100).astype(np.int64)
+
+
+class THERMO_INDEX:
+    # Cumulative nearest-neighbor sums over one sequence - CUM[k] holds the sum of the couples starting before k
+    def __init__(self, SEQUENCE=''):
+        codes = ENCODE(SEQUENCE)
+        self.length = len(codes)
+        self.codes = np.full(max(16, 2*self.length), UNKNOWN, dtype=np.int8)
+        self.codes[:self.length] = codes
+        self.cum = np.zeros((len(self.codes), 3), dtype=np.int64)
+        if self.length > 1:
+            coup = 5*codes[:-1].astype(np.int64) + codes[1:]
+            couples = np.stack([NN_H_INT[coup], NN_S_INT[coup], NN_G_INT[coup]], axis=1)
+            self.cum[1:self.length] = np.cumsum(couples, axis=0)
+
+    def __len__(self):
+        return self.length
+
+    # Extend the indexed sequence at its 3' end - each added base costs O(1)
+    def APPEND(self, BASES):
+        for code in ENCODE(BASES):
+            if self.length == len(self.codes):
+                self.codes = np.concatenate([self.codes, np.full(self.length, UNKNOWN, dtype=np.int8)])
+                self.cum = np.concatenate([self.cum, np.zeros((self.length, 3), dtype=np.int64)])
+            if self.length > 0:
+                coup = 5*int(self.codes[self.length-1]) + int(code)
+                self.cum[self.length] = self.cum[self.length-1] + (NN_H_INT[coup], NN_S_INT[coup], NN_G_INT[coup])
+            self.codes[self.length] = code
+            self.length += 1
+
+    # Drop everything after the first LENGTH bases - undoes APPEND in O(1) (the cumulative sums before LENGTH are unchanged)
+    def TRUNCATE(self, LENGTH):
+        self.length = max(0, min(int(LENGTH), self.length))
+
+    # Nearest neighbor sums (h, s, g in 1/100 units) of the couples inside sequence[START:STOP]
+    def PAIRS(self, START, STOP):
+        start = np.asarray(START)
+        last = np.maximum(np.asarray(STOP)-1, start)
+        return (self.cum[last]-self.cum[start]).T
+
+    # DH (kcal/mol), DS (kcal/Kmol) & DG (kcal/mol) of sequence[START:STOP] hybridized with its reverse complement
+    # Equal to STRAND_THERMO(reverse_complement(strand), strand) - START & STOP can be arrays to score many substrings at once
+    def THERMO(self, START, STOP):
+        start = np.asarray(START)
+        stop = np.asarray(STOP)
+        if np.any(stop <= start) or np.any(start < 0) or np.any(stop > self.length):
+            raise ValueError('Substring [{0}:{1}] outside of the indexed sequence of length {2}'.format(START, STOP, self.length))
+        NN_CALLS['calls'] += 1
+        NN_CALLS['duplexes'] += max(start.size, stop.size)
+        terminal = TERMINAL_AT[self.codes[start]].astype(np.int64) + TERMINAL_AT[self.codes[stop-1]]
+        pairs_h, pairs_s, pairs_g = self.PAIRS(start, stop)
+        h = INIT_H + TERMINAL_AT_H*terminal + pairs_h/100
+        s = (INIT_S + TERMINAL_AT_S*terminal + pairs_s/100)/1000   # Convert Entropy to (kcal/Kmol)
+        g = INIT_G + TERMINAL_AT_G*terminal + pairs_g/100
+        if h.ndim == 0:
+            return float(h), float(s), float(g)
+        return h, s, g
@@ -0,0 +1,109 @@
+# Toe Hold 2 search - deterministic replacement of the random base-by-base Toe Hold 2 growth
+# TH2 grows at its 5' end (F2 = TH2 + F1), so PH3 = PH2 + TH2 complement grows at its 3' end & every added base is
+# one O(1) update of a THERMO_INDEX over PH3. Candidates are enumerated depth first & the index is truncated on the
+# way back up, so no strand is ever rebuilt
+#
+# A TH2 is valid when it is longer than TH2_MIN & DDG(FPH3 - TPH1) lies inside (DDG_MIN, DDG_MAX) while no shorter
+# TH2 on the same branch did - the same rule as the random generator, which kept the first length that passed &
+# gave up once the DDG was too negative
+# Branches are discarded on Nearest-Neighbor bounds alone: each further base changes the DDG by at least the
+# smallest & at most the largest NN step at the temperature (+ the change of the terminal AT penalty), so a branch
+# is dropped as soon as none of its remaining lengths can land inside the window - no seqfold call is made here
+# The order the 4 bases are tried in at each branch comes from a seeded RNG - same seed, same Toe Hold 2s
+
+import math
+import random
+from collections import namedtuple
+
+import numpy as np
+
+from strobprobe.thermo import (NN_H, NN_S, TERMINAL_AT, TERMINAL_AT_H, TERMINAL_AT_S, UNKNOWN,
+                               THERMO_INDEX)
+
+COMPLEMENT = {'a': 't', 'c': 'g', 'g': 'c', 't': 'a'}
+TH2_BASES = 'tgca'
+
+# One valid Toe Hold 2 with the Fuel 2 - Place Holder 3 thermodynamics
+# h (kcal/mol), s (kcal/Kmol), g (kcal/mol), gcorr: temp & salt corrected g, ddg: gcorr - Gcorr_TPH1
+TOE_HOLD = namedtuple('TOE_HOLD', ['th2', 'h', 's', 'g', 'gcorr', 'ddg'])
+# toe_holds: valid Toe Hold 2s in the order found - candidates: number of TH2s scored - complete: the whole space was searched
+# outcomes: what became of the scored candidates - valid, extended (one base longer), too_negative (DDG below the window,
+# the branch is given up as the random generator did), too_long (TH2_MAX reached) & out_of_reach (NN bounds)
+TH2_OUTCOMES = ('valid', 'extended', 'too_negative', 'too_long', 'out_of_reach')
+TH2_RESULT = namedtuple('TH2_RESULT', ['toe_holds', 'candidates', 'complete', 'outcomes'], defaults=[None])
+
+
+# Smallest & largest change of the NN Gibbs Free Energy at TEMPERATURE (C) for one added base after each base code
+# (row 4 is an unknown base, which pairs with nothing) + the Gibbs Free Energy of one terminal AT penalty
+def NN_STEP_BOUNDS(TEMPERATURE):
+    kelvin = TEMPERATURE+273.15
+    steps = (NN_H - kelvin*NN_S/1000).reshape(5, 5)[:, :4]
+    steps[UNKNOWN] = 0
+    return steps.min(axis=1), steps.max(axis=1), TERMINAL_AT_H - kelvin*TERMINAL_AT_S/1000
+
+
+# Search for up to COUNT Toe Hold 2s of TH2_MIN+1 to TH2_MAX bases for Place Holder 2 (PH2)
+# Gcorr_FPH3 is corrected with GIBBS_FIXER(PHOSPHATES) as in the design script
+# MAX_CANDIDATES bounds the run time - the result says whether the search space was exhausted
+def TH2_SEARCH(PH2, TH2_MIN, TH2_MAX, TEMPERATURE, SALT_CORR, GCORR_TPH1, DDG_MIN, DDG_MAX, PHOSPHATES,
+               SEED=0, COUNT=1, MAX_CANDIDATES=200000):
+    rng = random.Random(SEED)
+    index = THERMO_INDEX(PH2.lower())
+    root = len(index)
+    fixer = 0.114*(PHOSPHATES/2)*math.log(SALT_CORR)
+    step_min, step_max, terminal = NN_STEP_BOUNDS(TEMPERATURE)
+    found = []
+    candidates = 0
+    complete = True
+    outcomes = dict.fromkeys(TH2_OUTCOMES, 0)
+
+    # Temp & salt corrected Fuel 2 - Place Holder 3 values of the indexed PH3
+    def SCORE():
+        h, s, g = index.THERMO(0, len(index))
+        gcorr = (h-(TEMPERATURE+273.15)*s) - fixer
+        return h, s, g, gcorr, gcorr - GCORR_TPH1
+
+    # Can any of the lengths still to come on this branch land inside the DDG window?
+    def REACHABLE(ddg, length):
+        steps = np.arange(max(1, TH2_MIN+1-length), TH2_MAX-length+1)
+        if len(steps) == 0:
+            return False
+        last = int(index.codes[len(index)-1])
+        end_at = int(TERMINAL_AT[last])
+        term_low, term_high = sorted((-end_at*terminal, (1-end_at)*terminal))
+        term_low, term_high = min(term_low, 0), max(term_high, 0)
+        low = ddg + step_min[last] + (steps-1)*step_min[:4].min() + term_low
+        high = ddg + step_max[last] + (steps-1)*step_max[:4].max() + term_high
+        return bool(np.any((low < DDG_MAX+1e-9) & (high > DDG_MIN-1e-9)))
+
+    def VISIT(th2):
+        nonlocal candidates, complete
+        for base in rng.sample(TH2_BASES, len(TH2_BASES)):
+            if len(found) >= COUNT:
+                return
+            if candidates >= MAX_CANDIDATES:
+                complete = False
+                return
+            candidates += 1
+            candidate = base + th2
+            index.APPEND(COMPLEMENT[base])
+            h, s, g, gcorr, ddg = SCORE()
+            if len(candidate) > TH2_MIN and DDG_MIN < ddg < DDG_MAX:
+                outcomes['valid'] += 1
+                found.append(TOE_HOLD(candidate, h, s, g, gcorr, ddg))
+            elif len(candidate) >= TH2_MAX:
+                outcomes['too_long'] += 1
+            elif len(candidate) > TH2_MIN and ddg < DDG_MIN:
+                outcomes['too_negative'] += 1
+            elif REACHABLE(ddg, len(candidate)):
+                outcomes['extended'] += 1
+                VISIT(candidate)
+            else:
+                outcomes['out_of_reach'] += 1
+            index.TRUNCATE(root + len(th2))
+
+    if TH2_MAX > TH2_MIN:
+        VISIT('')
+    if len(found) >= COUNT:
+        complete = False
+    return TH2_RESULT(found, candidates, complete, outcomes)
@@ -0,0 +1,6 @@
+# The tests import strobprobe from this checkout - no install needed
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
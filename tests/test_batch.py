@@ -0,0 +1,103 @@
+# Resumed Batch Design Mode (strobprobe/batch.py & journal.py) - a target that errored or was interrupted after some of
+# its stages is designed again by the next run into the same folder & the finished targets are not - an empty targets
+# file still gets a summary & the Toe Hold 2 seed of a target does not depend on its row
+
+import json
+import os
+
+import pandas as pd
+
+import strobprobe.batch as batch
+from strobprobe.batch import RUN_BATCH, SUMMARY_COLUMNS, TARGET_SEED
+from strobprobe.journal import RUN_JOURNAL
+
+TARGET = 'ggtggtgtagggattatagagtcgctttc'
+NAMES = ['FIRST', 'SECOND']
+
+
+# Targets.csv of the batch - every target has the Target of Sensor_Parameters.csv
+def WRITE_TARGETS(PATH):
+    with open(PATH, 'w') as targets:
+        targets.write('Target_Name,Target\n')
+        for name in NAMES:
+            targets.write('{0},{1}\n'.format(name, TARGET))
+
+
+def RUN(TMP_PATH):
+    summary = RUN_BATCH(str(TMP_PATH/'Targets.csv'), 'Sensor_Parameters.csv', str(TMP_PATH/'out'), WORKERS=1)
+    return {row['Target_Name']: row for row in summary.to_dict('records')}
+
+
+def METRICS(TMP_PATH, NAME):
+    with open(os.path.join(str(TMP_PATH/'out'), NAME, 'ProbeDesign_{0}_Metrics.json'.format(NAME))) as metrics:
+        return json.load(metrics)
+
+
+# DESIGN_SENSOR of the workers stops with an OSError for SECOND (after its AFTER stage passed when AFTER is given)
+def FAIL_SECOND(monkeypatch, AFTER=None):
+    design_sensor = batch.DESIGN_SENSOR
+
+    def DESIGN_SENSOR(PARAMETERS, *ARGUMENTS, ON_STAGE=None, **KEYWORDS):
+        if PARAMETERS.target_name != 'SECOND':
+            return design_sensor(PARAMETERS, *ARGUMENTS, ON_STAGE=ON_STAGE, **KEYWORDS)
+        if AFTER is None:
+            raise OSError('disk full')
+
+        def STOP_AFTER(NAME, RESULT, STAGE_METRICS, KEY):
+            ON_STAGE(NAME, RESULT, STAGE_METRICS, KEY)
+            if NAME == AFTER:
+                raise OSError('worker stopped after {0}'.format(NAME))
+        return design_sensor(PARAMETERS, *ARGUMENTS, ON_STAGE=STOP_AFTER, **KEYWORDS)
+    monkeypatch.setattr(batch, 'DESIGN_SENSOR', DESIGN_SENSOR)
+
+
+def test_errored_target_is_designed_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'DEFAULT_FOLD_CACHE_FILE', str(tmp_path/'folds.sqlite'))
+    WRITE_TARGETS(str(tmp_path/'Targets.csv'))
+    with monkeypatch.context() as patch:
+        FAIL_SECOND(patch)
+        first = RUN(tmp_path)
+    assert first['FIRST']['Status'] == 'Designed'
+    assert first['SECOND']['Status'] == 'Error' and first['SECOND']['Error'] == 'OSError: disk full'
+    assert set(RUN_JOURNAL(str(tmp_path/'out'/'ProbeDesign_Journal.jsonl')).FINISHED()) == {'FIRST'}
+    report = (tmp_path/'out'/'FIRST'/'ProbeDesign_FIRST.txt').stat().st_mtime_ns
+    # the resumed run designs SECOND only
+    second = RUN(tmp_path)
+    assert second['SECOND']['Status'] == 'Designed'
+    assert second['FIRST'] == first['FIRST']
+    assert (tmp_path/'out'/'FIRST'/'ProbeDesign_FIRST.txt').stat().st_mtime_ns == report
+    assert set(RUN_JOURNAL(str(tmp_path/'out'/'ProbeDesign_Journal.jsonl')).FINISHED()) == set(NAMES)
+
+
+def test_interrupted_target_resumes_at_its_last_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'DEFAULT_FOLD_CACHE_FILE', str(tmp_path/'folds.sqlite'))
+    WRITE_TARGETS(str(tmp_path/'Targets.csv'))
+    with monkeypatch.context() as patch:
+        FAIL_SECOND(patch, AFTER='fuel')
+        first = RUN(tmp_path)
+    assert first['SECOND']['Status'] == 'Error'
+    stages = [record['stage'] for record in RUN_JOURNAL(str(tmp_path/'out'/'SECOND'/'ProbeDesign_SECOND_Journal.jsonl')).READ()
+              if record['record'] == 'stage']
+    assert stages == ['place_holder', 'probe', 'fuel']
+    second = RUN(tmp_path)
+    assert second['SECOND']['Status'] == 'Designed'
+    # the stages journaled before the interruption are reused, the probe hairpin is designed
+    metrics = METRICS(tmp_path, 'SECOND')['stages']
+    assert all(metrics[stage].get('resumed') for stage in stages)
+    assert not metrics['probe_hairpin'].get('resumed')
+    assert {field: second['SECOND'][field] for field in ('TH1', 'TH2', 'PH_final', 'FUEL_final', 'PROBE_final')} == \
+        {field: second['FIRST'][field] for field in ('TH1', 'TH2', 'PH_final', 'FUEL_final', 'PROBE_final')}
+
+
+def test_empty_target_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'DEFAULT_FOLD_CACHE_FILE', str(tmp_path/'folds.sqlite'))
+    (tmp_path/'Targets.csv').write_text('Target_Name,Target\n')
+    batch.main([str(tmp_path/'Targets.csv'), '--out', str(tmp_path/'out'), '--workers', '1'])
+    summary = pd.read_csv(str(tmp_path/'out'/'ProbeDesign_Summary.csv'))
+    assert len(summary) == 0 and list(summary.columns) == SUMMARY_COLUMNS
+
+
+def test_target_seed_follows_the_name():
+    assert TARGET_SEED(None, 'FIRST') is None
+    assert TARGET_SEED(3, 'FIRST') == TARGET_SEED(3, 'FIRST')
+    assert len({TARGET_SEED(3, 'FIRST'), TARGET_SEED(3, 'SECOND'), TARGET_SEED(4, 'FIRST')}) == 3
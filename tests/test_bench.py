@@ -0,0 +1,91 @@
+# Benchmark suite (strobprobe/bench.py) - the seeded corpus is the same for the same seed & every target passes the place
+# holder check of its length, the corpus digest follows the corpus & parameters, the end-to-end rates only count the
+# designed targets, and COMPARE_BENCHMARKS flags regressions & changed designs
+
+from collections import OrderedDict
+
+import pytest
+
+import strobprobe.bench as bench
+from strobprobe.bench import BENCH_CORPUS, COMPARE_BENCHMARKS, CORPUS_DIGEST, END_TO_END, TARGET_GIBBS
+from strobprobe.design import DESIGN_SETTINGS, READ_PARAMETERS
+
+
+@pytest.fixture(scope='module')
+def parameters():
+    return READ_PARAMETERS('Sensor_Parameters.csv')
+
+
+def test_corpus_targets_pass_the_place_holder_check(parameters):
+    corpus = BENCH_CORPUS(parameters, (20, 40, 100), PER_LENGTH=2, SEED=3)
+    assert [target.name for target in corpus] == ['TEST', 'SYN20_1', 'SYN20_2', 'SYN40_1', 'SYN40_2', 'SYN100_1', 'SYN100_2']
+    assert corpus[0].target == parameters.target
+    for target in corpus:
+        assert target.gibbs_pht_max <= TARGET_GIBBS(target.target, parameters.temperature, parameters.salt_correction) <= target.gibbs_pht_min
+    assert corpus[5].gibbs_pht_max == pytest.approx(parameters.gibbs_pht_max*100/len(parameters.target))
+    assert BENCH_CORPUS(parameters, (20, 40, 100), PER_LENGTH=2, SEED=3) == corpus
+    assert BENCH_CORPUS(parameters, (20, 40, 100), PER_LENGTH=2, SEED=4) != corpus
+
+
+def test_corpus_digest(parameters):
+    corpus = BENCH_CORPUS(parameters, (20, 30), PER_LENGTH=1)
+    digest = CORPUS_DIGEST(corpus, parameters)
+    assert CORPUS_DIGEST(BENCH_CORPUS(parameters, (20, 30), PER_LENGTH=1), parameters) == digest
+    assert CORPUS_DIGEST(BENCH_CORPUS(parameters, (20, 30), PER_LENGTH=1, SEED=8), parameters) != digest
+    assert CORPUS_DIGEST(corpus[:-1], parameters) != digest
+    assert CORPUS_DIGEST(corpus, parameters._replace(temperature=25.0)) != digest
+    # the name & Target of the --params file are in the corpus, not in the parameters part
+    assert CORPUS_DIGEST(corpus, parameters._replace(target_name='OTHER')) == digest
+
+
+def test_rates_count_the_designed_targets_only(parameters, monkeypatch):
+    outcomes = {'TEST': ('designed', 2.0, 40), 'SYN20_1': ('failed', 0.0, 0), 'SYN30_1': ('designed', 6.0, 20)}
+
+    def BENCH_DESIGN(PARAMETERS, SETTINGS):
+        status, wall_time, folds = outcomes[PARAMETERS.target_name]
+        return OrderedDict(target_name=PARAMETERS.target_name, status=status, wall_time=wall_time, folds=folds, fold_requests=folds,
+                           nn_duplexes=1), None
+    monkeypatch.setattr(bench, 'BENCH_DESIGN', BENCH_DESIGN)
+    result = END_TO_END(parameters, DESIGN_SETTINGS(), BENCH_CORPUS(parameters, (20, 30), PER_LENGTH=1))
+    assert (result['targets'], result['designed'], result['failed']) == (3, 2, 1)
+    assert result['designs_per_s'] == pytest.approx(2/8.0)
+    assert result['folds_per_s'] == pytest.approx(60/8.0)
+
+
+# Smallest run result COMPARE_BENCHMARKS reads
+def RUN(DESIGNED=10, DESIGNS_PER_S=1.0, FOLDS=100, MICRO=None, OUTCOMES=None):
+    return {'end_to_end': {'designed': DESIGNED, 'designs_per_s': DESIGNS_PER_S, 'folds_per_s': 50.0, 'folds': FOLDS,
+                           'peak_traced_mb': 10.0, 'peak_rss_mb': None,
+                           'per_target': [{'target_name': name, 'status': status, 'design': design}
+                                          for name, (status, design) in (OUTCOMES or {}).items()]},
+            'micro': {name: {'per_second': rate} for name, rate in (MICRO or {}).items()}}
+
+
+def ROWS(CURRENT, BASELINE, THRESHOLD=0.1):
+    rows, changed = COMPARE_BENCHMARKS(CURRENT, BASELINE, THRESHOLD)
+    return {row[0]: row for row in rows}, changed
+
+
+def test_compare_flags_regressions():
+    rows, changed = ROWS(RUN(), RUN())
+    assert not any(row[4] for row in rows.values()) and changed == []
+    # a rate 20% lower & a fold count 20% higher are regressions, 5% lower is not
+    rows, _ = ROWS(RUN(DESIGNS_PER_S=0.8, FOLDS=120), RUN())
+    assert rows['designs_per_s'][3] == pytest.approx(-0.2) and rows['designs_per_s'][4]
+    assert rows['folds'][4]
+    assert not ROWS(RUN(DESIGNS_PER_S=0.95), RUN())[0]['designs_per_s'][4]
+    # faster is never a regression
+    assert not ROWS(RUN(DESIGNS_PER_S=2.0, FOLDS=50), RUN())[0]['designs_per_s'][4]
+    # one target less designed is a regression whatever the threshold
+    assert ROWS(RUN(DESIGNED=9), RUN(), THRESHOLD=0.5)[0]['designed'][4]
+    # a value missing on either side is listed without a change
+    assert rows['peak_rss_mb'][3:] == (None, False)
+
+
+def test_compare_micro_and_changed_designs():
+    current = RUN(MICRO={'nn_thermo': 50.0, 'new_kernel': 1.0}, OUTCOMES={'A': ('designed', 'x'), 'B': ('failed', None), 'C': ('designed', 'z')})
+    baseline = RUN(MICRO={'nn_thermo': 100.0}, OUTCOMES={'A': ('designed', 'x'), 'B': ('designed', 'y')})
+    rows, changed = ROWS(current, baseline)
+    assert rows['nn_thermo'][3] == pytest.approx(-0.5) and rows['nn_thermo'][4]
+    assert 'new_kernel' not in rows
+    assert changed == [('B', 'designed', 'failed')]
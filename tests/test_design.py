@@ -0,0 +1,44 @@
+# Design engine API (strobprobe/design.py) - DESIGN_SENSOR on Sensor_Parameters.csv gives the strands of the script &
+# a failed checkpoint raises DESIGN_ERROR carrying its stage, report, record & metrics
+
+import pytest
+from Bio.Seq import Seq
+
+from strobprobe.design import DESIGN_ERROR, DESIGN_SENSOR, DESIGN_SETTINGS, READ_PARAMETERS
+
+# Toe Hold 1 & the Place Holder of the original script - its Toe Hold 2 growth was random, so the strands built on
+# Toe Hold 2 are the ones of the seeded search (th2_seed 0)
+BASELINE = {'th1': 'gaaag', 'th2': 'caccaa', 'ph_final': 'gaaagcgactctataatccctacaccaccttggtg',
+            'fuel_final': 'caccaaggtggtgtagggattatagagtcgtttttcga', 'probe_final': 'aaaaacgactcaccaaggtggtgtagggattatagagtcg'}
+
+
+def test_design_sensor_gives_the_baseline_strands():
+    parameters = READ_PARAMETERS('Sensor_Parameters.csv')
+    design = DESIGN_SENSOR(parameters)
+    assert {field: getattr(design, field) for field in BASELINE} == BASELINE
+    # the strands are built as in the script - PH_final is the complement of TH2 + Target & the fuel starts with TH2 + F1
+    assert design.ph_final == str(Seq(design.th2 + parameters.target).reverse_complement())
+    assert design.fuel_final.startswith(design.th2 + parameters.target[:-len(design.th1)] + parameters.fuel_loop)
+    assert design.probe_final.startswith(parameters.probe_spacer)
+    assert design.record.status == 'designed' and design.metrics['status'] == 'designed'
+    assert 'FINAL SEQUENCES' in design.report
+    # the same parameters as a dict & as a file path design the same strands
+    assert DESIGN_SENSOR(parameters._asdict()).probe_final == design.probe_final
+    assert DESIGN_SENSOR('Sensor_Parameters.csv', DESIGN_SETTINGS()).fuel_final == design.fuel_final
+
+
+@pytest.mark.parametrize('change, stage', [({'target': 'ggtggtgtag'}, 'place_holder'), ({'ddg_pht_pph': 100}, 'probe'),
+                                           ({'ddg_fph_tph_min': -100, 'ddg_fph_tph_max': -99}, 'fuel')])
+def test_failed_target_raises_design_error(change, stage):
+    parameters = READ_PARAMETERS('Sensor_Parameters.csv')._replace(**change)
+    with pytest.raises(DESIGN_ERROR) as failed:
+        DESIGN_SENSOR(parameters)
+    error = failed.value
+    assert error.stage == stage
+    message = str(error).strip().splitlines()[0].strip()
+    assert message.startswith('ERROR')
+    assert message in error.report
+    assert error.record.status == 'failed' and error.record.failed_stage == stage and error.record.error == message
+    assert error.record.target == parameters.target
+    assert error.metrics['status'] == 'failed' and error.metrics['failed_stage'] == stage
+    assert list(error.metrics['stages'])[-1] == stage
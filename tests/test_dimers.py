@@ -0,0 +1,78 @@
+# Batched dimer scoring (strobprobe/dimers.py) against a scalar search of every complementary stretch of each pair
+
+import random
+
+import numpy as np
+import pytest
+
+from strobprobe.dimers import PAIR_DIMERS, STRAND_MATRIX
+from strobprobe.thermo import GIBBS_CALC, GIBBS_FIXER, MELT_TEMP, THERMO_INDEX
+
+TEMPERATURE = 25
+SALT_CORR = 0.1
+MIN_LENGTH = 4
+COMPLEMENT = {'a': 't', 'c': 'g', 'g': 'c', 't': 'a'}
+
+
+def REVERSE_COMPLEMENT(SEQUENCE):
+    return ''.join(COMPLEMENT.get(base, 'n') for base in SEQUENCE[::-1])
+
+
+# Best duplex of A & B one stretch at a time - every stretch of A (at least MIN_LENGTH bases) complementary to a
+# stretch of B, scored with THERMO_INDEX & the scalar corrections. (gcorr, tm, length) or None if nothing pairs
+def SCALAR_DIMER(A, B):
+    best = None
+    reverse = REVERSE_COMPLEMENT(B)
+    for start in range(len(A)):
+        for stop in range(start + MIN_LENGTH, len(A) + 1):
+            stretch = A[start:stop]
+            if 'n' in stretch or stretch not in reverse:
+                continue
+            h, s, g = THERMO_INDEX(stretch).THERMO(0, len(stretch))
+            gcorr = GIBBS_CALC(TEMPERATURE, h, s) - GIBBS_FIXER(len(stretch), SALT_CORR)
+            if best is None or gcorr < best[0]:
+                best = (gcorr, MELT_TEMP(h, s, SALT_CORR)-273.15, len(stretch))
+    return best
+
+
+def RANDOM_STRANDS(COUNT, SEED):
+    rng = random.Random(SEED)
+    strands = [''.join(rng.choice('acgt') for _ in range(rng.randint(4, 30))) for _ in range(COUNT)]
+    # strands with a planted complementary stretch & with unknown bases
+    strands[0] = strands[0] + 'ggatcgatcc'
+    strands[1] = 'tt' + REVERSE_COMPLEMENT('ggatcgatcc') + strands[1]
+    strands[2] = strands[2][:3] + 'nn' + strands[2][3:]
+    return strands
+
+
+@pytest.mark.parametrize('block', [2048, 7])
+def test_pair_dimers_match_scalar_search(block):
+    strands_a = RANDOM_STRANDS(40, 1)
+    strands_b = RANDOM_STRANDS(40, 2)[1:] + ['ac']
+    pairs = PAIR_DIMERS(strands_a, strands_b, TEMPERATURE, SALT_CORR, MIN_LENGTH, BLOCK=block)
+    for index, (a, b) in enumerate(zip(strands_a, strands_b)):
+        expected = SCALAR_DIMER(a, b)
+        if expected is None:
+            assert pairs.length[index] == 0 and np.isnan(pairs.gcorr[index]) and np.isnan(pairs.tm[index])
+            continue
+        assert pairs.gcorr[index] == pytest.approx(expected[0], abs=1e-9)
+        assert pairs.tm[index] == pytest.approx(expected[1], abs=1e-9)
+        # the reported duplex is one of the best ones - its stretches pair & score the best gcorr
+        length, start_a, start_b = pairs.length[index], pairs.start_a[index], pairs.start_b[index]
+        assert a[start_a:start_a+length] == REVERSE_COMPLEMENT(b[start_b:start_b+length])
+        h, s, g = THERMO_INDEX(a[start_a:start_a+length]).THERMO(0, length)
+        assert GIBBS_CALC(TEMPERATURE, h, s) - GIBBS_FIXER(length, SALT_CORR) == pytest.approx(expected[0], abs=1e-9)
+
+
+def test_strand_matrix_is_symmetric():
+    strands = dict(zip('ABCDE', RANDOM_STRANDS(5, 3)))
+    matrix = STRAND_MATRIX(strands, TEMPERATURE, SALT_CORR, MIN_LENGTH)
+    assert np.array_equal(matrix.length, matrix.length.T)
+    assert np.array_equal(np.isnan(matrix.gcorr), np.isnan(matrix.gcorr.T))
+    for first, a in enumerate(strands.values()):
+        for second, b in enumerate(strands.values()):
+            expected = SCALAR_DIMER(a, b)
+            if expected is None:
+                assert matrix.length[first, second] == 0
+            else:
+                assert matrix.gcorr[first, second] == pytest.approx(expected[0], abs=1e-9)
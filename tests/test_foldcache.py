@@ -0,0 +1,102 @@
+# Fold cache (strobprobe/foldcache.py) - the on-disk row bound, FLUSH batching, the eviction of the least recently used
+# folds (memory hits count as uses) & the hits of a warm rerun
+
+import sqlite3
+
+import pytest
+from seqfold import dg
+
+import strobprobe.foldcache as foldcache
+from strobprobe.foldcache import FOLD_CACHE, HAIRPIN_SALT_CORR
+
+SEQUENCES = ['gcgcaattgcgc', 'ggatcctttggatcc', 'cccgggaaacccggg', 'atgcatgcatgcat', 'gggaaacccttt', 'ttttaaaattttaaaa',
+             'gcatcgatcgtacg', 'cgcgtttttcgcg', 'aggctttttagcct', 'tacgtacgtacg', 'gatcgatcaaagatc', 'ccattggccaatgg']
+TEMPERATURE = 25.0
+SALT_CORR = 0.1
+
+
+# Sequences in the on-disk table of FILE
+def ON_DISK(FILE):
+    db = sqlite3.connect(FILE)
+    try:
+        return {row[0] for row in db.execute('SELECT sequence FROM folds')}
+    finally:
+        db.close()
+
+
+def ROWS(FILE):
+    return len(ON_DISK(FILE))
+
+
+def test_dg_matches_seqfold(tmp_path):
+    cache = FOLD_CACHE(str(tmp_path/'folds.db'))
+    for sequence in SEQUENCES[:3]:
+        assert cache.DG(sequence, TEMPERATURE, SALT_CORR) == pytest.approx(dg(sequence, temp=TEMPERATURE) + HAIRPIN_SALT_CORR(SALT_CORR))
+    cache.CLOSE()
+
+
+def test_flush_writes_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(foldcache, 'FLUSH_EVERY', 4)
+    file = str(tmp_path/'folds.db')
+    cache = FOLD_CACHE(file)
+    for sequence in SEQUENCES[:3]:
+        cache.DG(sequence, TEMPERATURE, SALT_CORR)
+    # nothing is written before FLUSH_EVERY new folds
+    assert ROWS(file) == 0
+    cache.DG(SEQUENCES[3], TEMPERATURE, SALT_CORR)
+    assert ROWS(file) == 4 and not cache.pending
+    cache.DG(SEQUENCES[4], TEMPERATURE, SALT_CORR)
+    assert ROWS(file) == 4
+    cache.FLUSH()
+    assert ROWS(file) == 5
+    cache.CLOSE()
+
+
+def test_eviction_keeps_the_row_bound(tmp_path):
+    file = str(tmp_path/'folds.db')
+    cache = FOLD_CACHE(file, MAX_ENTRIES=5)
+    for sequence in SEQUENCES:
+        cache.DG(sequence, TEMPERATURE, SALT_CORR)
+    cache.FLUSH()
+    assert ROWS(file) == 5 and cache.rows == 5
+    # the folds used last are the ones kept
+    assert ON_DISK(file) == set(SEQUENCES[-5:])
+    cache.CLOSE()
+    # a larger file is cut to the bound when it is opened
+    cache = FOLD_CACHE(file, MAX_ENTRIES=2)
+    assert ROWS(file) == 2
+    cache.CLOSE()
+
+
+def test_memory_hits_keep_a_fold_on_disk(tmp_path, monkeypatch):
+    clock = iter(range(1, 1000))
+    monkeypatch.setattr(foldcache.time, 'time', lambda: float(next(clock)))
+    file = str(tmp_path/'folds.db')
+    cache = FOLD_CACHE(file, MAX_ENTRIES=3)
+    hot = SEQUENCES[0]
+    cache.DG(hot, TEMPERATURE, SALT_CORR)
+    # the hot fold is read from memory after every new fold - it is the most recently used one at every eviction
+    for sequence in SEQUENCES[1:]:
+        cache.DG(sequence, TEMPERATURE, SALT_CORR)
+        cache.FLUSH()
+        cache.DG(hot, TEMPERATURE, SALT_CORR)
+    cache.FLUSH()
+    assert cache.STATS()['memory_hits'] == len(SEQUENCES) - 1
+    assert ON_DISK(file) == {hot} | set(SEQUENCES[-2:])
+    cache.CLOSE()
+
+
+def test_warm_rerun_hits(tmp_path):
+    file = str(tmp_path/'folds.db')
+    cache = FOLD_CACHE(file)
+    values = [cache.DG(sequence, TEMPERATURE, SALT_CORR) for sequence in SEQUENCES]
+    assert cache.STATS()['misses'] == len(SEQUENCES)
+    assert [cache.DG(sequence, TEMPERATURE, SALT_CORR) for sequence in SEQUENCES] == values
+    assert cache.STATS()['memory_hits'] == len(SEQUENCES) and cache.STATS()['misses'] == len(SEQUENCES)
+    cache.CLOSE()
+    # a new process finds every fold on disk
+    cache = FOLD_CACHE(file)
+    assert [cache.DG(sequence, TEMPERATURE, SALT_CORR) for sequence in SEQUENCES] == values
+    stats = cache.STATS()
+    assert stats['disk_hits'] == len(SEQUENCES) and stats['misses'] == 0 and stats['hit_rate'] == 1
+    cache.CLOSE()
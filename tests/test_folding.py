@@ -0,0 +1,29 @@
+# NumPy folding backend (strobprobe/npfold.py) against seqfold.dg on the reference set of strobprobe/folding.py
+
+import pytest
+from seqfold import dg
+
+from strobprobe.folding import FOLD_TOLERANCE, NUMPY_BACKEND, REFERENCE_SEQUENCES, REFERENCE_TEMPERATURES, CHECK_BACKEND
+
+# Fewer random lengths than the command line check - the fixed structures & 4 strands of each of 4 lengths
+SEQUENCES = REFERENCE_SEQUENCES(COUNT=4)
+
+
+@pytest.mark.parametrize('temp', REFERENCE_TEMPERATURES)
+def test_numpy_dg_matches_seqfold(temp):
+    backend = NUMPY_BACKEND()
+    for sequence in SEQUENCES[:8]:
+        assert backend.DG(sequence, temp) == pytest.approx(dg(sequence, temp=temp), abs=FOLD_TOLERANCE), sequence
+
+
+def test_numpy_dg_batch_matches_seqfold():
+    check = CHECK_BACKEND(NUMPY_BACKEND(), SEQUENCES)
+    assert check.folds == len(SEQUENCES)*len(REFERENCE_TEMPERATURES)
+    assert check.differences == []
+    assert check.max_difference <= FOLD_TOLERANCE
+
+
+def test_numpy_dg_batch_matches_dg():
+    backend = NUMPY_BACKEND()
+    sequences = [sequence for sequence in SEQUENCES if len(sequence) == len(SEQUENCES[-1])]
+    assert backend.DG_BATCH(sequences, 37.0) == pytest.approx([backend.DG(sequence, 37.0) for sequence in sequences], abs=1e-9)
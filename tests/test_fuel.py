@@ -0,0 +1,58 @@
+# Fuel hairpin search (strobprobe/fuel.py) over the worker pool - the same design as one process, the pool idle once
+# FUEL_SEARCH returns & searches running at the same time on one pool do not stop each other
+
+import threading
+
+from strobprobe.foldcache import GET_FOLD_CACHE
+from strobprobe.fuel import FUEL_STOP_SLOTS, GET_FUEL_POOL, FUEL_SEARCH
+
+F1 = 'ggtggtgtagggattatagagtcg'
+FUEL_LOOP = 'ttttt'
+# With T_MAX = 52 C only the hairpin of the second candidate opens in time
+TH2S = ['gaccaa', 'caccaa', 'tttttt']
+ARGUMENTS = (F1, FUEL_LOOP, 3, 20.0, 0.15, 52, 0.1)
+WORKERS = 2
+
+
+# FUEL_HAIRPIN without the timings of its neck lengths & its fold count (the structures of a warm fold cache are not folded)
+def HAIRPIN(RESULT):
+    return RESULT.hairpin._replace(steps=[step[:3] for step in RESULT.hairpin.steps], folds=None)
+
+
+def SEARCH(FILE, COUNT=WORKERS):
+    return FUEL_SEARCH(TH2S, *ARGUMENTS, FOLDS=GET_FOLD_CACHE(FILE) if COUNT == 1 else None, WORKERS=COUNT, FOLD_CACHE_FILE=FILE)
+
+
+def test_pool_keeps_the_first_passing_candidate(tmp_path):
+    file = str(tmp_path/'folds.db')
+    single = SEARCH(file, 1)
+    assert single.index == 1 and single.hairpin.passed
+    assert [hairpin.passed for hairpin in single.hairpins] == [False, True]
+    GET_FOLD_CACHE(file).FLUSH()
+    pooled = SEARCH(file)
+    assert pooled.index == single.index
+    assert HAIRPIN(pooled) == HAIRPIN(single)
+    # the pool is idle again - no check left running & every STOP flag cleared & free
+    pool = GET_FUEL_POOL(WORKERS)
+    assert not pool.executor._pending_work_items
+    assert not any(pool.stops)
+    assert pool.slots.qsize() == FUEL_STOP_SLOTS
+
+
+def test_concurrent_searches_on_one_pool(tmp_path):
+    file = str(tmp_path/'folds.db')
+    expected = HAIRPIN(SEARCH(file, 1))
+    GET_FOLD_CACHE(file).FLUSH()
+    results = [None]*3
+
+    def RUN(index):
+        results[index] = SEARCH(file)
+
+    threads = [threading.Thread(target=RUN, args=(index,)) for index in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [result.index for result in results] == [1]*len(results)
+    assert all(HAIRPIN(result) == expected for result in results)
+    assert not GET_FUEL_POOL(WORKERS).executor._pending_work_items
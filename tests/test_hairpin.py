@@ -0,0 +1,49 @@
+# Fold-once hairpin engine (strobprobe/hairpin.py) against seqfold.dg over many temperatures
+
+import pytest
+from seqfold import dg
+
+from strobprobe.foldcache import FOLD_CACHE, HAIRPIN_SALT_CORR
+from strobprobe.hairpin import HAIRPIN_ENGINE, SEQFOLD_INTERNALS
+from strobprobe.melting import HAIRPIN_OPEN_TEMP
+
+SEQUENCES = ['gcgcaattttttgcgc', 'cgtagctaccgaaagctacg', 'atgcgtaagtttttcttacgcat', 'gcatcgatcgtacgaaaaacgtacgatcgatgc',
+             'ggatccaaaggatccaaaaggatccaaaggatcc']
+TEMPS = [20+2.5*step for step in range(31)]     # 20 - 95 C
+SALT_CORR = 0.1
+
+pytestmark = pytest.mark.skipif(not SEQFOLD_INTERNALS, reason='the engine needs the seqfold loop energy functions')
+
+
+@pytest.mark.parametrize('sequence', SEQUENCES)
+def test_dg_curve_matches_seqfold(sequence):
+    engine = HAIRPIN_ENGINE()
+    assert list(engine.DG_CURVE(sequence, TEMPS)) == pytest.approx([dg(sequence, temp=temp) for temp in TEMPS], abs=1e-9)
+    # a few folds for the whole curve
+    assert engine.folds < len(TEMPS)/4
+    corrected = engine.DG_CURVE(sequence, TEMPS[::5], SALT_CORR)
+    assert list(corrected) == pytest.approx([dg(sequence, temp=temp) + HAIRPIN_SALT_CORR(SALT_CORR) for temp in TEMPS[::5]], abs=1e-9)
+
+
+@pytest.mark.parametrize('sequence', SEQUENCES[:3])
+def test_open_temp_matches_bracketed_search(sequence):
+    opened = HAIRPIN_ENGINE().OPEN_TEMP(sequence, SALT_CORR, 25.0, 100, TOL=0.1)
+    bracketed = HAIRPIN_OPEN_TEMP(sequence, SALT_CORR, 25.0, 100, TOL=0.1)
+    assert opened.temp == pytest.approx(bracketed.temp, abs=1.0)
+    assert opened.folds <= bracketed.folds
+
+
+def test_structures_saved_in_the_fold_cache(tmp_path):
+    file = str(tmp_path/'folds.db')
+    store = FOLD_CACHE(file)
+    engine = HAIRPIN_ENGINE(STORE=store)
+    values = [list(engine.DG_CURVE(sequence, TEMPS)) for sequence in SEQUENCES]
+    assert engine.folds > 0
+    store.CLOSE()
+    # a new process takes the structures from disk & does not fold
+    store = FOLD_CACHE(file)
+    engine = HAIRPIN_ENGINE(STORE=store)
+    assert [list(engine.DG_CURVE(sequence, TEMPS)) for sequence in SEQUENCES] == values
+    assert engine.folds == 0
+    assert store.STATS()['structure_hits'] > 0
+    store.CLOSE()
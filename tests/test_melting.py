@@ -0,0 +1,41 @@
+# Bracketed hairpin opening temperature (strobprobe/melting.py) against a step scan upward in TOL steps, as the
+# original script walked the temperature
+
+import pytest
+from seqfold import dg
+
+from strobprobe.foldcache import HAIRPIN_SALT_CORR
+from strobprobe.melting import HAIRPIN_OPEN_TEMP
+
+SALT_CORR = 0.1
+T_START = 25.0
+T_MAX = 100
+TOL = 0.1
+
+
+# First temperature of the TOL grid where the corrected DG is no longer negative & the folds used to find it
+def STEP_SCAN(SEQUENCE):
+    folds = 0
+    temp = T_START
+    while temp <= T_MAX:
+        folds += 1
+        if dg(SEQUENCE, temp=temp) + HAIRPIN_SALT_CORR(SALT_CORR) >= 0:
+            return temp, folds
+        temp = round(temp + TOL, 6)
+    return None, folds
+
+
+@pytest.mark.parametrize('sequence', ['gcgcaattttttgcgc', 'cgtagctaccgaaagctacg', 'ggcccaaaaaaagggcc', 'atgcgtaagtttttcttacgcat'])
+def test_bracketed_open_temp_matches_step_scan(sequence):
+    opened = HAIRPIN_OPEN_TEMP(sequence, SALT_CORR, T_START, T_MAX, TOL=TOL)
+    temp, folds = STEP_SCAN(sequence)
+    assert opened.temp is not None
+    assert opened.temp == pytest.approx(temp, abs=TOL)
+    assert opened.bracket[1] - opened.bracket[0] <= TOL
+    assert opened.folds < folds
+
+
+def test_open_temp_above_t_max():
+    opened = HAIRPIN_OPEN_TEMP('ggcccaaaaaaagggcc', SALT_CORR, T_START, 60, TOL=TOL)
+    assert opened.temp is None
+    assert opened.bracket[1] == 60
@@ -0,0 +1,97 @@
+# Off-target k-mer index (strobprobe/offtarget.py) & its exact matches against a brute-force search of the background
+
+import random
+
+import pytest
+
+from strobprobe.offtarget import BUILD_INDEX, REVERSE_COMPLEMENT
+from strobprobe.thermo import ENCODE
+
+K = 8
+QUERY = 'acgtaccgttagcatgcaggtcaatcgtacgatgc'
+
+
+# Background of two records - the query with one changed base in its middle (two matches on one diagonal), a copy of
+# its first 15 bases, its reverse complement & a run of unknown bases
+def BACKGROUND():
+    rng = random.Random(3)
+    random_bases = lambda count: ''.join(rng.choice('acgt') for _ in range(count))
+    changed = QUERY[:17] + ('a' if QUERY[17] != 'a' else 'c') + QUERY[18:]
+    first = random_bases(150) + changed + random_bases(80) + QUERY[:15] + random_bases(60)
+    second = random_bases(40) + 'nnnnn' + random_bases(70) + REVERSE_COMPLEMENT(QUERY) + random_bases(90)
+    return [('first', first), ('second', second)]
+
+
+def WRITE_FASTA(PATH, RECORDS):
+    with open(PATH, 'w') as fasta:
+        for name, sequence in RECORDS:
+            fasta.write('>{0} test record\n'.format(name))
+            for start in range(0, len(sequence), 60):
+                fasta.write(sequence[start:start+60] + '\n')
+
+
+# Background as the index joins it - records with one unknown base in between
+def JOINED(RECORDS):
+    return 'n'.join(sequence for name, sequence in RECORDS)
+
+
+# Every run of at least K equal bases of QUERY & SEQUENCE on every diagonal - (query start, background start, length)
+def BRUTE_MATCHES(QUERY_, SEQUENCE):
+    matches = set()
+    for diagonal in range(-len(QUERY_), len(SEQUENCE)):
+        start = None
+        for offset in range(len(QUERY_) + 1):
+            position = diagonal + offset
+            equal = (offset < len(QUERY_) and 0 <= position < len(SEQUENCE) and QUERY_[offset] == SEQUENCE[position]
+                     and QUERY_[offset] in 'acgt')
+            if equal and start is None:
+                start = offset
+            elif not equal and start is not None:
+                if offset - start >= K:
+                    matches.add((start, diagonal + start, offset - start))
+                start = None
+    return matches
+
+
+@pytest.fixture
+def index(tmp_path):
+    fasta = str(tmp_path/'background.fa')
+    WRITE_FASTA(fasta, BACKGROUND())
+    return BUILD_INDEX(fasta, str(tmp_path/'index'), K=K)
+
+
+def test_index_positions_match_a_kmer_scan(index):
+    sequence = JOINED(BACKGROUND())
+    assert ''.join('acgtn'[code] for code in index.sequence) == sequence
+    kmers = {}
+    for position in range(len(sequence) - K + 1):
+        kmer = sequence[position:position+K]
+        if 'n' not in kmer:
+            kmers.setdefault(kmer, []).append(position)
+    assert index.offsets[-1] == sum(len(positions) for positions in kmers.values())
+    for kmer, positions in kmers.items():
+        code = int(''.join(str('acgt'.index(base)) for base in kmer), 4)
+        assert list(index.positions[index.offsets[code]:index.offsets[code+1]]) == positions
+
+
+@pytest.mark.parametrize('query', [QUERY, REVERSE_COMPLEMENT(QUERY), QUERY[5:30]])
+def test_matches_equal_brute_force(index, query):
+    matches = index.MATCHES(query)
+    assert len(matches) == len(set(matches))
+    assert set(matches) == BRUTE_MATCHES(query, JOINED(BACKGROUND()))
+
+
+def test_two_matches_on_one_diagonal(index):
+    start = index.records[0][1] + 150
+    on_diagonal = sorted(match for match in index.MATCHES(QUERY) if match[1] - match[0] == start)
+    assert on_diagonal == [(0, start, 17), (18, start + 18, len(QUERY) - 18)]
+
+
+def test_seed_cap_leaves_out_the_frequent_kmers(index):
+    offsets, positions = index.SEEDS(index.sequence[:0])
+    assert len(offsets) == len(positions) == 0
+    query = ENCODE(QUERY)
+    offsets, positions = index.SEEDS(query)
+    capped, capped_positions = index.SEEDS(query, MAX_SEEDS=len(offsets) - 1)
+    assert len(capped) < len(offsets)
+    assert set(zip(capped, capped_positions)) <= set(zip(offsets, positions))
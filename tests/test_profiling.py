@@ -0,0 +1,75 @@
+# Per-stage metrics (strobprobe/profiling.py) - stages are marked passed / failed with the counter deltas of what ran
+# inside them, a failed design reports its failed stage, and the metrics & the cProfile dump are written when the design
+# raises
+
+import json
+import os
+import pstats
+
+import pytest
+
+from strobprobe.design import DESIGN_ERROR, DESIGN_SENSOR, READ_PARAMETERS
+from strobprobe.foldcache import FOLD_CACHE
+from strobprobe.hairpin import HAIRPIN_ENGINE
+from strobprobe.profiling import DESIGN_PROFILE, PROFILE_CALL, WRITE_METRICS
+from strobprobe.thermo import STRAND_THERMO_BATCH
+
+COUNTERS = ['fold_requests', 'folds', 'engine_folds', 'nn_calls', 'nn_duplexes']
+
+
+def test_stage_status_and_counter_deltas():
+    folds = FOLD_CACHE()
+    profile = DESIGN_PROFILE(folds, HAIRPIN_ENGINE())
+    with profile.STAGE('first') as record:
+        folds.DG('gcgcaattttttgcgc', 25.0, 0.1)
+        folds.DG('gcgcaattttttgcgc', 25.0, 0.1)
+        STRAND_THERMO_BATCH(['acgtacgt', 'ggccaatt'], ['acgtacgt', 'aattggcc'])
+        record['candidates'] = 3
+    with pytest.raises(RuntimeError):
+        with profile.STAGE('second'):
+            folds.DG('cgtagctaccgaaagctacg', 25.0, 0.1)
+            raise RuntimeError('stopped')
+    first, second = profile.stages['first'], profile.stages['second']
+    assert first['status'] == 'passed' and second['status'] == 'failed'
+    assert (first['fold_requests'], first['folds'], first['nn_calls'], first['nn_duplexes']) == (2, 1, 1, 2)
+    assert (second['fold_requests'], second['folds'], second['nn_calls']) == (1, 1, 0)
+    assert first['candidates'] == 3
+    assert first['wall_time'] >= 0 and second['wall_time'] >= 0
+    metrics = profile.METRICS('X', 'acgt')
+    assert metrics['status'] == 'failed' and metrics['failed_stage'] == 'second' and metrics['target_length'] == 4
+    assert all(metrics['totals'][name] == first[name] + second[name] for name in COUNTERS)
+
+
+def test_design_metrics():
+    design = DESIGN_SENSOR(READ_PARAMETERS('Sensor_Parameters.csv'), FOLDS=FOLD_CACHE(), ENGINE=HAIRPIN_ENGINE())
+    metrics = design.metrics
+    assert metrics['status'] == 'designed' and metrics['failed_stage'] is None
+    assert list(metrics['stages']) == ['place_holder', 'probe', 'fuel', 'probe_hairpin', 'dimers']
+    assert all(record['status'] == 'passed' for record in metrics['stages'].values())
+    assert metrics['stages']['fuel']['folds'] > 0 and metrics['stages']['fuel']['nn_calls'] > 0
+    assert metrics['stages']['probe_hairpin']['iterations']
+    # the cold caches only fold in the hairpin stages
+    assert metrics['stages']['place_holder']['folds'] == 0
+    assert all(metrics['totals'][name] == sum(record[name] for record in metrics['stages'].values()) for name in COUNTERS)
+
+
+def test_failed_design_metrics_are_written(tmp_path):
+    parameters = READ_PARAMETERS('Sensor_Parameters.csv')._replace(target_name='FAILED', ddg_fph_tph_min=-100, ddg_fph_tph_max=-99)
+    with pytest.raises(DESIGN_ERROR) as failed:
+        PROFILE_CALL(str(tmp_path/'ProbeDesign_FAILED.prof'), DESIGN_SENSOR, parameters)
+    error = failed.value
+    assert error.stage == 'fuel'
+    assert error.metrics['status'] == 'failed' and error.metrics['failed_stage'] == 'fuel'
+    assert [record['status'] for record in error.metrics['stages'].values()] == ['passed', 'passed', 'failed']
+    assert error.metrics['stages']['fuel']['th2_candidates'] > 0
+    # the profile of the failed design is dumped
+    assert pstats.Stats(str(tmp_path/'ProbeDesign_FAILED.prof')).total_calls > 0
+    path = WRITE_METRICS(error, 'FAILED', str(tmp_path))
+    assert os.path.basename(path) == 'ProbeDesign_FAILED_Metrics.json'
+    with open(path) as metrics:
+        assert json.load(metrics)['failed_stage'] == 'fuel'
+
+
+def test_profile_call_returns_the_result(tmp_path):
+    assert PROFILE_CALL(str(tmp_path/'sum.prof'), sum, [1, 2, 3]) == 6
+    assert os.path.exists(str(tmp_path/'sum.prof'))
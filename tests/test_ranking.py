@@ -0,0 +1,16 @@
+# Top-N design mode (strobprobe/ranking.py) - the first candidate enumerated is the design of DESIGN_SENSOR
+
+from strobprobe.design import DESIGN_SENSOR, DESIGN_SETTINGS, READ_PARAMETERS
+from strobprobe.ranking import TOP_DESIGNS
+
+
+def test_first_candidate_is_the_design_sensor_design():
+    parameters = READ_PARAMETERS('Sensor_Parameters.csv')
+    settings = DESIGN_SETTINGS()
+    result = DESIGN_SENSOR(parameters, settings)
+    designs = TOP_DESIGNS(parameters, 1000, settings, TH1_COUNT=1, NECK_COUNT=1)
+    assert sorted(design.order for design in designs) == list(range(len(designs)))
+    first = min(designs, key=lambda design: design.order)
+    assert (first.th1, first.th2, first.ph_final, first.fuel_final, first.probe_final) == \
+        (result.th1, result.th2, result.ph_final, result.fuel_final, result.probe_final)
+    assert first.fuel_neck == result.fuel.k and first.probe_neck == len(result.probe_hairpin.neck)
@@ -0,0 +1,50 @@
+# Design records (strobprobe/records.py) - a record written to JSON Lines & read back is the same record & renders the
+# same report as the design that made it (a designed & a failed design)
+
+import pandas as pd
+import pytest
+
+from strobprobe.design import DESIGN_ERROR, DESIGN_SENSOR, READ_PARAMETERS
+from strobprobe.records import (RECORD_AS_JSON, RECORD_FROM_JSON, RECORD_WRITER, RECORDS_TABLE, READ_RECORDS, RENDER_REPORT,
+                                WRITE_RECORDS)
+
+
+# (record, report) of the example design & of the same design failing its Toe Hold 1 checkpoint
+@pytest.fixture(scope='module')
+def designs():
+    parameters = READ_PARAMETERS('Sensor_Parameters.csv')
+    designed = DESIGN_SENSOR(parameters)
+    with pytest.raises(DESIGN_ERROR) as failed:
+        DESIGN_SENSOR(parameters._replace(ddg_pht_pph=100))
+    return [(designed.record, designed.report), (failed.value.record, failed.value.report)]
+
+
+def test_jsonl_round_trip_renders_the_same_report(designs, tmp_path):
+    path = str(tmp_path/'records.jsonl')
+    with RECORD_WRITER(path, 'w') as writer:
+        for record, _ in designs:
+            writer.WRITE(record)
+    with open(path) as lines:
+        records = [RECORD_FROM_JSON(line) for line in lines]
+    assert [record.status for record in records] == ['designed', 'failed']
+    assert records[1].failed_stage == 'probe' and records[1].probe_pass is False
+    for (record, report), read in zip(designs, records):
+        # NaN values (a strand pair that does not pair) only compare equal as JSON
+        assert RECORD_AS_JSON(read) == RECORD_AS_JSON(record)
+        assert RENDER_REPORT(read) == RENDER_REPORT(record) == report
+
+
+def test_read_records_table(designs, tmp_path):
+    records = [record for record, _ in designs]
+    path = WRITE_RECORDS(records, str(tmp_path/'records.jsonl'))
+    pd.testing.assert_frame_equal(READ_RECORDS(path), RECORDS_TABLE(records))
+
+
+def test_parquet_round_trip(designs, tmp_path):
+    pytest.importorskip('pyarrow')
+    records = [record for record, _ in designs]
+    path = WRITE_RECORDS(records, str(tmp_path/'records.parquet'))
+    table = READ_RECORDS(path)
+    expected = RECORDS_TABLE(records)
+    scalar = [column for column in expected.columns if expected[column].dtype != object]
+    pd.testing.assert_frame_equal(table[scalar], expected[scalar])
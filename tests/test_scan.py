@@ -0,0 +1,95 @@
+# Scan Mode (strobprobe/scan.py) - the windows of a chunked scan are the ones of an unchunked scan & the ones a direct
+# Nearest-Neighbor scoring of every window finds, & a window whose design errors does not stop the scan
+
+import csv
+import random
+
+import pytest
+
+import strobprobe.scan as scan
+from strobprobe.design import READ_PARAMETERS
+from strobprobe.scan import RUN_SCAN, SCAN_WINDOW, SCAN_WINDOWS, DESIGN_WINDOW
+from strobprobe.thermo import THERMO_INDEX, CORRECTED_GIBBS_ARRAY
+
+TEMPERATURE = 25.0
+SALT_CORR = 0.1
+LENGTH_MIN = 12
+LENGTH_MAX = 20
+GIBBS_MAX = -30
+GIBBS_MIN = -12
+
+
+# Two records with a few unknown bases, 60 bases per line
+def WRITE_FASTA(PATH):
+    generator = random.Random(11)
+    records = {}
+    for record, length in (('chr1', 730), ('chr2', 260)):
+        sequence = [generator.choice('acgt') for _ in range(length)]
+        for position in generator.sample(range(length), 3):
+            sequence[position] = 'n'
+        records[record] = ''.join(sequence)
+    with open(PATH, 'w') as fasta:
+        for record, sequence in records.items():
+            fasta.write('>{0} test record\n'.format(record))
+            for start in range(0, len(sequence), 60):
+                fasta.write(sequence[start:start+60].upper() + '\n')
+    return records
+
+
+# Every window scored on its own with THERMO_INDEX
+def DIRECT_WINDOWS(RECORDS, STEP=1):
+    windows = []
+    for record, sequence in RECORDS.items():
+        index = THERMO_INDEX(sequence)
+        for start in range(0, len(sequence), STEP):
+            for length in range(LENGTH_MIN, LENGTH_MAX+1):
+                target = sequence[start:start+length]
+                if len(target) < length or 'n' in target:
+                    continue
+                h, s, g = index.THERMO(start, start+length)
+                gcorr = float(CORRECTED_GIBBS_ARRAY(TEMPERATURE, h, s, length, SALT_CORR))
+                if GIBBS_MAX <= gcorr <= GIBBS_MIN:
+                    windows.append(SCAN_WINDOW(record, start, length, target, gcorr))
+    return windows
+
+
+def SCAN(PATH, CHUNK_SIZE, STEP=1):
+    return list(SCAN_WINDOWS(PATH, LENGTH_MIN, LENGTH_MAX, TEMPERATURE, SALT_CORR, GIBBS_MAX, GIBBS_MIN, STEP, CHUNK_SIZE))
+
+
+# Windows are yielded chunk by chunk - a window across a chunk boundary comes with the chunk it ends in
+def SAME_WINDOWS(FOUND, EXPECTED):
+    FOUND, EXPECTED = sorted(FOUND), sorted(EXPECTED)
+    assert [window[:4] for window in FOUND] == [window[:4] for window in EXPECTED]
+    assert [window.gcorr_tph1 for window in FOUND] == pytest.approx([window.gcorr_tph1 for window in EXPECTED], abs=1e-9)
+
+
+@pytest.mark.parametrize('chunk_size', [LENGTH_MAX, 61, 100, 250])
+def test_chunked_scan_matches_unchunked(tmp_path, chunk_size):
+    path = str(tmp_path/'test.fa')
+    records = WRITE_FASTA(path)
+    whole = SCAN(path, 10**6)
+    assert len(whole) > 0
+    SAME_WINDOWS(whole, DIRECT_WINDOWS(records))
+    # windows across a chunk boundary are found once, with the same DG
+    SAME_WINDOWS(SCAN(path, chunk_size), whole)
+    SAME_WINDOWS(SCAN(path, chunk_size, STEP=3), DIRECT_WINDOWS(records, STEP=3))
+
+
+def test_design_error_is_recorded(tmp_path, monkeypatch):
+    def BROKEN(*ARGUMENTS, **KEYWORDS):
+        raise OSError('disk full')
+
+    window = SCAN_WINDOW('chr1', 4, 12, 'acgtacgtacgt', -15.0)
+    monkeypatch.setattr(scan, 'DESIGN_SENSOR', BROKEN)
+    row = DESIGN_WINDOW((window, READ_PARAMETERS('Sensor_Parameters.csv'), None, None))
+    assert row['Status'] == 'Error' and row['Error'] == 'OSError: disk full'
+    assert row['Target_Name'] == 'chr1_5_12'
+    # the scan goes on & every window gets its row
+    path = str(tmp_path/'test.fa')
+    WRITE_FASTA(path)
+    found = RUN_SCAN(path, 'Sensor_Parameters.csv', str(tmp_path/'out'), 29, 29, STEP=20)
+    with open(str(tmp_path/'out'/'ProbeScan_Summary.csv')) as summary:
+        rows = list(csv.DictReader(summary))
+    assert len(rows) == found > 0
+    assert all(row['Status'] == 'Error' for row in rows)
@@ -0,0 +1,78 @@
+# Neck length pre-screen (strobprobe/screen.py) - the NN hairpin estimate against a scalar sum of the Santa Lucia tables,
+# the skip rule & the audit statistics, and a skipped neck that seqfold puts inside the window is counted
+
+import pytest
+
+from strobprobe.design import DESIGN_SETTINGS
+from strobprobe.foldcache import FOLD_CACHE, HAIRPIN_SALT_CORR
+from strobprobe.fuel import FUEL_HAIRPIN_HIGH, FUEL_HAIRPIN_LOW
+from strobprobe.screen import HAIRPIN_ESTIMATE, HAIRPIN_LOOP_G, HAIRPIN_SCREEN
+from strobprobe.thermo import NN_PARAMETERS, TERMINAL_AT_H, TERMINAL_AT_S
+
+# Fuel hairpin whose estimate is below the window by more than 1 kcal/mol while its seqfold DG is inside it
+FUEL = 'gttagactgggactcatatgcgccagtctaac'
+TEMPERATURE = 25.0
+SALT_CORR = 0.05
+
+
+# Designed hairpin DG from the NN table one dinucleotide at a time
+def SCALAR_ESTIMATE(NECK, LOOP, TEMPERATURE, SALT_CORR, OUTER=0):
+    h = sum(NN_PARAMETERS[NECK[i:i+2]][0] for i in range(len(NECK)-1))
+    s = sum(NN_PARAMETERS[NECK[i:i+2]][1] for i in range(len(NECK)-1))
+    if NECK[OUTER] in 'at':
+        h, s = h + TERMINAL_AT_H, s + TERMINAL_AT_S
+    return h - (TEMPERATURE+273.15)*s/1000 + HAIRPIN_LOOP_G(LOOP, TEMPERATURE) + HAIRPIN_SALT_CORR(SALT_CORR)
+
+
+@pytest.mark.parametrize('neck, loop, outer', [('gttagactgg', 12, 0), ('gcgcatcg', 4, 0), ('ccgatgca', 40, -1), ('ATGCGT', 7, -1)])
+def test_estimate_matches_scalar_sum(neck, loop, outer):
+    assert HAIRPIN_ESTIMATE(neck, loop, 37.0, 0.1, OUTER=outer) == pytest.approx(SCALAR_ESTIMATE(neck.lower(), loop, 37.0, 0.1, outer), abs=1e-9)
+
+
+def test_loop_penalty_table_and_extrapolation():
+    assert HAIRPIN_LOOP_G(4, 37.0) == pytest.approx(3.5)
+    assert HAIRPIN_LOOP_G(11, 37.0) == pytest.approx(4.8)
+    assert HAIRPIN_LOOP_G(2, 37.0) == HAIRPIN_LOOP_G(3, 37.0)
+    assert HAIRPIN_LOOP_G(60, 37.0) > HAIRPIN_LOOP_G(30, 37.0)
+    assert HAIRPIN_LOOP_G(4, 64.0) == pytest.approx(3.5*(64+273.15)/310.15)
+
+
+def test_skip_only_past_the_margin():
+    screen = HAIRPIN_SCREEN(-6, -2, 1.0)
+    assert screen.SKIP(-7.01)
+    assert not screen.SKIP(-7.0)
+    assert not screen.SKIP(-4.0)
+    assert not screen.SKIP(5.0)     # nothing is skipped on the weak side
+
+
+def test_screen_off_by_default():
+    assert DESIGN_SETTINGS().screen_margin is None
+
+
+def test_audit_counts_a_wrong_skip():
+    folds = FOLD_CACHE()
+    neck = FUEL[:10]
+    estimate = HAIRPIN_ESTIMATE(neck, len(FUEL)-20, TEMPERATURE, SALT_CORR, OUTER=0)
+    fold = folds.DG(FUEL, TEMPERATURE, SALT_CORR)
+    # the estimate is not an upper bound of the fold
+    assert estimate < FUEL_HAIRPIN_LOW - 1.0 <= FUEL_HAIRPIN_LOW <= fold <= FUEL_HAIRPIN_HIGH
+    screen = HAIRPIN_SCREEN(FUEL_HAIRPIN_LOW, FUEL_HAIRPIN_HIGH, 1.0, AUDIT=True)
+    assert screen.SKIP(estimate)
+    screen.RECORD(estimate, fold, True)
+    screen.RECORD(-3.0, -2.5, False)
+    stats = screen.STATS()
+    assert stats['screened'] == 2
+    assert stats['skipped'] == 1
+    assert stats['wrong_skips'] == 1
+    assert stats['max_fold_minus_estimate'] == pytest.approx(fold - estimate)
+    assert stats['mean_fold_minus_estimate'] == pytest.approx((fold - estimate + 0.5)/2)
+    assert stats['margin'] == 1.0
+
+
+def test_stats_without_audit():
+    screen = HAIRPIN_SCREEN(-6, -2, 1.0)
+    screen.RECORD(-9.0, None, True)
+    stats = screen.STATS()
+    assert stats['skipped'] == 1
+    assert stats['wrong_skips'] is None
+    assert stats['max_fold_minus_estimate'] is None
@@ -0,0 +1,126 @@
+# Design service (strobprobe/service.py) over HTTP in this process - a streamed job sends its events in order & ends
+# with the design of Sensor_Parameters.csv, the job & the service status can be read back, and a bad job is a 400. A job
+# sent to a broken pool restarts it (or fails & frees its queue place), and a worker that dies fails its job only
+
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+from strobprobe.design import DESIGN_SENSOR, DESIGN_SETTINGS, READ_PARAMETERS
+from strobprobe.service import DESIGN_SERVICE, SERVICE_SERVER
+
+
+@pytest.fixture(scope='module')
+def url():
+    service = DESIGN_SERVICE(pd.read_csv('Sensor_Parameters.csv', header=None), DESIGN_SETTINGS(fuel_workers=1), WORKERS=1, QUEUE_SIZE=2)
+    server = SERVICE_SERVER(service, PORT=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+    service.CLOSE()
+
+
+def REQUEST(URL, BODY=None):
+    data = None if BODY is None else json.dumps(BODY).encode('utf-8')
+    try:
+        with urllib.request.urlopen(urllib.request.Request(URL, data=data), timeout=120) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as error:
+        return error.code, error.read().decode('utf-8')
+
+
+def test_submit_stream_and_status(url):
+    status, body = REQUEST(url + '/designs?stream=1', {'Target_Name': 'STREAMED'})
+    assert status == 200
+    events = [json.loads(line) for line in body.splitlines()]
+    assert [event['event'] for event in events] == ['queued', 'started'] + ['stage']*5 + ['done']
+    assert [event['stage'] for event in events if event['event'] == 'stage'] == ['place_holder', 'probe', 'fuel', 'probe_hairpin', 'dimers']
+    design = DESIGN_SENSOR(READ_PARAMETERS('Sensor_Parameters.csv'), DESIGN_SETTINGS(fuel_workers=1))
+    summary = events[-1]['summary']
+    assert (summary['TH2'], summary['FUEL_final'], summary['PROBE_final']) == (design.th2, design.fuel_final, design.probe_final)
+
+    status, body = REQUEST(url + '/designs/{0}'.format(events[0]['job']))
+    job = json.loads(body)
+    assert status == 200 and job['status'] == 'done' and job['target_name'] == 'STREAMED'
+    assert job['events'] == events
+    status, body = REQUEST(url + '/status')
+    assert status == 200 and json.loads(body)['done'] >= 1 and json.loads(body)['workers'] == 1
+
+
+@pytest.mark.parametrize('body', [{'Seed': None}, {'Temperature': [20, 25]}, {'Unknown': 1}, {'Temperature': 'warm'}, [1, 2]])
+def test_bad_job_is_a_400(url, body):
+    status, answer = REQUEST(url + '/designs', body)
+    assert status == 400 and 'error' in json.loads(answer)
+
+
+def test_unknown_job(url):
+    assert REQUEST(url + '/designs/999999')[0] == 404
+
+
+
+# A pool whose workers died - submit raises BrokenProcessPool, as a ProcessPoolExecutor does until JOB_EXIT replaced it
+class BROKEN_POOL:
+    def submit(self, *ARGS, **KWARGS):
+        raise BrokenProcessPool('A process in the process pool was terminated abruptly')
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+# A service of its own with the process ids of its workers
+@pytest.fixture
+def service():
+    before = {child.pid for child in multiprocessing.active_children()}
+    service = DESIGN_SERVICE(pd.read_csv('Sensor_Parameters.csv', header=None), DESIGN_SETTINGS(fuel_workers=1), WORKERS=1, QUEUE_SIZE=1)
+    workers = [child.pid for child in multiprocessing.active_children() if child.pid not in before]
+    yield service, workers
+    service.CLOSE()
+
+
+def test_submit_to_a_broken_pool_restarts_it(service):
+    service, _ = service
+    service.pool.shutdown()
+    service.pool = BROKEN_POOL()
+    job = service.SUBMIT({'Target_Name': 'RESTARTED'})
+    assert isinstance(service.pool, ProcessPoolExecutor)
+    assert [event['event'] for event in service.STREAM(job)][-1] == 'done'
+    assert service.pending == 0
+
+
+def test_submit_fails_the_job_when_the_pool_stays_broken(service, monkeypatch):
+    service, _ = service
+    service.pool.shutdown()
+    service.pool = BROKEN_POOL()
+    monkeypatch.setattr(service, 'START_POOL', lambda: setattr(service, 'pool', BROKEN_POOL()))
+    # the queue holds 2 jobs - a job lost to the broken pool does not keep its place
+    for _ in range(3):
+        with pytest.raises(BrokenExecutor):
+            service.SUBMIT({'Target_Name': 'LOST'})
+    assert service.pending == 0
+    assert [job.status for job in service.jobs.values()] == ['failed']*3
+    assert all('BrokenProcessPool' in job.events[-1]['error'] for job in service.jobs.values())
+    service.pool = ProcessPoolExecutor(max_workers=1)
+
+
+def test_dead_worker_fails_its_job_and_the_pool_is_replaced(service):
+    service, workers = service
+    broken = service.pool
+    job = service.SUBMIT({'Target_Name': 'KILLED'})
+    assert workers
+    for pid in workers:
+        os.kill(pid, signal.SIGKILL)
+    events = list(service.STREAM(job))
+    assert events[-1]['event'] == 'failed' and 'BrokenProcessPool' in events[-1]['error']
+    assert service.pool is not broken and service.pending == 0
+    assert [event['event'] for event in service.STREAM(service.SUBMIT({'Target_Name': 'AFTER'}))][-1] == 'done'
@@ -0,0 +1,41 @@
+# Incremental redesign (DESIGN_STAGES & STAGE_KEY of strobprobe/design.py) - a changed input reruns only the stages that
+# read it & the ones built on them, and the resumed design is the one a fresh design of the changed inputs gives
+
+import pytest
+
+from strobprobe.design import DESIGN_SENSOR, DESIGN_SETTINGS, DESIGN_STAGES, READ_PARAMETERS
+
+STRANDS = ('th1', 'th2', 'ph_final', 'fuel_final', 'probe_final')
+
+
+# DESIGN_SENSOR with the {stage: key} & {key: result} of the stages that passed (RESUME: results of an earlier design)
+def DESIGN(PARAMETERS, SETTINGS, RESUME=None):
+    keys, results = {}, {}
+
+    def ON_STAGE(NAME, RESULT, METRICS, KEY):
+        keys[NAME] = KEY
+        results[KEY] = RESULT
+    return DESIGN_SENSOR(PARAMETERS, SETTINGS, ON_STAGE=ON_STAGE, RESUME=RESUME), keys, results
+
+
+@pytest.mark.parametrize('change, rerun', [
+    ({'probe_spacer': 'tttt'}, ['probe_hairpin', 'dimers']),
+    ({'dimer_min_length': 5}, ['dimers']),
+    ({'fuel_loop': 'tttttt'}, ['fuel', 'probe_hairpin', 'dimers']),
+    ({'th2_seed': 3}, ['fuel', 'probe_hairpin', 'dimers']),
+    ({'ddg_pht_pph': 4}, ['probe', 'fuel', 'probe_hairpin', 'dimers']),
+    ({'temperature': 22.0}, list(DESIGN_STAGES)[:5]),
+])
+def test_changed_input_reruns_only_the_later_stages(change, rerun):
+    parameters = READ_PARAMETERS('Sensor_Parameters.csv')
+    settings = DESIGN_SETTINGS()
+    _, keys, results = DESIGN(parameters, settings)
+    changed_parameters = parameters._replace(**{field: value for field, value in change.items() if field in parameters._fields})
+    changed_settings = settings._replace(**{field: value for field, value in change.items() if field in settings._fields})
+    resumed, changed_keys, _ = DESIGN(changed_parameters, changed_settings, RESUME=results)
+    assert [stage for stage in changed_keys if changed_keys[stage] != keys[stage]] == rerun
+    metrics = resumed.metrics['stages']
+    assert [stage for stage in changed_keys if not metrics[stage].get('resumed')] == rerun
+    fresh = DESIGN_SENSOR(changed_parameters, changed_settings)
+    assert [getattr(resumed, field) for field in STRANDS] == [getattr(fresh, field) for field in STRANDS]
+    assert resumed.report == fresh.report
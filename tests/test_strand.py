@@ -0,0 +1,92 @@
+# Compact strand type (strobprobe/strand.py) against str & Bio.Seq - slicing, complements, concatenation, equality,
+# hashing & pickling give what the Seq / str the design used to hold gives
+
+import pickle
+
+import pytest
+from Bio.Seq import Seq
+
+from strobprobe.strand import STRAND
+from strobprobe.thermo import ENCODE
+
+SEQUENCES = ['ggtggtgtagggattatagagtcgctttc', 'ACGTacgt', 'acgtnrykmswbdhvNRYKMSWBDHV-', 'a', '']
+SLICES = [slice(None), slice(3, 9), slice(-5, None), slice(None, -3), slice(-8, -2), slice(None, None, 2), slice(1, 20, 3),
+          slice(None, None, -1), slice(-2, 3, -2), slice(5, 2), slice(100, 200)]
+
+
+@pytest.mark.parametrize('sequence', SEQUENCES)
+def test_text_round_trip(sequence):
+    strand = STRAND(sequence)
+    assert str(strand) == sequence and len(strand) == len(sequence)
+    assert str(STRAND(Seq(sequence))) == sequence
+    assert STRAND(sequence).SEQ() == Seq(sequence)
+    assert '{0}'.format(strand) == sequence
+
+
+@pytest.mark.parametrize('index', SLICES)
+def test_slices(index):
+    for sequence in SEQUENCES:
+        strand = STRAND(sequence)
+        assert str(strand[index]) == sequence[index]
+        # a slice of a slice
+        assert str(strand[index][1:]) == sequence[index][1:]
+        assert str(strand[index].reverse_complement()) == str(Seq(sequence[index]).reverse_complement())
+
+
+def test_single_bases():
+    strand = STRAND('acgtN')
+    assert [strand[i] for i in range(len(strand))] == list('acgtN')
+    assert strand[-1] == 'N' and strand[-5] == 'a'
+    with pytest.raises(IndexError):
+        strand[5]
+
+
+def test_slice_is_a_view():
+    strand = STRAND('ggtggtgtagggattatagagtcgctttc')
+    assert strand[2:10].codes.obj is strand.codes.obj
+    assert strand[::-1].codes.contiguous
+
+
+@pytest.mark.parametrize('sequence', SEQUENCES)
+def test_complements_match_bio_seq(sequence):
+    strand = STRAND(sequence)
+    assert str(strand.reverse_complement()) == str(Seq(sequence).reverse_complement())
+    assert str(strand.complement()) == str(Seq(sequence).complement())
+    assert str(strand.lower()) == sequence.lower()
+    assert str(strand.upper()) == sequence.upper()
+
+
+def test_concatenation():
+    strand = STRAND('acgt')
+    assert str(strand + 'ggc') == 'acgtggc'
+    assert str('ggc' + strand) == 'ggcacgt'
+    assert str(strand + Seq('tt')) == 'acgttt'
+    assert str(Seq('tt') + strand) == 'ttacgt'
+    assert str(strand + STRAND('aa')[1:]) == 'acgta'
+    assert isinstance('ggc' + strand, STRAND)
+    with pytest.raises(ValueError):
+        strand + 'acgx'
+
+
+def test_equality_and_hash_with_str():
+    strand = STRAND('ttacgt')[2:]
+    assert strand == 'acgt' and 'acgt' == strand
+    assert strand == STRAND('acgt') and strand != STRAND('acga')
+    assert strand != 'ACGT'
+    assert hash(strand) == hash('acgt')
+    assert {strand: 1}['acgt'] == 1
+    assert len({strand, STRAND('acgt'), 'acgt'}) == 1
+
+
+def test_pickle():
+    strand = STRAND('ggtggtgtagggattatag')[3:-2]
+    loaded = pickle.loads(pickle.dumps(strand))
+    assert loaded == strand and str(loaded) == str(strand)
+    assert list(loaded.THERMO_CODES()) == list(ENCODE(str(strand)))
+
+
+# Only DNA letters are accepted - RNA has to be given as DNA
+@pytest.mark.parametrize('sequence', ['acgu', 'ACGU', 'acg t', 'acgé'])
+def test_not_dna(sequence):
+    with pytest.raises(ValueError):
+        STRAND(sequence)
@@ -0,0 +1,66 @@
+# Parameter sweep (strobprobe/sweep.py) - at the --params point the sweep gives the values & checks of DESIGN_SENSOR for
+# the same design, the grid values are parsed as given, and the opening temperature grid matches a search started at
+# every grid temperature (also where the hairpin already opened below it)
+
+import numpy as np
+import pytest
+
+from strobprobe.design import DESIGN_SENSOR, GET_ENGINE, READ_PARAMETERS
+from strobprobe.sweep import DESIGN_CANDIDATE, GRID_VALUES, OPEN_TEMP_GRID, SWEEP
+
+PASS_FLAGS = ['Place_Holder_Pass', 'Probe_Pass', 'Fuel_Pass', 'Fuel_Hairpin_Pass', 'Probe_Hairpin_Pass', 'Pass']
+
+
+@pytest.fixture(scope='module')
+def design():
+    parameters = READ_PARAMETERS('Sensor_Parameters.csv')
+    return parameters, DESIGN_SENSOR(parameters)
+
+
+def test_params_point_matches_the_design(design):
+    parameters, result = design
+    table = SWEEP([DESIGN_CANDIDATE(result, parameters.probe_spacer)], parameters, [parameters.temperature], [parameters.salt_correction])
+    assert len(table) == 1
+    row = table.iloc[0]
+    assert row['Gcorr_TPH1'] == pytest.approx(result.place_holder.gcorr_tph1, abs=1e-9)
+    assert row['Gcorr_PH2P'] == pytest.approx(result.probe.gcorr_ph2p, abs=1e-9)
+    assert row['Gcorr_FPH3'] == pytest.approx(result.fuel.gcorr_fph3, abs=1e-9)
+    assert row['DDG_FPH_TPH'] == pytest.approx(result.fuel.ddg_fph_tph, abs=1e-9)
+    assert row['Ghpcorr_F'] == pytest.approx(result.fuel.ghpcorr_f, abs=1e-9)
+    assert row['Ghpcorr_P'] == pytest.approx(result.probe_hairpin.ghpcorr_p, abs=1e-9)
+    assert row['Fuel_Hairpin_Open_Temp'] == pytest.approx(result.fuel.temp_open_f, abs=0.1)
+    assert row['Probe_Hairpin_Open_Temp'] == pytest.approx(result.probe_hairpin.temp_open_p, abs=0.1)
+    # the design passed every check at this point
+    assert all(bool(row[flag]) for flag in PASS_FLAGS)
+
+
+def test_threshold_grid_moves_the_checks(design):
+    parameters, result = design
+    gcorr_tph1 = result.place_holder.gcorr_tph1
+    table = SWEEP([DESIGN_CANDIDATE(result, parameters.probe_spacer)], parameters, [parameters.temperature], [parameters.salt_correction],
+                  {'gibbs_pht_max': [gcorr_tph1 + 1, gcorr_tph1 - 1]})
+    assert list(table['Place_Holder_Pass']) == [False, True]
+    assert list(table['Pass']) == [False, True]
+
+
+def test_grid_values():
+    assert list(GRID_VALUES(['20'])) == [20.0]
+    assert list(GRID_VALUES(['10:30:3', '5.5', 7])) == [10.0, 20.0, 30.0, 5.5, 7.0]
+    assert list(GRID_VALUES(['0.05:0.5:10'])) == pytest.approx(list(np.linspace(0.05, 0.5, 10)))
+    with pytest.raises(ValueError):
+        GRID_VALUES(['10:30'])
+
+
+def test_open_temp_grid_searches_again_above_the_first_opening(design):
+    parameters, result = design
+    engine = GET_ENGINE()
+    temperatures = np.array([20.0, 40.0, 55.0, 70.0])
+    salts = np.array([0.05, parameters.salt_correction])
+    grid = OPEN_TEMP_GRID(engine, result.fuel_final, temperatures, salts, 100, 0.1)
+    # the fuel hairpin opens near 50 C, below the last two grid temperatures
+    assert result.fuel.temp_open_f < temperatures[2]
+    for row, temperature in enumerate(temperatures):
+        for column, salt in enumerate(salts):
+            opened = engine.OPEN_TEMP(result.fuel_final, salt, temperature, 100, TOL=0.1).temp
+            assert grid[row, column] == pytest.approx(np.nan if opened is None else opened, nan_ok=True)
+    assert (grid[2:, 1] >= temperatures[2:]).all()
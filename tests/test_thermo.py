@@ -0,0 +1,119 @@
+# Nearest-Neighbor kernels (strobprobe/thermo.py) against the scalar STRAND_THERMO loop of the original script
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from strobprobe.thermo import (CORRECTED_GIBBS_ARRAY, GIBBS_CALC_ARRAY, GIBBS_FIXER_ARRAY, MELT_TEMP_ARRAY, STRAND_THERMO,
+                               STRAND_THERMO_BATCH, THERMO_INDEX)
+
+# Dinucleotide DH (kcal/mol), DS (cal/Kmol) & DG (kcal/mol) steps of the original STRAND_THERMO
+NN_STEPS = {'aa': (-7.6, -21.3, -1), 'tt': (-7.6, -21.3, -1), 'at': (-7.2, -20.4, -0.88), 'ta': (-7.2, -21.3, -0.58),
+            'ca': (-8.5, -22.7, -1.45), 'tg': (-8.5, -22.7, -1.45), 'gt': (-8.4, -22.4, -1.44), 'ac': (-8.4, -22.4, -1.44),
+            'ct': (-7.8, -21.0, -1.28), 'ag': (-7.8, -21.0, -1.28), 'ga': (-8.2, -22.2, -1.30), 'tc': (-8.2, -22.2, -1.30),
+            'cg': (-10.6, -27.2, -2.17), 'gc': (-9.8, -24.4, -2.24), 'gg': (-8.0, -19.9, -1.84), 'cc': (-8.0, -19.9, -1.84)}
+COMPLEMENT = {'a': 't', 'c': 'g', 'g': 'c', 't': 'a'}
+
+
+# STRAND_THERMO as the original script computed it - one couple of STRAND2 at a time
+def SCALAR_THERMO(STRAND1, STRAND2):
+    h, s, g = 0.2, -5.7, 1.96
+    for end in (STRAND1[0], STRAND1[-1]):
+        if end in 'at':
+            h, s, g = h + 2.2, s + 6.9, g + 0.05
+    for i in range(2, len(STRAND1)+1):
+        step = NN_STEPS.get(STRAND2[i-2:i], (0, 0, 0))
+        h, s, g = h + step[0], s + step[1], g + step[2]
+    return h, s/1000, g
+
+
+
+# Corrections as the original script computed them
+def GIBBS_CALC(T, H, S):
+    return H-(T+273.15)*S
+
+
+def GIBBS_FIXER(LENGTH, SALT_CORR):
+    return 0.114*(LENGTH/2)*math.log(SALT_CORR)
+
+
+def MELT_TEMP(H, S, SALT_CORR):
+    return (H*1000)/((S*1000)+(-0.0108)+(0.00199*math.log(0.25e-9)))+16.6*math.log(SALT_CORR)
+
+def REVERSE_COMPLEMENT(SEQUENCE):
+    return ''.join(COMPLEMENT[base] for base in reversed(SEQUENCE))
+
+
+def RANDOM_STRANDS(COUNT, SEED, LOW=1, HIGH=60):
+    generator = random.Random(SEED)
+    return [''.join(generator.choice('acgt') for _ in range(generator.randint(LOW, HIGH))) for _ in range(COUNT)]
+
+
+def test_strand_thermo_matches_scalar():
+    for strand in RANDOM_STRANDS(50, 1):
+        expected = SCALAR_THERMO(REVERSE_COMPLEMENT(strand), strand)
+        assert tuple(STRAND_THERMO(REVERSE_COMPLEMENT(strand), strand, 'h', 's', 'g')) == pytest.approx(expected, abs=1e-9)
+
+
+def test_strand_thermo_batch_matches_scalar():
+    strands1 = RANDOM_STRANDS(200, 2)
+    # STRAND2 of any length - only its first len(STRAND1) bases count
+    strands2 = [strand + extra for strand, extra in zip(RANDOM_STRANDS(200, 3, 60, 60), RANDOM_STRANDS(200, 4, 0, 5))]
+    strands2 = [strand2[:random.Random(index).randint(1, len(strand2))] for index, strand2 in enumerate(strands2)]
+    h, s, g = STRAND_THERMO_BATCH(strands1, strands2)
+    expected = np.array([SCALAR_THERMO(strand1, strand2) for strand1, strand2 in zip(strands1, strands2)])
+    assert h == pytest.approx(expected[:, 0], abs=1e-9)
+    assert s == pytest.approx(expected[:, 1], abs=1e-12)
+    assert g == pytest.approx(expected[:, 2], abs=1e-9)
+
+
+def test_strand_thermo_batch_rejects_bad_input():
+    assert [len(values) for values in STRAND_THERMO_BATCH([], [])] == [0, 0, 0]
+    with pytest.raises(ValueError):
+        STRAND_THERMO_BATCH(['acgt'], ['acgt', 'tt'])
+    with pytest.raises(ValueError):
+        STRAND_THERMO_BATCH([''], ['acgt'])
+
+
+def test_thermo_index_matches_scalar():
+    sequence = RANDOM_STRANDS(1, 5, 80, 80)[0]
+    index = THERMO_INDEX(sequence)
+    generator = random.Random(6)
+    pairs = [(start, generator.randint(start+1, len(sequence))) for start in (generator.randrange(len(sequence)) for _ in range(200))]
+    for start, stop in pairs:
+        strand = sequence[start:stop]
+        expected = SCALAR_THERMO(REVERSE_COMPLEMENT(strand), strand)
+        assert tuple(float(value) for value in index.THERMO(start, stop)) == pytest.approx(expected, abs=1e-9)
+    # every substring at once
+    starts, stops = np.array(pairs).T
+    h, s, g = index.THERMO(starts, stops)
+    expected = np.array([SCALAR_THERMO(REVERSE_COMPLEMENT(sequence[start:stop]), sequence[start:stop]) for start, stop in pairs])
+    assert np.allclose(np.stack([h, s, g], axis=1), expected, atol=1e-9)
+    with pytest.raises(ValueError):
+        index.THERMO(5, 5)
+
+
+def test_thermo_index_append_truncate():
+    sequence = RANDOM_STRANDS(1, 7, 50, 50)[0]
+    index = THERMO_INDEX(sequence[:10])
+    index.APPEND(sequence[10:])
+    assert len(index) == len(sequence)
+    assert tuple(index.THERMO(0, len(sequence))) == pytest.approx(tuple(THERMO_INDEX(sequence).THERMO(0, len(sequence))), abs=1e-12)
+    index.TRUNCATE(20)
+    index.APPEND('gattaca')
+    strand = sequence[:20] + 'gattaca'
+    assert tuple(index.THERMO(3, len(strand))) == pytest.approx(SCALAR_THERMO(REVERSE_COMPLEMENT(strand[3:]), strand[3:]), abs=1e-9)
+
+
+def test_array_corrections_match_scalar():
+    strands = RANDOM_STRANDS(30, 8, 8, 40)
+    h, s, g = STRAND_THERMO_BATCH([REVERSE_COMPLEMENT(strand) for strand in strands], strands)
+    lengths = np.array([len(strand) for strand in strands])
+    for temperature, salt in ((25.0, 0.1), (37.0, 0.75)):
+        assert GIBBS_CALC_ARRAY(temperature, h, s) == pytest.approx([GIBBS_CALC(temperature, *values) for values in zip(h, s)])
+        assert GIBBS_FIXER_ARRAY(lengths, salt) == pytest.approx([GIBBS_FIXER(length, salt) for length in lengths])
+        assert MELT_TEMP_ARRAY(h, s, salt) == pytest.approx([MELT_TEMP(*values, salt) for values in zip(h, s)])
+        assert CORRECTED_GIBBS_ARRAY(temperature, h, s, lengths, salt) == pytest.approx(
+            [GIBBS_CALC(temperature, *values) - GIBBS_FIXER(length, salt) for values, length in zip(zip(h, s), lengths)])
@@ -0,0 +1,62 @@
+# Toe Hold 2 search (strobprobe/toehold.py) - seeded & deterministic, & the Nearest-Neighbor pruning never drops a valid
+# Toe Hold 2 that the full enumeration (scored with the scalar STRAND_THERMO loop) finds
+
+import math
+
+import pytest
+
+from strobprobe.toehold import TH2_BASES, TH2_SEARCH
+from test_thermo import REVERSE_COMPLEMENT, SCALAR_THERMO
+
+PH2 = 'gcatcgatcgtacgatgcta'
+TEMPERATURE = 25.0
+SALT_CORR = 0.1
+PHOSPHATES = 30
+TH2_MIN = 3
+TH2_MAX = 8
+
+
+def GCORR(STRAND):
+    h, s, g = SCALAR_THERMO(REVERSE_COMPLEMENT(STRAND), STRAND)
+    return (h-(TEMPERATURE+273.15)*s) - 0.114*(PHOSPHATES/2)*math.log(SALT_CORR)
+
+
+# Every valid Toe Hold 2 without pruning - a branch ends at a valid TH2, at TH2_MAX or once the DDG falls below the window
+def ENUMERATE(GCORR_TPH1, DDG_MIN, DDG_MAX):
+    valid = {}
+    branches = ['']
+    while branches:
+        th2 = branches.pop()
+        for base in TH2_BASES:
+            candidate = base + th2
+            ddg = GCORR(PH2 + REVERSE_COMPLEMENT(candidate)) - GCORR_TPH1
+            if len(candidate) > TH2_MIN and DDG_MIN < ddg < DDG_MAX:
+                valid[candidate] = ddg
+            elif len(candidate) < TH2_MAX and not (len(candidate) > TH2_MIN and ddg < DDG_MIN):
+                branches.append(candidate)
+    return valid
+
+
+@pytest.mark.parametrize('window', [(-6, -2), (-8, -4), (-10, -6)])
+def test_th2_search_finds_every_valid_toe_hold(window):
+    gcorr_tph1 = GCORR(PH2)
+    found = TH2_SEARCH(PH2, TH2_MIN, TH2_MAX, TEMPERATURE, SALT_CORR, gcorr_tph1, window[0], window[1], PHOSPHATES, COUNT=10**6)
+    expected = ENUMERATE(gcorr_tph1, *window)
+    assert found.complete
+    assert len(found.toe_holds) == len(expected)
+    for toe_hold in found.toe_holds:
+        assert toe_hold.ddg == pytest.approx(expected[toe_hold.th2], abs=1e-9)
+        assert toe_hold.gcorr == pytest.approx(GCORR(PH2 + REVERSE_COMPLEMENT(toe_hold.th2)), abs=1e-9)
+
+
+def test_th2_search_is_seeded():
+    gcorr_tph1 = GCORR(PH2)
+    arguments = (PH2, TH2_MIN, TH2_MAX, TEMPERATURE, SALT_CORR, gcorr_tph1, -6, -2, PHOSPHATES)
+    first = TH2_SEARCH(*arguments, SEED=4, COUNT=10**6)
+    assert TH2_SEARCH(*arguments, SEED=4, COUNT=10**6) == first
+    other = TH2_SEARCH(*arguments, SEED=5, COUNT=10**6)
+    assert sorted(other.toe_holds) == sorted(first.toe_holds)
+    # COUNT stops the same search early - the first COUNT Toe Hold 2s in the same order
+    few = TH2_SEARCH(*arguments, SEED=4, COUNT=3)
+    assert few.toe_holds == first.toe_holds[:3]
+    assert not few.complete